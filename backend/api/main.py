@@ -4,6 +4,8 @@ API FastAPI com DUPLA REDE NEURAL - VERSÃO ATUALIZADA
 Versão 3.0 - Usa Voting Classifier + Ensemble V4 Ultimate
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
@@ -19,10 +21,29 @@ import sys
 ROOT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
+from simulacao.atualizador import AtualizadorDados
+from simulacao.dados_mercado import RESERVA_SINTETICA
+from simulacao.fronteira import FronteiraEficiente
+from simulacao.monte_carlo import MonteCarloSimulation
+from simulacao.tributacao import patrimonio_liquido
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """Aquece o cache de mercado e o atualiza em segundo plano enquanto a API estiver no ar"""
+    atualizador_dados.registrar()
+    try:
+        await asyncio.to_thread(atualizador_dados.aquecer)
+    except Exception as e:
+        print(f"Erro ao aquecer dados de mercado: {e}")
+    atualizador_dados.iniciar()
+    yield
+    await atualizador_dados.parar()
+
 app = FastAPI(
     title="Investe-AI v3.0",
     description="Sistema dual com Voting Classifier + Ensemble V4 Ultimate",
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=ciclo_de_vida
 )
 
 # CORS
@@ -80,6 +101,28 @@ class RespostaRecomendacao(BaseModel):
     alertas: List[str]
     metricas: Dict[str, float]
 
+class RequisicaoMeta(BaseModel):
+    """Dados para resolver aporte, valor inicial ou prazo de uma meta"""
+    alocacao: Dict[str, float] = Field(..., description="Alocação (chaves internas ou nomes exibidos, em % ou decimal)")
+    valor_alvo: float = Field(..., gt=0, description="Patrimônio desejado em R$")
+    variavel: str = Field(default="aporte_mensal", pattern="^(aporte_mensal|valor_inicial|anos)$", description="Variável a resolver")
+    confianca: float = Field(default=0.8, gt=0, lt=1, description="Probabilidade mínima de atingir a meta")
+    valor_inicial: float = Field(default=10000, ge=0, description="Valor inicial em R$")
+    aporte_mensal: float = Field(default=0, ge=0, description="Aporte mensal em R$")
+    anos: int = Field(default=10, ge=1, le=50, description="Horizonte em anos")
+    num_simulacoes: int = Field(default=2000, ge=100, le=20000, description="Número de cenários simulados")
+
+class RequisicaoFronteira(BaseModel):
+    """Alocação a posicionar na fronteira eficiente histórica"""
+    alocacao: Dict[str, float] = Field(..., description="Alocação (chaves internas ou nomes exibidos, em % ou decimal)")
+    periodo: str = Field(default="5y", pattern="^(1y|2y|5y|10y|max)$", description="Período histórico")
+
+class RequisicaoJanelas(BaseModel):
+    """Alocação a avaliar em todas as janelas móveis do histórico"""
+    alocacao: Dict[str, float] = Field(..., description="Alocação (chaves internas ou nomes exibidos, em % ou decimal)")
+    meses_janela: int = Field(default=36, ge=6, le=240, description="Duração de cada janela em meses")
+    periodo: str = Field(default="max", pattern="^(1y|2y|5y|10y|max)$", description="Período histórico")
+
 # ============= CARREGAMENTO DOS MODELOS =============
 
 # Variáveis globais para modelos
@@ -133,8 +176,41 @@ except Exception as e:
                      'fundos_imobiliarios', 'commodities', 'criptomoedas']
     r2_score_modelo = 0.0
 
+# Simulador compartilhado (mantém cache de dados de mercado entre requisições)
+simulador_monte_carlo = MonteCarloSimulation()
+
+# Fronteira eficiente pré-calculada por período sobre a mesma matriz de retornos
+fronteira_eficiente = FronteiraEficiente(simulador_monte_carlo.estatisticas)
+
+# Cache de mercado aquecido na subida e revalidado em segundo plano: séries vencidas
+# continuam servidas do disco enquanto são revalidadas
+atualizador_dados = AtualizadorDados(
+    simulador_monte_carlo.backtesting.cache,
+    derivados=[simulador_monte_carlo.estatisticas, fronteira_eficiente]
+)
+
 # ============= FUNÇÕES AUXILIARES =============
 
+def normalizar_alocacao(alocacao: Dict[str, float]) -> Dict[str, float]:
+    """
+    Converte alocação vinda do frontend para chaves internas em decimal
+
+    Aceita tanto os nomes exibidos ('Renda Fixa') quanto as chaves internas
+    ('renda_fixa'), com valores em percentual (soma ~100) ou decimal (soma ~1)
+    """
+    nomes_exibidos = dict(zip(
+        ['Renda Fixa', 'Ações Brasil', 'Ações Internacional',
+         'Fundos Imobiliários', 'Commodities', 'Criptomoedas'],
+        asset_classes
+    ))
+
+    alocacao_interna = {nomes_exibidos.get(classe, classe): float(peso) for classe, peso in alocacao.items()}
+    total = sum(alocacao_interna.values())
+    if total <= 0:
+        raise HTTPException(status_code=422, detail="Alocação deve ter soma positiva")
+
+    return {classe: peso / total for classe, peso in alocacao_interna.items()}
+
 def preparar_features_rede1(investidor: PerfilInvestidor) -> np.ndarray:
     """
     Prepara 15 features para o Voting Classifier (Rede 1)
@@ -460,11 +536,31 @@ def calcular_metricas(alocacao: List[float], horizonte: int) -> Dict[str, float]
     valor_inicial = 100000
     valor_projetado = valor_inicial * ((1 + retorno_esperado) ** horizonte)
 
+    # Projeção líquida: fração do patrimônio que sobra após IR e taxas por classe
+    # (classes na ordem de retornos acima, cada uma no seu retorno esperado)
+    classes = ['renda_fixa', 'acoes_brasil', 'acoes_internacional',
+               'fundos_imobiliarios', 'commodities', 'criptomoedas']
+    meses = max(int(horizonte), 0) * 12
+    pesos = np.asarray(alocacao[:len(classes)], dtype=float)
+    valor_liquido = valor_projetado
+    retorno_liquido = retorno_esperado
+
+    if meses > 0 and pesos.sum() > 0:
+        retornos_mensais = (1 + np.array(retornos)) ** (1 / 12) - 1
+        projecao = patrimonio_liquido(
+            np.broadcast_to(retornos_mensais, (1, meses, len(classes))),
+            pesos / pesos.sum(), classes, valor_inicial, np.zeros(meses)
+        )
+        valor_liquido = valor_projetado * float(projecao['liquido'][0] / projecao['bruto'][0])
+        retorno_liquido = (valor_liquido / valor_inicial) ** (1 / horizonte) - 1
+
     return {
         'retorno_esperado_anual': round(retorno_esperado * 100, 2),
+        'retorno_liquido_anual': round(retorno_liquido * 100, 2),
         'risco_anual': round(risco_portfolio * 100, 2),
         'sharpe_ratio': round(sharpe, 2),
         'valor_projetado': round(valor_projetado, 2),
+        'valor_projetado_liquido': round(valor_liquido, 2),
         'horizonte_anos': horizonte,
         'r2_modelo': round(r2_score_modelo, 4)
     }
@@ -589,6 +685,79 @@ async def endpoint_recomendar_portfolio(investidor: PerfilInvestidor):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/resolver-meta")
+async def endpoint_resolver_meta(requisicao: RequisicaoMeta):
+    """Endpoint: Aporte, valor inicial ou prazo necessários para uma meta (Monte Carlo)"""
+    try:
+        return simulador_monte_carlo.resolver_meta(
+            normalizar_alocacao(requisicao.alocacao),
+            valor_alvo=requisicao.valor_alvo,
+            variavel=requisicao.variavel,
+            confianca=requisicao.confianca,
+            valor_inicial=requisicao.valor_inicial,
+            aporte_mensal=requisicao.aporte_mensal,
+            anos=requisicao.anos,
+            num_simulacoes=requisicao.num_simulacoes
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/fronteira-eficiente")
+async def endpoint_fronteira_eficiente(requisicao: RequisicaoFronteira):
+    """Endpoint: Fronteira eficiente histórica com a carteira recomendada marcada"""
+    try:
+        alocacao = normalizar_alocacao(requisicao.alocacao)
+        fronteira = fronteira_eficiente.obter(requisicao.periodo)
+
+        pontos = [
+            {
+                'alocacao': {
+                    classe: round(float(peso) * 100, 1)
+                    for classe, peso in zip(fronteira['classes'], fronteira['pesos'][indice])
+                },
+                'retorno_anual': round(float(fronteira['retorno_anual'][indice]), 2),
+                'volatilidade_anual': round(float(fronteira['volatilidade_anual'][indice]), 2),
+                'sharpe_ratio': round(float(fronteira['sharpe_ratio'][indice]), 2),
+                'max_drawdown': round(float(fronteira['max_drawdown'][indice]), 2),
+            }
+            for indice in fronteira['fronteira']
+        ]
+
+        return {
+            'periodo': requisicao.periodo,
+            'num_carteiras_avaliadas': len(fronteira['pesos']),
+            'fronteira': pontos,
+            'carteira_recomendada': {
+                chave: round(valor, 2)
+                for chave, valor in fronteira_eficiente.avaliar(alocacao, requisicao.periodo).items()
+            },
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/janelas-moveis")
+async def endpoint_janelas_moveis(requisicao: RequisicaoJanelas):
+    """Endpoint: Distribuição de retorno, volatilidade e drawdown em todas as janelas móveis"""
+    try:
+        return simulador_monte_carlo.backtesting.janelas_moveis(
+            normalizar_alocacao(requisicao.alocacao),
+            meses_janela=requisicao.meses_janela,
+            periodo=requisicao.periodo
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/info-sistema")
 async def info_sistema():
     """Informações detalhadas do sistema"""
@@ -612,6 +781,8 @@ async def info_sistema():
             "status": "OK" if modelo_ensemble_v4 else "Mock"
         },
         "classes_ativos": asset_classes,
+        "dados_mercado": atualizador_dados.ultima_atualizacao,
+        "reserva_sintetica": RESERVA_SINTETICA,
         "data_deploy": datetime.now().isoformat()
     }
 
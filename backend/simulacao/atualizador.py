@@ -0,0 +1,168 @@
+"""
+Atualizador de Dados - Revalidação periódica dos dados de mercado
+Tarefa asyncio que recarrega as séries em segundo plano enquanto as
+requisições continuam usando os dados em cache (stale-while-revalidate);
+séries vencidas encontradas pelas requisições são revalidadas do mesmo modo
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+from .backtesting import BENCHMARKS, TICKERS_BRASIL
+from .dados_mercado import CacheHistoricos
+
+
+class AtualizadorDados:
+    """Mantém o cache de históricos e os caches derivados atualizados em segundo plano"""
+
+    def __init__(
+        self,
+        cache: CacheHistoricos,
+        derivados: Sequence = (),
+        tickers: Optional[Iterable[str]] = None,
+        intervalo: str = '1mo',
+        periodicidade: timedelta = timedelta(hours=6)
+    ):
+        """
+        Args:
+            cache: Cache de históricos a manter atualizado
+            derivados: Objetos com método reconstruir(), chamados em ordem após
+                cada atualização (ex: EstatisticasMercado antes de FronteiraEficiente)
+            tickers: Séries atualizadas (padrão: TICKERS_BRASIL e BENCHMARKS)
+            intervalo: Intervalo das barras
+            periodicidade: Tempo entre atualizações
+        """
+        self.cache = cache
+        self.derivados = list(derivados)
+        self.tickers = list(dict.fromkeys(tickers or [*TICKERS_BRASIL.values(), *BENCHMARKS.values()]))
+        self.intervalo = intervalo
+        self.periodicidade = periodicidade
+        self.ultima_atualizacao: Optional[Dict] = None
+        self._tarefa: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._agendados = set()  # (ticker, intervalo) com revalidação agendada
+        self._revalidacoes = set()  # Tarefas de revalidação em andamento
+
+    def aquecer(self):
+        """
+        Carrega as séries e monta os caches derivados antes de servir requisições (bloqueante)
+
+        Séries já gravadas vêm do disco mesmo vencidas (a revalidação é
+        agendada se o atualizador estiver registrado no event loop); só as
+        que nunca foram baixadas vão à rede.
+        """
+        self.cache.obter_varios(self.tickers, self.intervalo)
+        for derivado in self.derivados:
+            derivado.obter()
+
+    def atualizar(self, tickers: Optional[Iterable[str]] = None, intervalo: Optional[str] = None) -> Dict:
+        """
+        Recarrega as séries e reconstrói os caches derivados (bloqueante)
+
+        Os caches derivados são reconstruídos sobre as séries novas antes de
+        elas serem publicadas no cache de históricos, e cada um troca todas as
+        suas entradas de uma vez: até a troca as requisições continuam
+        servidas pelos dados anteriores, sem recalcular nada no caminho.
+
+        Args:
+            tickers: Séries recarregadas (padrão: self.tickers)
+            intervalo: Intervalo das barras (padrão: self.intervalo)
+
+        Returns:
+            Dict com 'data', 'atualizados' (número de séries), 'versao' e 'duracao' (s)
+        """
+        inicio = time.perf_counter()
+        intervalo = intervalo or self.intervalo
+        historicos = self.cache.recarregar(
+            self.tickers if tickers is None else tickers, intervalo,
+            antes_de_publicar=self._reconstruir_derivados if intervalo == self.intervalo else None
+        )
+
+        self.ultima_atualizacao = {
+            'data': datetime.now().isoformat(),
+            'atualizados': len(historicos),
+            'versao': self.cache.versao,
+            'duracao': round(time.perf_counter() - inicio, 3),
+        }
+        return self.ultima_atualizacao
+
+    def agendar(self, tickers: List[str], intervalo: str):
+        """
+        Agenda a revalidação de séries vencidas (CacheHistoricos.agendar_recarga)
+
+        Pode ser chamado de qualquer thread; séries já agendadas são ignoradas.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._agendar, list(tickers), intervalo)
+
+    def atualizar_vencidos(self) -> Optional[Dict]:
+        """
+        Recarrega só as séries vencidas ou ausentes no armazém (bloqueante)
+
+        Séries ainda dentro da validade não são relidas nem reconstroem os
+        caches derivados: reiniciar o servidor com o armazém em dia não
+        dispara nenhum download.
+
+        Returns:
+            Resultado de atualizar, ou None se todas as séries estão em dia
+        """
+        armazem = self.cache.armazem
+        vencidos = set(armazem.vencidos(self.tickers, self.intervalo))
+        pendentes = [
+            ticker for ticker in self.tickers
+            if ticker in vencidos or armazem.metadados(ticker, self.intervalo) is None
+        ]
+        return self.atualizar(pendentes) if pendentes else None
+
+    async def executar(self):
+        """Laço de atualização: revalida em uma thread as séries vencidas e espera a periodicidade"""
+        while True:
+            try:
+                await asyncio.to_thread(self.atualizar_vencidos)
+            except Exception as e:
+                print(f"Erro ao atualizar dados de mercado: {e}")
+            await asyncio.sleep(self.periodicidade.total_seconds())
+
+    def registrar(self):
+        """Passa a revalidar em segundo plano, no event loop corrente, as séries vencidas pedidas ao cache"""
+        self._loop = asyncio.get_running_loop()
+        self.cache.agendar_recarga = self.agendar
+
+    def iniciar(self) -> asyncio.Task:
+        """Agenda o laço de atualização no event loop corrente (uma única tarefa)"""
+        self.registrar()
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = self._loop.create_task(self.executar())
+        return self._tarefa
+
+    async def parar(self):
+        """Cancela o laço de atualização e as revalidações pendentes"""
+        if self.cache.agendar_recarga == self.agendar:
+            self.cache.agendar_recarga = None
+        tarefas = [tarefa for tarefa in (self._tarefa, *self._revalidacoes) if tarefa is not None]
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        self._tarefa = None
+        self._loop = None
+
+    def _reconstruir_derivados(self):
+        for derivado in self.derivados:
+            derivado.reconstruir()
+
+    def _agendar(self, tickers: List[str], intervalo: str):
+        novos = [ticker for ticker in tickers if (ticker, intervalo) not in self._agendados]
+        if novos:
+            self._agendados.update((ticker, intervalo) for ticker in novos)
+            tarefa = asyncio.get_running_loop().create_task(self._revalidar(novos, intervalo))
+            self._revalidacoes.add(tarefa)
+            tarefa.add_done_callback(self._revalidacoes.discard)
+
+    async def _revalidar(self, tickers: List[str], intervalo: str):
+        try:
+            await asyncio.to_thread(self.atualizar, tickers, intervalo)
+        except Exception as e:
+            print(f"Erro ao revalidar {', '.join(tickers)}: {e}")
+        finally:
+            self._agendados.difference_update((ticker, intervalo) for ticker in tickers)
@@ -3,11 +3,18 @@ Módulo de Backtesting - Simulação com dados reais do mercado
 Usa yfinance para obter cotações históricas e simular carteiras
 """
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from .dados_mercado import (
+    ArmazemDados, CacheHistoricos, HistoricoTicker, ProvedorDados, alinhar_datas, cache_historicos,
+    provedor_sintetico
+)
+from .kernels import (
+    FREQUENCIAS_REBALANCEAMENTO, EstadoBacktest, aplicar_ruina, evolucao_com_rebalanceamento,
+    evolucao_patrimonio, expandir_fluxos, metricas_carteiras, metricas_janelas
+)
 
 
 # Mapeamento de classes de ativos para tickers reais
@@ -32,8 +39,31 @@ BENCHMARKS = {
 class Backtesting:
     """Classe para realizar backtesting de carteiras"""
 
-    def __init__(self):
-        self.cache = {}  # Cache de dados baixados
+    def __init__(self, armazem: Optional[ArmazemDados] = None, reserva: Optional[ProvedorDados] = None):
+        # Históricos em memória compartilhados pelo processo; um armazém próprio tem cache próprio.
+        # Tickers sem dados reais só usam um provedor de reserva (ex: ProvedorSintetico) se
+        # for passado aqui, e os resultados marcam essas séries em 'series_sinteticas'
+        self.cache = cache_historicos if armazem is None else CacheHistoricos(armazem, reserva=reserva)
+        # Histórico em disco compartilhado entre instâncias e processos
+        self.armazem = self.cache.armazem
+
+    @property
+    def versao_dados(self) -> int:
+        """Incrementada sempre que os dados em cache mudam"""
+        return self.cache.versao
+
+    def versoes_dados(self, tickers: Iterable[str], intervalo: str = '1mo') -> Tuple[int, ...]:
+        """Versões das séries dos tickers (mudam só quando o conteúdo de cada uma muda)"""
+        return self.cache.versoes(tickers, intervalo)
+
+    def series_sinteticas(self, tickers: Iterable[str], intervalo: str = '1mo') -> List[str]:
+        """Tickers servidos pelo provedor de reserva (mercado sintético) em vez de dados reais"""
+        return self.cache.sinteticos(tickers, intervalo)
+
+    def _origem_dados(self, tickers: Iterable[str], intervalo: str = '1mo') -> Dict:
+        """Chaves 'dados_sinteticos' e 'series_sinteticas' de um resultado"""
+        series = self.series_sinteticas(tickers, intervalo)
+        return {'dados_sinteticos': bool(series), 'series_sinteticas': series}
 
     @staticmethod
     def _safe_float(value, default=0.0):
@@ -51,62 +81,129 @@ class Backtesting:
         """
         Obtém dados históricos de um ticker
 
+        Cada ticker e intervalo guarda um único histórico 'max'; qualquer
+        período é um recorte dele, sem nova consulta ao armazém. Na falta,
+        consulta o armazém em disco, que só vai ao provedor (yfinance) quando
+        não tem o histórico ou está vencido; sem dados reais, usa o provedor
+        de reserva, se configurado (ver series_sinteticas).
+
         Args:
             ticker: Código do ativo (ex: 'BOVA11.SA')
             periodo: Período ('1y', '2y', '5y', '10y', 'max')
             intervalo: Intervalo ('1d', '1wk', '1mo')
 
         Returns:
-            DataFrame com dados históricos
+            DataFrame com dados históricos (vazio se não houver dados)
         """
-        cache_key = f"{ticker}_{periodo}_{intervalo}"
+        historico = self.obter_historicos([ticker], intervalo).get(ticker)
+        return pd.DataFrame() if historico is None else historico.recortar(periodo)
 
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+    def obter_historicos(self, tickers: Sequence[str], intervalo: str = '1mo') -> Dict[str, HistoricoTicker]:
+        """
+        Históricos completos dos tickers, buscando os que faltam no cache em um único lote
 
-        try:
-            dados = yf.download(
-                ticker,
-                period=periodo,
-                interval=intervalo,
-                progress=False
-            )
+        Returns:
+            Dict ticker -> HistoricoTicker (tickers sem dados ficam de fora)
+        """
+        return self.cache.obter_varios(tickers, intervalo)
+
+    def obter_fechamentos(
+        self,
+        tickers: Sequence[str],
+        periodo: str = '5y',
+        intervalo: str = '1mo'
+    ) -> pd.DataFrame:
+        """
+        Fechamentos de vários tickers alinhados por data, com uma única busca em lote
+
+        Tickers fora do cache da instância são pedidos juntos ao armazém, que
+        baixa todas as faltas de uma vez; os demais são recortes do histórico
+        em memória e não geram nenhuma consulta.
 
-            if dados.empty:
-                # Retorna dados mock se não conseguir baixar
-                return self._gerar_dados_mock(periodo, intervalo)
+        Args:
+            tickers: Códigos dos ativos
+            periodo: Período histórico
+            intervalo: Intervalo das barras
+
+        Returns:
+            DataFrame (datas x tickers) com os preços de fechamento
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return pd.DataFrame()
 
-            self.cache[cache_key] = dados
-            return dados
+        historicos = self.obter_historicos(tickers, intervalo)
 
-        except Exception as e:
-            print(f"Erro ao baixar {ticker}: {e}")
-            return self._gerar_dados_mock(periodo, intervalo)
+        fechamentos = {
+            ticker: self._extrair_fechamento(historicos[ticker].recortar(periodo))
+            for ticker in tickers if ticker in historicos
+        }
+        if not fechamentos:
+            return pd.DataFrame()
+        return pd.concat(fechamentos, axis=1, sort=True)
 
-    def _gerar_dados_mock(self, periodo: str, intervalo: str) -> pd.DataFrame:
-        """Gera dados simulados caso API falhe"""
-        num_periodos = {'1y': 12, '2y': 24, '5y': 60, '10y': 120}.get(periodo, 60)
+    def limpar_cache(self):
+        """Descarta os dados baixados, forçando nova consulta ao mercado"""
+        self.cache.limpar()
 
-        dates = pd.date_range(
-            end=datetime.now(),
-            periods=num_periodos,
-            freq='MS'
-        )
+    @staticmethod
+    def _extrair_fechamento(dados: pd.DataFrame) -> pd.Series:
+        """Extrai a série 1D de fechamento (yfinance pode retornar MultiIndex)"""
+        if 'Close' in dados.columns:
+            close_values = dados['Close']
+            # Se for MultiIndex (várias colunas), pegar a primeira
+            if isinstance(close_values, pd.DataFrame):
+                return close_values.iloc[:, 0]
+            return close_values
+
+        # Fallback: usar primeira coluna
+        return dados.iloc[:, 0]
+
+    def obter_matriz_retornos(
+        self,
+        classes: List[str],
+        periodo: str = '5y',
+        intervalo: str = '1mo'
+    ) -> pd.DataFrame:
+        """
+        Monta a matriz alinhada de retornos históricos (datas x classes)
+
+        Args:
+            classes: Classes de ativos (chaves de TICKERS_BRASIL)
+            periodo: Período histórico
+            intervalo: Intervalo das barras
+
+        Os retornos de cada ticker são os pré-calculados do histórico
+        completo, recortados no período.
+
+        Returns:
+            DataFrame com uma coluna de retornos por classe, apenas datas comuns
+        """
+        if not classes:
+            return pd.DataFrame(columns=classes, dtype=float)
 
-        # Simula retornos aleatórios
-        returns = np.random.normal(0.01, 0.05, num_periodos)
-        prices = 100 * (1 + returns).cumprod()
+        tickers = {classe: TICKERS_BRASIL.get(classe, '^IRX') for classe in classes}
+        historicos = self.obter_historicos(list(tickers.values()), intervalo)
 
-        return pd.DataFrame({
-            'Close': prices
-        }, index=dates)
+        retornos = {
+            classe: historicos[ticker].retornos_periodo(periodo)
+            for classe, ticker in tickers.items() if ticker in historicos
+        }
+        if not retornos:
+            return pd.DataFrame(columns=classes, dtype=float)
+        return pd.concat(retornos, axis=1).dropna()
 
     def simular_carteira(
         self,
         alocacao: Dict[str, float],
         valor_inicial: float = 10000,
         aporte_mensal: float = 0,
-        periodo: str = '5y'
+        periodo: str = '5y',
+        fluxos: Optional[Union[Sequence[float], Dict]] = None,
+        rebalanceamento: str = 'mensal',
+        banda: float = 0.05,
+        custo_transacao: Union[float, Dict[str, float]] = 0.0,
+        retornar_estado: bool = False
     ) -> Dict:
         """
         Simula evolução de uma carteira com dados reais
@@ -116,107 +213,425 @@ class Backtesting:
             valor_inicial: Valor inicial em R$
             aporte_mensal: Aporte mensal em R$
             periodo: Período da simulação
+            fluxos: Vetor mensal de aportes/resgates ou cronograma
+                (ver kernels.expandir_fluxos); substitui aporte_mensal
+            rebalanceamento: 'nenhum', 'mensal', 'trimestral', 'semestral', 'anual' ou 'bandas'
+            banda: Desvio máximo de peso tolerado no modo 'bandas' (ex: 0.05 = 5 p.p.)
+            custo_transacao: Custo proporcional por valor negociado (único ou por classe)
+            retornar_estado: Incluir o 'estado' para atualizar_carteira
 
         Returns:
             Dict com resultados da simulação
         """
-        # Normalizar alocação (garantir que soma 100%)
-        total = sum(alocacao.values())
-        alocacao_norm = {k: v/total for k, v in alocacao.items()}
-
-        # Baixar dados de todos os ativos
-        dados_ativos = {}
-        for classe, peso in alocacao_norm.items():
-            if peso > 0.001:  # Apenas se alocação > 0.1%
-                ticker = TICKERS_BRASIL.get(classe, '^IRX')
-                dados_ativos[classe] = self.obter_dados_historicos(ticker, periodo)
-
-        # Se não conseguiu dados, retornar simulação mock
-        if not dados_ativos:
-            return self._simular_mock(valor_inicial, aporte_mensal, periodo)
-
-        # Calcular retornos de cada ativo
-        retornos_ativos = {}
-        primeira_classe = None
-        for classe, dados in dados_ativos.items():
-            # Garantir que Close é uma Series 1D
-            if 'Close' in dados.columns:
-                close_values = dados['Close']
-                # Se for MultiIndex (várias colunas), pegar a primeira
-                if isinstance(close_values, pd.DataFrame):
-                    close_series = close_values.iloc[:, 0]
-                else:
-                    close_series = close_values
-            else:
-                # Fallback: usar primeira coluna
-                close_series = dados.iloc[:, 0]
-
-            retornos = close_series.pct_change().fillna(0)
-            retornos_ativos[classe] = retornos
-            if primeira_classe is None:
-                primeira_classe = classe
-
-        # Combinar retornos em um DataFrame
-        # Usar index do primeiro ativo para garantir compatibilidade
-        if primeira_classe:
-            df_retornos = pd.DataFrame(retornos_ativos, index=dados_ativos[primeira_classe].index)
+        return self.simular_carteiras(
+            [alocacao], valor_inicial, aporte_mensal, periodo, fluxos, rebalanceamento, banda, custo_transacao,
+            retornar_estado
+        )[0]
+
+    def simular_carteiras(
+        self,
+        alocacoes: Sequence[Dict[str, float]],
+        valor_inicial: float = 10000,
+        aporte_mensal: float = 0,
+        periodo: str = '5y',
+        fluxos: Optional[Union[Sequence[float], Dict]] = None,
+        rebalanceamento: str = 'mensal',
+        banda: float = 0.05,
+        custo_transacao: Union[float, Dict[str, float]] = 0.0,
+        retornar_estado: bool = False
+    ) -> List[Dict]:
+        """
+        Simula várias carteiras sobre uma única matriz de preços
+
+        Os fechamentos de todos os tickers usados são buscados de uma vez;
+        cada carteira usa as datas em que os seus próprios tickers têm dados,
+        então um ativo de histórico curto não encurta as demais. Carteiras com
+        as mesmas datas válidas são avaliadas juntas: com rebalanceamento
+        mensal sem custo, os retornos das carteiras são o produto (carteiras x
+        tickers) · (tickers x meses); nas demais estratégias,
+        kernels.evolucao_com_rebalanceamento atualiza as posições de todas as
+        carteiras mês a mês, com deriva dos pesos e custos por classe. Em
+        ambos os casos as métricas saem de uma chamada a metricas_carteiras.
+
+        Args:
+            alocacoes: Lista de alocações (ex: [{'renda_fixa': 0.6, 'acoes_brasil': 0.4}, ...])
+            valor_inicial: Valor inicial em R$
+            aporte_mensal: Aporte mensal em R$
+            periodo: Período da simulação
+            fluxos: Vetor mensal de aportes/resgates ou cronograma
+                (ver kernels.expandir_fluxos); substitui aporte_mensal
+            rebalanceamento: 'nenhum', 'mensal', 'trimestral', 'semestral', 'anual' ou 'bandas'
+            banda: Desvio máximo de peso tolerado no modo 'bandas' (ex: 0.05 = 5 p.p.)
+            custo_transacao: Custo proporcional por valor negociado (único ou por classe)
+            retornar_estado: Incluir o 'estado' de cada carteira para atualizar_carteira
+
+        Returns:
+            Lista com o resultado de simular_carteira de cada alocação, incluindo
+            custos de transação, número de rebalanceamentos, desvio máximo dos
+            pesos e 'dados_sinteticos' / 'series_sinteticas' (séries do
+            provedor de reserva; sempre verdadeiro na simulação mock). Com
+            retornar_estado, também 'estado' (None fora do rebalanceamento
+            mensal sem custos), que para na penúltima barra: a última pode ser
+            um mês ainda em aberto e ser revisada
+        """
+        if rebalanceamento != 'bandas' and rebalanceamento not in FREQUENCIAS_REBALANCEAMENTO:
+            raise ValueError(f"Rebalanceamento inválido: {rebalanceamento}")
+
+        pesos_carteiras = self._pesos_por_ticker(alocacoes)
+        tickers = list(dict.fromkeys(ticker for pesos in pesos_carteiras for ticker in pesos))
+        # Uma só matriz de preços; cada carteira usa as datas em que os seus próprios tickers têm dados
+        precos = self.obter_fechamentos(tickers, periodo).reindex(columns=tickers)
+        presentes = precos.notna().to_numpy()
+
+        resultados: List[Optional[Dict]] = [None] * len(alocacoes)
+        grupos: Dict[bytes, Tuple[np.ndarray, List[int]]] = {}
+        for indice, pesos in enumerate(pesos_carteiras):
+            validas = presentes[:, [tickers.index(ticker) for ticker in pesos]].all(axis=1)
+            # Sem dados alinhados para os tickers da carteira: simulação mock
+            if not pesos or validas.sum() < 2:
+                resultados[indice] = self._simular_mock(valor_inicial, aporte_mensal, periodo, fluxos)
+                continue
+            # Carteiras com as mesmas datas válidas são avaliadas juntas
+            grupos.setdefault(validas.tobytes(), (validas, []))[1].append(indice)
+
+        for validas, indices in grupos.values():
+            grupo = [pesos_carteiras[indice] for indice in indices]
+            colunas = list(dict.fromkeys(ticker for pesos in grupo for ticker in pesos))
+            for indice, resultado in zip(indices, self._simular_grupo(
+                precos.loc[validas, colunas], grupo, valor_inicial, aporte_mensal,
+                fluxos, rebalanceamento, banda, custo_transacao, retornar_estado
+            )):
+                resultados[indice] = {**resultado, **self._origem_dados(pesos_carteiras[indice])}
+
+        return resultados
+
+    def _simular_grupo(
+        self,
+        precos: pd.DataFrame,
+        pesos_carteiras: Sequence[Dict[str, float]],
+        valor_inicial: float,
+        aporte_mensal: float,
+        fluxos: Optional[Union[Sequence[float], Dict]],
+        rebalanceamento: str,
+        banda: float,
+        custo_transacao: Union[float, Dict[str, float]],
+        retornar_estado: bool
+    ) -> List[Dict]:
+        """
+        Simula carteiras que compartilham as mesmas datas válidas
+
+        Args:
+            precos: Fechamentos (datas x tickers) sem lacunas nos tickers das carteiras
+            pesos_carteiras: Pesos por ticker de cada carteira (ver _pesos_por_ticker)
+            Demais argumentos como em simular_carteiras
+
+        Returns:
+            Lista com o resultado de cada carteira, na ordem de pesos_carteiras
+        """
+        tickers = list(precos.columns)
+        retornos = precos.pct_change().to_numpy()[1:]  # (meses x tickers)
+        matriz_pesos = np.array([[pesos.get(ticker, 0.0) for ticker in tickers] for pesos in pesos_carteiras])
+        fluxos_mensais = expandir_fluxos(fluxos, len(retornos), aporte_mensal)
+
+        if isinstance(custo_transacao, dict):
+            classes_tickers = {ticker: classe for classe, ticker in TICKERS_BRASIL.items()}
+            custos = np.array([custo_transacao.get(classes_tickers.get(ticker), 0.0) for ticker in tickers])
+        else:
+            custos = float(custo_transacao)
+
+        # Rebalanceamento mensal sem custos: a carteira é uma série de retornos e pode ser retomada
+        resumivel = rebalanceamento == 'mensal' and not np.any(custos) and len(retornos) > 0
+        if resumivel:
+            retornos_carteiras = matriz_pesos @ retornos.T
+            desvios = np.abs(
+                matriz_pesos[:, None, :] * (1 + retornos) / (1 + retornos_carteiras)[:, :, None] - matriz_pesos[:, None, :]
+            )
+            evolucao = {
+                'custos': np.zeros(len(matriz_pesos)),
+                'rebalanceamentos': np.full(len(matriz_pesos), len(retornos)),
+                'desvio_maximo': desvios.max(axis=(1, 2), initial=0.0),
+            }
         else:
-            df_retornos = pd.DataFrame(retornos_ativos)
+            evolucao = evolucao_com_rebalanceamento(
+                retornos[None], matriz_pesos / matriz_pesos.sum(axis=1, keepdims=True).clip(min=1e-12),
+                valor_inicial, fluxos_mensais,
+                FREQUENCIAS_REBALANCEAMENTO.get(rebalanceamento, 0),
+                banda if rebalanceamento == 'bandas' else None, custos
+            )
+            # Retornos efetivos (com deriva e custos) reproduzem a trajetória em metricas_carteiras
+            patrimonio = evolucao['patrimonio']
+            anterior = np.concatenate([np.full((len(patrimonio), 1), float(valor_inicial)), patrimonio[:, :-1]], axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                retornos_carteiras = np.nan_to_num((patrimonio - fluxos_mensais) / anterior - 1.0)
+
+        metricas = metricas_carteiras(retornos_carteiras, valor_inicial, fluxos_mensais)
+        datas = precos.index.tolist()
+
+        resultados = []
+        for indice in range(len(pesos_carteiras)):
+            resultado = self._resultado_carteira(metricas, indice, datas, valor_inicial)
+            resultado.update({
+                'rebalanceamento': rebalanceamento,
+                'custos_transacao': self._safe_float(evolucao['custos'][indice]),
+                'num_rebalanceamentos': int(evolucao['rebalanceamentos'][indice]),
+                'desvio_maximo_pesos': self._safe_float(evolucao['desvio_maximo'][indice] * 100),
+            })
+            if retornar_estado:
+                resultado['estado'] = None
+            if retornar_estado and resumivel:
+                estado = EstadoBacktest(valor_inicial)
+                estado.atualizar(retornos_carteiras[indice][:-1], fluxos_mensais[:-1])
+                resultado['estado'] = {**estado.para_dict(), 'ultima_data': datas[-2].isoformat()}
+            resultados.append(resultado)
+
+        return resultados
+
+    def atualizar_carteira(
+        self,
+        alocacao: Dict[str, float],
+        estado: Dict,
+        aporte_mensal: float = 0,
+        fluxos: Optional[Union[Sequence[float], Dict]] = None,
+        intervalo: str = '1mo'
+    ) -> Dict:
+        """
+        Retoma o backtest de uma carteira a partir do estado salvo, só com as barras novas
+
+        Cada histórico é recortado a partir da última data do estado por busca
+        binária, então k barras novas custam O(k). As métricas são as mesmas
+        de simular_carteira sobre toda a série desde o início do estado
+        (rebalanceamento mensal sem custos).
+
+        O estado cobre só as barras fechadas: a última barra (possivelmente
+        um mês em aberto, revisado depois) é recalculada a cada atualização
+        a partir do fechamento da barra anterior e fica fora do novo estado.
+
+        Args:
+            alocacao: A mesma alocação usada para gerar o estado
+            estado: Dict 'estado' de simular_carteira ou de uma atualização anterior
+            aporte_mensal: Aporte mensal em R$
+            fluxos: O mesmo cronograma de fluxos da simulação original (indexado
+                desde o primeiro mês); substitui aporte_mensal
+            intervalo: Intervalo das barras
+
+        Returns:
+            Dict com as métricas de simular_carteira, 'datas_novas',
+            'patrimonio_novo' (barras após a última data do estado, incluindo a
+            última barra reavaliada), o novo 'estado' e 'dados_sinteticos' /
+            'series_sinteticas'
+        """
+        pesos = self._pesos_por_ticker([alocacao])[0]
+        tickers = list(pesos)
+        ultima_data = pd.Timestamp(estado['ultima_data'])
+        historicos = self.obter_historicos(tickers, intervalo)
+        if not tickers or any(ticker not in historicos for ticker in tickers):
+            raise ValueError("Sem histórico para atualizar a carteira")
+
+        fechamentos = {ticker: historicos[ticker].desde(ultima_data)['Close'] for ticker in tickers}
+        precos = pd.concat(fechamentos, axis=1, sort=True).dropna()
+
+        if precos.empty or precos.index[0] != ultima_data:
+            raise ValueError(f"Última data do estado ({ultima_data.date()}) não está no histórico alinhado")
+
+        retornos = precos.pct_change().to_numpy()[1:] @ np.array([pesos[ticker] for ticker in tickers])
+        estado_backtest = EstadoBacktest.de_dict(estado)
+        fluxos_novos = expandir_fluxos(fluxos, estado_backtest.meses + len(retornos), aporte_mensal)[estado_backtest.meses:]
+        trajetoria = estado_backtest.atualizar(retornos[:-1], fluxos_novos[:-1])
+        novo_estado = {**estado_backtest.para_dict(), 'ultima_data': precos.index[max(len(precos) - 2, 0)].isoformat()}
+        trajetoria = np.concatenate([trajetoria, estado_backtest.atualizar(retornos[-1:], fluxos_novos[-1:])])
+
+        metricas = estado_backtest.metricas()
+        mes_ruina = metricas.pop('mes_ruina')
+        return {
+            **{chave: self._safe_float(valor) for chave, valor in metricas.items()},
+            'valor_inicial': estado_backtest.valor_inicial,
+            'aportes_total': self._safe_float(estado_backtest.total_aportado - estado_backtest.valor_inicial),
+            'mes_ruina': mes_ruina or None,
+            'datas_novas': precos.index[1:].tolist(),
+            'patrimonio_novo': trajetoria.tolist(),
+            'estado': novo_estado,
+            **self._origem_dados(tickers, intervalo),
+        }
+
+    def simular_carteiras_diarias(
+        self,
+        alocacoes: Sequence[Dict[str, float]],
+        valor_inicial: float = 10000,
+        aporte_mensal: float = 0,
+        periodo: str = 'max'
+    ) -> List[Dict]:
+        """
+        Simula várias carteiras com barras diárias (drawdowns intramensais visíveis)
+
+        Os fechamentos diários ficam nos arrays mapeados em memória do
+        armazém; as séries são alinhadas por índices inteiros de dias
+        (interseção das datas), sem DataFrames, e as métricas saem de uma
+        chamada a metricas_carteiras com 252 pregões por ano. O aporte mensal
+        entra no primeiro pregão de cada mês. Rebalanceamento diário.
+
+        Args:
+            alocacoes: Lista de alocações (ex: [{'renda_fixa': 0.6, 'acoes_brasil': 0.4}, ...])
+            valor_inicial: Valor inicial em R$
+            aporte_mensal: Aporte mensal em R$
+            periodo: Período da simulação
+
+        Returns:
+            Lista com o resultado de cada alocação (chaves de simular_carteira,
+            com 'melhor_dia', 'pior_dia' e 'dia_ruina' no lugar das mensais)
+        """
+        pesos_carteiras = self._pesos_por_ticker(alocacoes)
+        tickers = list(dict.fromkeys(ticker for pesos in pesos_carteiras for ticker in pesos))
+        historicos = self.obter_historicos(tickers, '1d')
+
+        precos, dias = [], []
+        for ticker in tickers:
+            historico = historicos.get(ticker)
+            if historico is None:
+                break
+            inicio = historico.inicio(periodo)
+            validas = inicio + np.flatnonzero(~np.isnan(historico.fechamento[inicio:]))
+            precos.append(historico.fechamento[validas])
+            dias.append(historico.dias[validas])
+
+        comuns, posicoes = alinhar_datas(dias) if len(dias) == len(tickers) else (np.array([]), [])
+
+        # Se não conseguiu dados alinhados, retornar simulação mock (também diária)
+        if len(comuns) < 2:
+            return [self._simular_mock_diario(valor_inicial, aporte_mensal, periodo) for _ in alocacoes]
+
+        alinhados = np.stack([serie[posicao] for serie, posicao in zip(precos, posicoes)])  # (tickers x dias)
+        retornos = alinhados[:, 1:] / alinhados[:, :-1] - 1.0
+        matriz_pesos = np.array([[pesos.get(ticker, 0.0) for ticker in tickers] for pesos in pesos_carteiras])
+
+        meses = comuns.astype('datetime64[D]').astype('datetime64[M]')
+        fluxos = aporte_mensal * (meses[1:] != meses[:-1])
 
-        # Calcular retorno da carteira (média ponderada)
-        retorno_carteira = (df_retornos * pd.Series(alocacao_norm)).sum(axis=1)
+        metricas = metricas_carteiras(matriz_pesos @ retornos, valor_inicial, fluxos, periodos_ano=252)
+        datas = pd.DatetimeIndex(comuns.astype('datetime64[D]')).tolist()
 
-        # Simular evolução patrimonial
-        patrimonio = [valor_inicial]
-        aportes_acumulados = [0]
+        resultados = []
+        for indice, pesos in enumerate(pesos_carteiras):
+            if not pesos:
+                resultados.append(self._simular_mock_diario(valor_inicial, aporte_mensal, periodo))
+                continue
 
-        for i, ret in enumerate(retorno_carteira[1:], 1):
-            # Aplicar retorno do período
-            novo_patrimonio = patrimonio[-1] * (1 + ret)
+            resultado = self._resultado_diario(metricas, indice, datas, valor_inicial)
+            resultado.update(self._origem_dados(pesos, '1d'))
+            resultados.append(resultado)
 
-            # Adicionar aporte mensal
-            novo_patrimonio += aporte_mensal
-            aportes_acumulados.append(aportes_acumulados[-1] + aporte_mensal)
+        return resultados
 
-            patrimonio.append(novo_patrimonio)
+    def janelas_moveis(
+        self,
+        alocacao: Dict[str, float],
+        meses_janela: int = 36,
+        periodo: str = 'max'
+    ) -> Dict:
+        """
+        Avalia a carteira em todas as janelas móveis de `meses_janela` meses do histórico
+
+        Um único backtest depende muito da data de início; aqui cada mês do
+        histórico é um início possível (rebalanceamento mensal). As métricas de
+        todas as janelas saem de kernels.metricas_janelas em O(T).
+
+        Args:
+            alocacao: Dict com alocação (ex: {'renda_fixa': 0.6, 'acoes_brasil': 0.4})
+            meses_janela: Duração de cada janela em meses
+            periodo: Histórico de onde as janelas são extraídas
 
-        # Calcular métricas
-        patrimonio_final = patrimonio[-1]
-        total_aportado = valor_inicial + aportes_acumulados[-1]
-        rentabilidade_total = ((patrimonio_final - total_aportado) / total_aportado) * 100
+        Returns:
+            Dict com 'meses_janela', 'num_janelas', 'inicios' (data inicial de
+            cada janela), a distribuição (média, mínimo, percentis e máximo) de
+            'retorno_anualizado', 'volatilidade_anual', 'sharpe_ratio' e
+            'max_drawdown', 'retornos_janelas', 'prob_retorno_negativo', a
+            pior e a melhor janela e 'dados_sinteticos' / 'series_sinteticas'
+        """
+        pesos = self._pesos_por_ticker([alocacao])[0]
+        tickers = list(pesos)
+        precos = self.obter_fechamentos(tickers, periodo).reindex(columns=tickers).dropna()
 
-        # Retorno anualizado
-        anos = len(patrimonio) / 12  # assumindo dados mensais
-        retorno_anual = ((patrimonio_final / valor_inicial) ** (1/anos) - 1) * 100
+        meses = len(precos) - 1
+        if not pesos or meses < meses_janela:
+            raise ValueError(f"Histórico de {max(meses, 0)} meses é menor que a janela de {meses_janela} meses")
 
-        # Volatilidade
-        volatilidade = retorno_carteira.std() * np.sqrt(12) * 100  # Anualizada
+        retornos = precos.pct_change().to_numpy()[1:]
+        retornos_carteira = retornos @ np.array([pesos[ticker] for ticker in tickers])
+        metricas = {chave: valores[0] for chave, valores in metricas_janelas(retornos_carteira, meses_janela).items()}
 
-        # Sharpe Ratio (assumindo CDI como taxa livre de risco = 11%)
-        sharpe = (retorno_anual - 11) / volatilidade if volatilidade > 0 else 0
+        inicios = precos.index[:len(metricas['retorno_anualizado'])].tolist()
+        retorno = metricas['retorno_anualizado']
+        pior, melhor = int(np.nanargmin(retorno)), int(np.nanargmax(retorno))
 
-        # Maior queda (Max Drawdown)
-        patrimonio_series = pd.Series(patrimonio)
-        running_max = patrimonio_series.expanding().max()
-        drawdown = ((patrimonio_series - running_max) / running_max) * 100
-        max_drawdown = drawdown.min()
+        return {
+            'meses_janela': meses_janela,
+            'num_janelas': len(inicios),
+            'inicios': inicios,
+            **{chave: self._distribuicao(valores) for chave, valores in metricas.items()},
+            'retornos_janelas': [self._safe_float(valor) for valor in retorno],
+            'prob_retorno_negativo': self._safe_float(np.mean(retorno < 0) * 100),
+            'pior_janela': {'inicio': inicios[pior], 'retorno_anualizado': self._safe_float(retorno[pior])},
+            'melhor_janela': {'inicio': inicios[melhor], 'retorno_anualizado': self._safe_float(retorno[melhor])},
+            **self._origem_dados(tickers),
+        }
 
+    def _distribuicao(self, valores: np.ndarray) -> Dict:
+        """Média, extremos e percentis de uma métrica ao longo das janelas"""
+        p5, p25, p50, p75, p95 = np.nanpercentile(valores, [5, 25, 50, 75, 95])
         return {
-            'patrimonio_historico': patrimonio,
-            'datas': df_retornos.index.tolist(),
-            'patrimonio_final': self._safe_float(patrimonio_final),
+            'media': self._safe_float(np.nanmean(valores)),
+            'minimo': self._safe_float(np.nanmin(valores)),
+            'p5': self._safe_float(p5),
+            'p25': self._safe_float(p25),
+            'mediana': self._safe_float(p50),
+            'p75': self._safe_float(p75),
+            'p95': self._safe_float(p95),
+            'maximo': self._safe_float(np.nanmax(valores)),
+        }
+
+    @staticmethod
+    def _pesos_por_ticker(alocacoes: Sequence[Dict[str, float]]) -> List[Dict[str, float]]:
+        """Pesos por ticker de cada alocação, normalizados; apenas alocações > 0.1%"""
+        pesos_carteiras = []
+        for alocacao in alocacoes:
+            total = sum(alocacao.values())
+            pesos = {}
+            for classe, peso in alocacao.items():
+                if total > 0 and peso / total > 0.001:
+                    ticker = TICKERS_BRASIL.get(classe, '^IRX')
+                    pesos[ticker] = pesos.get(ticker, 0.0) + peso / total
+            pesos_carteiras.append(pesos)
+        return pesos_carteiras
+
+    def _resultado_carteira(self, metricas: Dict[str, np.ndarray], indice: int, datas: list, valor_inicial: float) -> Dict:
+        """Dict de resultado de simular_carteira para a carteira `indice` de metricas_carteiras"""
+        mes_ruina = int(metricas['mes_ruina'][indice])
+
+        return {
+            'patrimonio_historico': metricas['patrimonio'][indice].tolist(),
+            'datas': datas,
+            'patrimonio_final': self._safe_float(metricas['patrimonio_final'][indice]),
             'valor_inicial': valor_inicial,
-            'aportes_total': self._safe_float(aportes_acumulados[-1]),
-            'total_aportado': self._safe_float(total_aportado),
-            'rentabilidade_total': self._safe_float(rentabilidade_total),
-            'retorno_anualizado': self._safe_float(retorno_anual),
-            'volatilidade_anual': self._safe_float(volatilidade),
-            'sharpe_ratio': self._safe_float(sharpe),
-            'max_drawdown': self._safe_float(max_drawdown),
-            'melhor_mes': self._safe_float(retorno_carteira.max() * 100),
-            'pior_mes': self._safe_float(retorno_carteira.min() * 100),
+            'aportes_total': self._safe_float(metricas['total_aportado'][indice] - valor_inicial),
+            'total_aportado': self._safe_float(metricas['total_aportado'][indice]),
+            'rentabilidade_total': self._safe_float(metricas['rentabilidade_total'][indice]),
+            'retorno_anualizado': self._safe_float(metricas['retorno_anualizado'][indice]),
+            'volatilidade_anual': self._safe_float(metricas['volatilidade_anual'][indice]),
+            'sharpe_ratio': self._safe_float(metricas['sharpe_ratio'][indice]),
+            'max_drawdown': self._safe_float(metricas['max_drawdown'][indice]),
+            'melhor_mes': self._safe_float(metricas['melhor_mes'][indice]),
+            'pior_mes': self._safe_float(metricas['pior_mes'][indice]),
+            'mes_ruina': mes_ruina or None,
         }
 
+    def _resultado_diario(self, metricas: Dict[str, np.ndarray], indice: int, datas: list, valor_inicial: float) -> Dict:
+        """_resultado_carteira com as chaves diárias de simular_carteiras_diarias"""
+        resultado = self._resultado_carteira(metricas, indice, datas, valor_inicial)
+        resultado['melhor_dia'] = resultado.pop('melhor_mes')
+        resultado['pior_dia'] = resultado.pop('pior_mes')
+        resultado['dia_ruina'] = resultado.pop('mes_ruina')
+        resultado['num_dias'] = len(datas) - 1
+        return resultado
+
     def comparar_com_benchmarks(
         self,
         alocacao: Dict[str, float],
@@ -227,62 +642,75 @@ class Backtesting:
         """
         Compara carteira com benchmarks (CDI, IBOV, S&P500)
         """
-        # Simular carteira recomendada
-        resultado_carteira = self.simular_carteira(
-            alocacao, valor_inicial, aporte_mensal, periodo
-        )
-
-        # Simular benchmarks
-        benchmarks_resultados = {}
-
-        # 100% Renda Fixa (CDI)
-        benchmarks_resultados['CDI'] = self.simular_carteira(
-            {'renda_fixa': 1.0}, valor_inicial, aporte_mensal, periodo
-        )
-
-        # 100% Ações Brasil
-        benchmarks_resultados['IBOVESPA'] = self.simular_carteira(
-            {'acoes_brasil': 1.0}, valor_inicial, aporte_mensal, periodo
-        )
-
-        # 100% S&P 500
-        benchmarks_resultados['S&P500'] = self.simular_carteira(
-            {'acoes_internacional': 1.0}, valor_inicial, aporte_mensal, periodo
+        # Carteira e benchmarks sobre a mesma matriz de preços, cada um com o seu próprio histórico
+        carteira, cdi, ibovespa, sp500 = self.simular_carteiras(
+            [alocacao, {'renda_fixa': 1.0}, {'acoes_brasil': 1.0}, {'acoes_internacional': 1.0}],
+            valor_inicial, aporte_mensal, periodo
         )
 
         return {
-            'carteira_ia': resultado_carteira,
-            'benchmarks': benchmarks_resultados
+            'carteira_ia': carteira,
+            'benchmarks': {
+                'CDI': cdi,
+                'IBOVESPA': ibovespa,
+                'S&P500': sp500,
+            }
         }
 
-    def _simular_mock(self, valor_inicial: float, aporte_mensal: float, periodo: str) -> Dict:
+    def _simular_mock(
+        self,
+        valor_inicial: float,
+        aporte_mensal: float,
+        periodo: str,
+        fluxos: Optional[Union[Sequence[float], Dict]] = None
+    ) -> Dict:
         """Simulação mock caso APIs falhem"""
         num_meses = {'1y': 12, '2y': 24, '5y': 60, '10y': 120}.get(periodo, 60)
 
-        # Simula retornos aleatórios
-        retornos = np.random.normal(0.01, 0.03, num_meses)
+        # Retornos aleatórios com a semente do mercado sintético: a mesma entrada dá o mesmo resultado
+        retornos = np.random.default_rng(provedor_sintetico.seed).normal(0.01, 0.03, num_meses)
+        fluxos_mensais = expandir_fluxos(fluxos, num_meses, aporte_mensal)
 
-        patrimonio = [valor_inicial]
-        for ret in retornos:
-            novo = patrimonio[-1] * (1 + ret) + aporte_mensal
-            patrimonio.append(novo)
+        trajetoria, mes_ruina = aplicar_ruina(evolucao_patrimonio(retornos, valor_inicial, fluxos_mensais))
+        patrimonio = [valor_inicial] + trajetoria.tolist()
+        total_aportado = valor_inicial + float(fluxos_mensais.sum())
 
         return {
             'patrimonio_historico': patrimonio,
             'datas': pd.date_range(end=datetime.now(), periods=num_meses+1, freq='MS').tolist(),
             'patrimonio_final': round(patrimonio[-1], 2),
             'valor_inicial': valor_inicial,
-            'aportes_total': aporte_mensal * num_meses,
-            'total_aportado': valor_inicial + (aporte_mensal * num_meses),
-            'rentabilidade_total': round(((patrimonio[-1] - (valor_inicial + aporte_mensal * num_meses)) / (valor_inicial + aporte_mensal * num_meses)) * 100, 2),
+            'aportes_total': total_aportado - valor_inicial,
+            'total_aportado': total_aportado,
+            'rentabilidade_total': round(((patrimonio[-1] - total_aportado) / total_aportado) * 100, 2),
             'retorno_anualizado': 12.0,
             'volatilidade_anual': 15.0,
             'sharpe_ratio': 0.8,
             'max_drawdown': -10.0,
             'melhor_mes': 5.2,
             'pior_mes': -3.1,
+            'mes_ruina': int(mes_ruina) if mes_ruina else None,
+            'dados_sinteticos': True,
+            'series_sinteticas': [],
         }
 
+    def _simular_mock_diario(self, valor_inicial: float, aporte_mensal: float, periodo: str) -> Dict:
+        """Simulação mock em pregões, com as chaves de simular_carteiras_diarias"""
+        anos = {'1y': 1, '2y': 2, '5y': 5, '10y': 10}.get(periodo, 5)
+        datas = pd.bdate_range(end=datetime.now().date(), periods=anos * 252 + 1)
+
+        # Mesma semente e mesmos momentos anuais do mock mensal, distribuídos em 252 pregões
+        retornos = np.random.default_rng(provedor_sintetico.seed).normal(
+            0.01 * 12 / 252, 0.03 * np.sqrt(12 / 252), len(datas) - 1
+        )
+        meses = datas.to_period('M')
+        fluxos = aporte_mensal * (meses[1:] != meses[:-1])
+
+        metricas = metricas_carteiras(retornos[None], valor_inicial, fluxos, periodos_ano=252)
+        resultado = self._resultado_diario(metricas, 0, datas.tolist(), valor_inicial)
+        resultado.update({'dados_sinteticos': True, 'series_sinteticas': []})
+        return resultado
+
 
 # Função auxiliar para conversão de alocação
 def converter_alocacao_para_decimal(alocacao_percentual: Dict[str, float]) -> Dict[str, float]:
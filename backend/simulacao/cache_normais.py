@@ -0,0 +1,169 @@
+"""
+Cache de Normais Padrão - Números aleatórios comuns entre simulações
+Blocos Z ~ N(0, 1) semeados, gravados em disco e mapeados em memória
+para que todos os workers compartilhem uma única cópia
+"""
+
+import os
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+DIRETORIO_PADRAO = os.environ.get(
+    'INVESTE_AI_CACHE_NORMAIS',
+    os.path.join(tempfile.gettempdir(), 'investe_ai_normais')
+)
+LIMITE_BYTES_PADRAO = 512 * 1024 ** 2  # 512 MB
+LIMITE_ARQUIVO_PADRAO = 128 * 1024 ** 2  # Matrizes maiores não são cacheadas
+BYTES_POR_LOTE = 8 * 1024 ** 2  # Linhas geradas e gravadas por vez
+
+
+class CacheNormais:
+    """Cache LRU de matrizes (caminhos x meses) de normais padrão semeadas"""
+
+    def __init__(
+        self,
+        diretorio: Optional[str] = None,
+        limite_bytes: int = LIMITE_BYTES_PADRAO,
+        limite_arquivo: int = LIMITE_ARQUIVO_PADRAO
+    ):
+        """
+        Args:
+            diretorio: Diretório dos arquivos .npy (padrão: INVESTE_AI_CACHE_NORMAIS)
+            limite_bytes: Tamanho máximo somado dos blocos em memória e em disco
+            limite_arquivo: Tamanho máximo de uma matriz cacheada; acima dele as
+                normais são geradas em fluxo a cada uso
+        """
+        self.diretorio = Path(diretorio or DIRETORIO_PADRAO)
+        self.limite_bytes = limite_bytes
+        self.limite_arquivo = min(limite_arquivo, limite_bytes)
+        self._blocos = OrderedDict()  # (caminhos, meses, seed) -> array somente leitura
+        self._lock = threading.Lock()
+
+    def obter(self, num_caminhos: int, meses: int, seed: int) -> np.ndarray:
+        """
+        Retorna a matriz Z (num_caminhos x meses) da semente, gerando se necessário
+
+        O array é somente leitura; retornos normais são obtidos como μ + σ·Z.
+        Acima de limite_arquivo a matriz é gerada em memória sem ser cacheada;
+        para percorrê-la sem materializá-la use blocos().
+        """
+        chave = (num_caminhos, meses, seed)
+        if not self.cacheavel(num_caminhos, meses):
+            z = np.random.default_rng(seed).standard_normal((num_caminhos, meses))
+            z.flags.writeable = False
+            return z
+
+        with self._lock:
+            if chave in self._blocos:
+                self._blocos.move_to_end(chave)
+                return self._blocos[chave]
+
+        bloco = self._carregar(chave)
+
+        with self._lock:
+            self._blocos[chave] = bloco
+            self._blocos.move_to_end(chave)
+            self._limitar_memoria()
+
+        return bloco
+
+    def blocos(self, num_caminhos: int, meses: int, seed: int, caminhos_por_bloco: int) -> Iterator[np.ndarray]:
+        """
+        Percorre a matriz Z da semente em blocos de linhas
+
+        Matrizes cacheáveis são fatiadas do arquivo mapeado (só as páginas do
+        bloco são lidas); as maiores são geradas bloco a bloco do mesmo fluxo
+        aleatório, com valores idênticos aos de obter().
+        """
+        if self.cacheavel(num_caminhos, meses):
+            z = self.obter(num_caminhos, meses, seed)
+            for inicio in range(0, num_caminhos, caminhos_por_bloco):
+                yield z[inicio:inicio + caminhos_por_bloco]
+            return
+
+        gerador = np.random.default_rng(seed)
+        for inicio in range(0, num_caminhos, caminhos_por_bloco):
+            yield gerador.standard_normal((min(caminhos_por_bloco, num_caminhos - inicio), meses))
+
+    def cacheavel(self, num_caminhos: int, meses: int) -> bool:
+        """Se a matriz (num_caminhos x meses) cabe no limite por arquivo"""
+        return num_caminhos * meses * 8 <= self.limite_arquivo
+
+    def limpar(self):
+        """Remove todos os blocos da memória e do disco"""
+        with self._lock:
+            self._blocos.clear()
+        for arquivo in self.diretorio.glob('normais_*.npy'):
+            arquivo.unlink(missing_ok=True)
+
+    def _arquivo(self, chave) -> Path:
+        num_caminhos, meses, seed = chave
+        return self.diretorio / f"normais_{num_caminhos}_{meses}_{seed}.npy"
+
+    def _carregar(self, chave) -> np.ndarray:
+        arquivo = self._arquivo(chave)
+
+        try:
+            bloco = np.load(arquivo, mmap_mode='r')
+            if bloco.shape == chave[:2]:
+                os.utime(arquivo)  # Marca uso para a política LRU em disco
+                return bloco
+        except (OSError, ValueError):
+            pass
+
+        num_caminhos, meses, seed = chave
+        temporario = arquivo.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            # Gerada em lotes de linhas direto no arquivo: a matriz nunca fica
+            # inteira em memória. Gravação atômica: outro processo nunca lê um
+            # arquivo incompleto
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+            destino = np.lib.format.open_memmap(temporario, mode='w+', dtype=np.float64, shape=(num_caminhos, meses))
+            gerador = np.random.default_rng(seed)
+            linhas = max(1, BYTES_POR_LOTE // max(meses * 8, 1))
+            for inicio in range(0, num_caminhos, linhas):
+                fim = min(inicio + linhas, num_caminhos)
+                destino[inicio:fim] = gerador.standard_normal((fim - inicio, meses))
+            destino.flush()
+            del destino
+            os.replace(temporario, arquivo)
+            self._limitar_disco()
+            return np.load(arquivo, mmap_mode='r')
+        except OSError:
+            # Sem disco gravável: manter apenas em memória
+            temporario.unlink(missing_ok=True)
+            z = np.random.default_rng(seed).standard_normal((num_caminhos, meses))
+            z.flags.writeable = False
+            return z
+
+    def _limitar_memoria(self):
+        total = sum(bloco.nbytes for bloco in self._blocos.values())
+        while total > self.limite_bytes and len(self._blocos) > 1:
+            _, removido = self._blocos.popitem(last=False)
+            total -= removido.nbytes
+
+    def _limitar_disco(self):
+        arquivos = []
+        for arquivo in self.diretorio.glob('normais_*.npy'):
+            try:
+                info = arquivo.stat()
+            except OSError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, arquivo))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, arquivo in sorted(arquivos)[:-1]:
+            if total <= self.limite_bytes:
+                break
+            # Mapeamentos já abertos continuam válidos após a remoção
+            arquivo.unlink(missing_ok=True)
+            total -= tamanho
+
+
+# Instância compartilhada pelo processo
+cache_normais = CacheNormais()
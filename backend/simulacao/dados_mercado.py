@@ -0,0 +1,895 @@
+"""
+Dados de Mercado - Armazenamento local de cotações históricas
+Um arquivo colunar (.npy, mapeável em memória) por ticker e intervalo,
+com metadados de integridade e provedores de dados plugáveis
+"""
+
+import io
+import json
+import os
+import tempfile
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import reduce
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote, urlencode
+from urllib.request import urlopen
+
+
+DIRETORIO_PADRAO = os.environ.get(
+    'INVESTE_AI_DADOS_MERCADO',
+    os.path.join(tempfile.gettempdir(), 'investe_ai_mercado')
+)
+
+# Colunas gravadas (linhas do arquivo); a primeira é a data em segundos desde a época
+COLUNAS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+NS_POR_DIA = 86_400 * 10 ** 9
+
+# Memória máxima dos históricos mantidos pelo CacheHistoricos
+LIMITE_BYTES_PADRAO = 64 * 1024 ** 2  # 64 MB
+
+# Anos cobertos por cada período do yfinance (usado para saber se o histórico gravado basta)
+ANOS_PERIODO = {'1mo': 1 / 12, '3mo': 0.25, '6mo': 0.5, '1y': 1, '2y': 2, '5y': 5, '10y': 10, 'max': float('inf')}
+
+
+class ProvedorDados(ABC):
+    """Interface de provedor de cotações usada pelo ArmazemDados"""
+
+    nome = 'base'
+    max_conexoes = 8  # Downloads simultâneos em baixar_varios
+
+    @abstractmethod
+    def baixar(
+        self,
+        ticker: str,
+        periodo: str,
+        intervalo: str,
+        inicio: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """
+        Baixa barras de um ticker
+
+        Args:
+            ticker: Código do ativo
+            periodo: Período ('1y', '5y', 'max'...) quando inicio é None
+            intervalo: Intervalo ('1d', '1wk', '1mo')
+            inicio: Primeira data desejada (download incremental)
+
+        Returns:
+            DataFrame indexado por data com colunas de COLUNAS (vazio se não houver dados)
+        """
+
+    def baixar_varios(
+        self,
+        tickers: Iterable[str],
+        periodo: str,
+        intervalo: str,
+        inicio: Optional[datetime] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Baixa vários tickers de uma vez, com até max_conexoes downloads simultâneos
+
+        Falhas de um ticker não interrompem os demais (retornam DataFrame vazio).
+
+        Returns:
+            Dict ticker -> DataFrame
+        """
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+
+        def baixar(ticker):
+            try:
+                return self.baixar(ticker, periodo, intervalo, inicio)
+            except Exception as e:
+                print(f"Erro ao baixar {ticker}: {e}")
+                return pd.DataFrame()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_conexoes, len(tickers))) as executor:
+            return dict(zip(tickers, executor.map(baixar, tickers)))
+
+
+class ProvedorYFinance(ProvedorDados):
+    """Cotações do Yahoo Finance"""
+
+    nome = 'yfinance'
+
+    def baixar(self, ticker, periodo, intervalo, inicio=None):
+        if inicio is not None:
+            return yf.download(ticker, start=inicio, interval=intervalo, progress=False)
+        return yf.download(ticker, period=periodo, interval=intervalo, progress=False)
+
+    def baixar_varios(self, tickers, periodo, intervalo, inicio=None):
+        tickers = list(tickers)
+        if len(tickers) < 2:
+            return super().baixar_varios(tickers, periodo, intervalo, inicio)
+
+        # Uma única requisição em lote (o yfinance paraleliza internamente)
+        janela = {'start': inicio} if inicio is not None else {'period': periodo}
+        dados = yf.download(
+            tickers, interval=intervalo, group_by='ticker', threads=True, progress=False, **janela
+        )
+
+        baixados = set(dados.columns.get_level_values(0)) if isinstance(dados.columns, pd.MultiIndex) else set()
+        return {
+            ticker: dados[ticker].dropna(how='all') if ticker in baixados else pd.DataFrame()
+            for ticker in tickers
+        }
+
+
+class ProvedorHTTP(ProvedorDados):
+    """
+    Cotações de um serviço HTTP próprio (espelho interno ou cache compartilhado)
+
+    GET {url_base}/{ticker}?periodo=...&intervalo=...[&inicio=AAAA-MM-DD]
+    deve responder CSV com a coluna Date e as colunas de COLUNAS disponíveis.
+    """
+
+    nome = 'http'
+
+    def __init__(self, url_base: str, timeout: float = 10.0, max_conexoes: int = 8):
+        self.url_base = url_base.rstrip('/')
+        self.timeout = timeout
+        self.max_conexoes = max_conexoes
+
+    def baixar(self, ticker, periodo, intervalo, inicio=None):
+        parametros = {'periodo': periodo, 'intervalo': intervalo}
+        if inicio is not None:
+            parametros['inicio'] = pd.Timestamp(inicio).strftime('%Y-%m-%d')
+
+        url = f"{self.url_base}/{quote(ticker, safe='')}?{urlencode(parametros)}"
+        with urlopen(url, timeout=self.timeout) as resposta:
+            conteudo = resposta.read().decode('utf-8')
+
+        return pd.read_csv(io.StringIO(conteudo), index_col='Date', parse_dates=True)
+
+
+class ProvedorLocal(ProvedorDados):
+    """Cotações em memória (fixtures de testes e benchmarks sem rede)"""
+
+    nome = 'local'
+
+    def __init__(self, dados: Dict[str, pd.DataFrame]):
+        self.dados = dados
+
+    def baixar(self, ticker, periodo, intervalo, inicio=None):
+        dados = self.dados.get(ticker)
+        if dados is None:
+            return pd.DataFrame()
+        if inicio is not None:
+            return dados[dados.index >= pd.Timestamp(inicio)]
+        return recortar_periodo(dados, periodo)
+
+
+# Parâmetros do mercado sintético por ticker: retorno anual, volatilidade anual,
+# graus de liberdade da cauda t (None = normal), negociação em todos os dias
+# corridos e cargas nos fatores (Brasil, ações globais, dólar); o restante da
+# variância é idiossincrático
+PARAMETROS_SINTETICOS = {
+    '^IRX': (0.10, 0.01, None, False, (0.00, 0.00, 0.00)),
+    'BOVA11.SA': (0.10, 0.25, None, False, (0.92, 0.35, 0.00)),
+    'IVVB11.SA': (0.13, 0.20, None, False, (0.00, 0.80, 0.50)),
+    'IFIX.SA': (0.08, 0.12, None, False, (0.50, 0.10, 0.00)),
+    'GOLD11.SA': (0.08, 0.16, None, False, (0.00, 0.10, 0.60)),
+    'BTC-USD': (0.45, 0.75, 3, True, (0.10, 0.35, 0.20)),
+    '^BVSP': (0.10, 0.25, None, False, (0.93, 0.35, 0.00)),
+    '^GSPC': (0.09, 0.17, None, False, (0.00, 0.95, 0.00)),
+    'BRL=X': (0.04, 0.15, None, False, (-0.30, -0.20, 0.90)),
+}
+PARAMETROS_SINTETICOS_PADRAO = (0.08, 0.20, None, False, (0.00, 0.00, 0.00))
+
+# Passo das barras sintéticas: (frequência do pandas, períodos por ano)
+PASSOS_SINTETICOS = {'1d': ('D', 365), '1wk': ('W-MON', 52), '1mo': ('MS', 12)}
+
+
+class ProvedorSintetico(ProvedorDados):
+    """
+    Mercado sintético semeado e correlacionado (execução offline, testes e benchmarks)
+
+    Todos os tickers de PARAMETROS_SINTETICOS são gerados juntos em um
+    calendário fixo a partir de `origem`: choques normais correlacionados
+    por um modelo de fatores e, nas classes com cauda (cripto), escalados
+    por uma mistura qui-quadrado para seguir uma t de Student com variância
+    unitária. Cada barra consome sempre o mesmo número de normais, então o
+    histórico de uma data não muda quando `fim` avança. Tickers fora da
+    tabela recebem uma série independente semeada pelo próprio nome.
+    """
+
+    nome = 'sintetico'
+
+    def __init__(self, seed: int = 42, origem: str = '1990-01-01', fim: Optional[str] = None):
+        """
+        Args:
+            seed: Semente do gerador
+            origem: Primeira barra de todas as séries
+            fim: Última data gerada (padrão: hoje)
+        """
+        self.seed = seed
+        self.origem = pd.Timestamp(origem)
+        self.fim = pd.Timestamp(fim) if fim is not None else None
+        self._universos = {}  # intervalo -> (última data, DataFrame com todos os tickers)
+        self._lock = threading.Lock()
+
+    def baixar(self, ticker, periodo, intervalo, inicio=None):
+        frequencia, _ = PASSOS_SINTETICOS.get(intervalo, PASSOS_SINTETICOS['1d'])
+        if ticker in PARAMETROS_SINTETICOS:
+            fechamento = self._universo(intervalo)[ticker]
+        else:
+            calendario = self._calendario(frequencia)
+            precos = self._gerar([PARAMETROS_SINTETICOS_PADRAO], calendario, intervalo, [self.seed, zlib.crc32(ticker.encode())])
+            fechamento = pd.Series(precos[:, 0], index=calendario)
+
+        todos_os_dias = PARAMETROS_SINTETICOS.get(ticker, PARAMETROS_SINTETICOS_PADRAO)[3]
+        if frequencia == 'D' and not todos_os_dias:
+            fechamento = fechamento[fechamento.index.dayofweek < 5]
+
+        dados = pd.DataFrame({'Close': fechamento.to_numpy()}, index=fechamento.index.rename('Date'))
+        if inicio is not None:
+            return dados[dados.index >= pd.Timestamp(inicio)]
+        return recortar_periodo(dados, periodo)
+
+    def _calendario(self, frequencia: str) -> pd.DatetimeIndex:
+        fim = self.fim if self.fim is not None else pd.Timestamp.now().normalize()
+        return pd.date_range(self.origem, fim, freq=frequencia)
+
+    def _universo(self, intervalo: str) -> pd.DataFrame:
+        frequencia, _ = PASSOS_SINTETICOS.get(intervalo, PASSOS_SINTETICOS['1d'])
+        calendario = self._calendario(frequencia)
+        ultima = calendario[-1] if len(calendario) else None
+
+        with self._lock:
+            if self._universos.get(intervalo, (None,))[0] != ultima:
+                precos = self._gerar(list(PARAMETROS_SINTETICOS.values()), calendario, intervalo, [self.seed])
+                universo = pd.DataFrame(precos, index=calendario, columns=list(PARAMETROS_SINTETICOS))
+                self._universos[intervalo] = (ultima, universo)
+            return self._universos[intervalo][1]
+
+    @staticmethod
+    def _gerar(parametros, calendario, intervalo: str, semente) -> np.ndarray:
+        """Preços (barras x ativos) começando em 100"""
+        _, periodos_ano = PASSOS_SINTETICOS.get(intervalo, PASSOS_SINTETICOS['1d'])
+        retorno = np.array([parametro[0] for parametro in parametros])
+        volatilidade = np.array([parametro[1] for parametro in parametros])
+        graus = [parametro[2] for parametro in parametros]
+        cargas = np.array([parametro[4] for parametro in parametros], dtype=float)  # (ativos x fatores)
+        num_ativos, num_fatores = cargas.shape
+        graus_maximo = max([g for g in graus if g is not None], default=0)
+
+        # Por barra: fatores, choques idiossincráticos e normais da cauda, sempre na mesma quantidade
+        z = np.random.default_rng(semente).standard_normal((len(calendario), num_fatores + num_ativos + graus_maximo))
+        idiossincratico = np.sqrt(np.maximum(1.0 - (cargas ** 2).sum(axis=1), 0.0))
+        choques = z[:, :num_fatores] @ cargas.T + z[:, num_fatores:num_fatores + num_ativos] * idiossincratico
+
+        for ativo, grau in enumerate(graus):
+            if grau is not None:
+                qui_quadrado = (z[:, num_fatores + num_ativos:num_fatores + num_ativos + grau] ** 2).sum(axis=1)
+                choques[:, ativo] *= np.sqrt((grau - 2) / qui_quadrado)
+
+        mu = np.log1p(retorno) / periodos_ano
+        sigma = volatilidade / np.sqrt(periodos_ano)
+        log_precos = np.cumsum(mu - sigma ** 2 / 2 + sigma * choques, axis=0)
+        return 100 * np.exp(log_precos - log_precos[:1])
+
+
+def recortar_periodo(dados: pd.DataFrame, periodo: str) -> pd.DataFrame:
+    """Últimas barras cobrindo o período, contado a partir da barra mais recente"""
+    anos = ANOS_PERIODO.get(periodo, 5)
+    if dados.empty or np.isinf(anos):
+        return dados
+    inicio = dados.index[-1] - pd.DateOffset(months=round(anos * 12))
+    return dados[dados.index >= inicio]
+
+
+def alinhar_datas(datas: Sequence[np.ndarray]):
+    """
+    Datas comuns a várias séries ordenadas e a posição de cada uma em cada série
+
+    Args:
+        datas: Arrays inteiros ordenados e sem repetição (ex: dias desde a época)
+
+    Returns:
+        Tupla (comuns, posicoes): array das datas presentes em todas as séries
+        e, por série, o array de índices dessas datas nela
+    """
+    comuns = reduce(np.intersect1d, datas) if len(datas) else np.array([], dtype=np.int64)
+    return comuns, [np.searchsorted(serie, comuns) for serie in datas]
+
+
+class HistoricoTicker:
+    """
+    Histórico completo ('max') de fechamentos de um ticker em forma compacta
+
+    Guarda apenas datas (int64, ns desde a época), fechamentos e o índice de
+    crescimento acumulado das barras válidas como arrays float64; vindos do
+    ArmazemDados, os fechamentos continuam mapeados do arquivo em disco.
+    Qualquer período é um recorte pelo final: a primeira barra é achada por
+    busca binária nas datas e os dados devolvidos são visões dos arrays, sem
+    novo download nem novo cálculo.
+    """
+
+    def __init__(self, dados: pd.DataFrame, sintetico: bool = False):
+        """
+        Args:
+            dados: Histórico com coluna 'Close' indexado por data
+            sintetico: Se o histórico veio do mercado sintético (provedor de reserva)
+        """
+        fechamento = dados['Close']
+        if isinstance(fechamento, pd.DataFrame):
+            fechamento = fechamento.iloc[:, 0]
+
+        self.datas = pd.DatetimeIndex(dados.index).as_unit('ns').asi8.copy()
+        self.fechamento = fechamento.to_numpy(dtype=np.float64, copy=False)
+
+        # Índice de crescimento das barras válidas, cumprod(1 + r) desde a primeira (lacunas de fora):
+        # o retorno entre as barras válidas i e j é crescimento[j] / crescimento[i] - 1
+        validas = ~np.isnan(self.fechamento)
+        # Sem lacunas (o caso comum) as datas válidas são as próprias datas, sem cópia
+        self._datas_validas = self.datas if validas.all() else self.datas[validas]
+        valores = self.fechamento[validas]
+        self.crescimento = valores / valores[0] if len(valores) else np.empty(0)
+        # Retorno de cada barra válida sobre a anterior (sem NaN): recortes são visões
+        self.retornos = self.crescimento[1:] / self.crescimento[:-1] - 1.0
+        self._inicios = {}  # periodo -> posição da primeira barra
+        self._dias = None
+        self._assinatura = None
+        self.sintetico = sintetico
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos arrays"""
+        datas_validas = 0 if self._datas_validas is self.datas else self._datas_validas.nbytes
+        return self.datas.nbytes + self.fechamento.nbytes + datas_validas + self.crescimento.nbytes + self.retornos.nbytes
+
+    @property
+    def assinatura(self) -> int:
+        """CRC32 de datas e fechamentos (muda só quando o conteúdo muda)"""
+        if self._assinatura is None:
+            self._assinatura = zlib.crc32(self.fechamento.tobytes(), zlib.crc32(self.datas.tobytes()))
+        return self._assinatura
+
+    @property
+    def dias(self) -> np.ndarray:
+        """Datas como número inteiro de dias desde a época (para alinhar séries diárias)"""
+        if self._dias is None:
+            self._dias = self.datas // NS_POR_DIA
+        return self._dias
+
+    def inicio(self, periodo: str) -> int:
+        """Posição da primeira barra do período (mesmo critério de recortar_periodo)"""
+        if periodo not in self._inicios:
+            anos = ANOS_PERIODO.get(periodo, 5)
+            if len(self.datas) == 0 or np.isinf(anos):
+                self._inicios[periodo] = 0
+            else:
+                limite = pd.Timestamp(self.datas[-1]) - pd.DateOffset(months=round(anos * 12))
+                self._inicios[periodo] = int(np.searchsorted(self.datas, limite.value, side='left'))
+        return self._inicios[periodo]
+
+    def recortar(self, periodo: str) -> pd.DataFrame:
+        """Fechamentos do período (DataFrame com a coluna 'Close' sobre visões dos arrays)"""
+        return self._fechamentos(self.inicio(periodo))
+
+    def desde(self, data: pd.Timestamp) -> pd.DataFrame:
+        """Fechamentos a partir de `data` (inclusive), achada por busca binária"""
+        return self._fechamentos(int(np.searchsorted(self.datas, pd.Timestamp(data).as_unit('ns').value)))
+
+    def retornos_periodo(self, periodo: str) -> pd.Series:
+        """
+        Retornos entre as barras válidas do período (a primeira do recorte não tem retorno)
+
+        Os valores são uma visão dos retornos pré-calculados a partir do
+        índice de crescimento, sem cópia nem dropna.
+        """
+        inicio = self.inicio(periodo)
+        if inicio < len(self.datas):
+            posicao = int(np.searchsorted(self._datas_validas, self.datas[inicio]))
+        else:
+            posicao = len(self._datas_validas)
+        indice = pd.DatetimeIndex(self._datas_validas[posicao + 1:].view('datetime64[ns]'), name='Date')
+        return pd.Series(self.retornos[posicao:], index=indice, name='Close', copy=False)
+
+    def _fechamentos(self, inicio: int) -> pd.DataFrame:
+        return pd.DataFrame(
+            self.fechamento[inicio:, None], columns=['Close'], index=self._indice(inicio), copy=False
+        )
+
+    def _indice(self, inicio: int) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.datas[inicio:].view('datetime64[ns]'), name='Date')
+
+
+class CacheHistoricos:
+    """
+    Cache de históricos compartilhado pelo processo, limitado em bytes
+
+    Entradas são HistoricoTicker por (ticker, intervalo) em ordem LRU; o
+    acesso é protegido por lock e buscas simultâneas do mesmo ticker são
+    deduplicadas (singleflight): só a primeira vai ao armazém, as demais
+    esperam o mesmo resultado. Tickers sem dados no armazém ficam de fora,
+    a menos que um provedor de reserva seja configurado explicitamente (em
+    geral ProvedorSintetico, em testes e execução offline): as séries dele
+    ficam em cache como as demais, marcadas como sintéticas (ver
+    sinteticos), até que recarregar traga dados reais.
+
+    Cada série (ticker, intervalo) tem sua versão, que só muda quando o
+    conteúdo muda: buscar de novo após uma remoção do LRU, ou carregar
+    outro intervalo, não invalida quem depende das séries mensais.
+
+    Com agendar_recarga definido (ver AtualizadorDados), arquivos vencidos
+    no armazém são servidos como estão e a revalidação é agendada em
+    segundo plano; sem ele, o armazém revalida na própria busca.
+    """
+
+    def __init__(
+        self,
+        armazem: 'ArmazemDados',
+        limite_bytes: int = LIMITE_BYTES_PADRAO,
+        reserva: Optional[ProvedorDados] = None
+    ):
+        """
+        Args:
+            armazem: Origem dos históricos em caso de falta
+            limite_bytes: Memória máxima das entradas (a mais recente é sempre mantida)
+            reserva: Provedor usado quando o armazém não tem dados (None = ticker fica de fora)
+        """
+        self.armazem = armazem
+        self.limite_bytes = limite_bytes
+        self.reserva = reserva
+        self.agendar_recarga: Optional[Callable[[List[str], str], None]] = None
+        self.versao = 0  # Incrementada sempre que o conteúdo de alguma série muda
+        self._versoes = {}  # (ticker, intervalo) -> (assinatura, versão); sobrevive à remoção do LRU
+        self._sinteticos = set()  # (ticker, intervalo) das séries vindas da reserva
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._em_andamento = {}  # (ticker, intervalo) -> Future da busca
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Séries ainda não publicadas, vistas só por quem recarrega
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelas entradas"""
+        return self._bytes
+
+    def versoes(self, tickers: Iterable[str], intervalo: str = '1mo') -> Tuple[int, ...]:
+        """Versão de cada série (0 se nunca carregada), para chavear caches derivados"""
+        pendentes = getattr(self._local, 'pendentes', {})
+        with self._lock:
+            return tuple(
+                pendentes[(ticker, intervalo)][1] if (ticker, intervalo) in pendentes
+                else self._versoes.get((ticker, intervalo), (None, 0))[1]
+                for ticker in tickers
+            )
+
+    def sinteticos(self, tickers: Iterable[str], intervalo: str = '1mo') -> List[str]:
+        """Tickers cuja série em cache veio do provedor de reserva e não do mercado real"""
+        with self._lock:
+            return [ticker for ticker in dict.fromkeys(tickers) if (ticker, intervalo) in self._sinteticos]
+
+    def obter(self, ticker: str, intervalo: str = '1mo') -> Optional[HistoricoTicker]:
+        """Histórico de um ticker (None se não houver dados)"""
+        return self.obter_varios([ticker], intervalo).get(ticker)
+
+    def obter_varios(self, tickers: Iterable[str], intervalo: str = '1mo') -> Dict[str, HistoricoTicker]:
+        """
+        Históricos de vários tickers, buscando as faltas no armazém em um único lote
+
+        Returns:
+            Dict ticker -> HistoricoTicker (tickers sem dados ficam de fora)
+        """
+        pendentes = getattr(self._local, 'pendentes', {})
+        buscando = getattr(self._local, 'buscando', ())
+        resultado, esperando, buscar = {}, {}, {}
+        with self._lock:
+            for ticker in dict.fromkeys(tickers):
+                chave = (ticker, intervalo)
+                if chave in pendentes:
+                    resultado[ticker] = pendentes[chave][0]
+                elif chave in self._entradas:
+                    self._entradas.move_to_end(chave)
+                    resultado[ticker] = self._entradas[chave]
+                elif chave in buscando:
+                    continue  # Recarregada por esta thread sem dados: esperar pela busca travaria
+                elif chave in self._em_andamento:
+                    esperando[ticker] = self._em_andamento[chave]
+                else:
+                    buscar[ticker] = self._em_andamento[chave] = Future()
+
+        if buscar:
+            agendar = self.agendar_recarga
+            resultado.update(self._buscar(buscar, intervalo, revalidar=agendar is None))
+            vencidos = self.armazem.vencidos(buscar, intervalo) if agendar is not None else []
+            if vencidos:
+                agendar(vencidos, intervalo)
+
+        resultado.update(self._esperar(esperando))
+        return resultado
+
+    def recarregar(
+        self,
+        tickers: Iterable[str],
+        intervalo: str = '1mo',
+        antes_de_publicar: Optional[Callable[[], None]] = None
+    ) -> Dict[str, HistoricoTicker]:
+        """
+        Revalida os tickers no armazém e troca as entradas de uma só vez
+
+        As entradas atuais continuam sendo servidas durante a busca; tickers
+        sem dados novos mantêm o histórico em cache. A busca passa pelo mapa
+        de buscas em andamento: faltas simultâneas dos mesmos tickers esperam
+        por ela em vez de repetir o download.
+
+        Args:
+            tickers: Códigos dos ativos
+            intervalo: Intervalo das barras
+            antes_de_publicar: Chamado antes da troca; nesta thread (e só nela)
+                obter_varios e versoes já enxergam as séries novas, o que
+                permite reconstruir caches derivados antes de publicá-las
+
+        Returns:
+            Dict ticker -> HistoricoTicker recarregado
+        """
+        esperando, buscar = {}, {}
+        with self._lock:
+            for ticker in dict.fromkeys(tickers):
+                chave = (ticker, intervalo)
+                if chave in self._em_andamento:
+                    esperando[ticker] = self._em_andamento[chave]
+                else:
+                    buscar[ticker] = self._em_andamento[chave] = Future()
+
+        historicos = self._buscar(
+            buscar, intervalo, revalidar=True, com_reserva=False, antes_de_publicar=antes_de_publicar
+        )
+        historicos.update(self._esperar(esperando))
+        return historicos
+
+    def substituir(self, historicos: Dict[str, HistoricoTicker], intervalo: str = '1mo'):
+        """Grava ou troca históricos de uma vez (séries alteradas ganham uma única nova versão)"""
+        self._publicar(historicos, intervalo, self._novas_versoes(historicos, intervalo))
+
+    def limpar(self):
+        """Descarta todas as entradas (e invalida as versões de todas as séries)"""
+        with self._lock:
+            self._entradas.clear()
+            self._sinteticos.clear()
+            self._bytes = 0
+            self.versao += 1
+            self._versoes = {chave: (None, self.versao) for chave in self._versoes}
+
+    def _buscar(
+        self,
+        buscar: Dict[str, Future],
+        intervalo: str,
+        revalidar: bool,
+        com_reserva: bool = True,
+        antes_de_publicar: Optional[Callable[[], None]] = None
+    ) -> Dict[str, HistoricoTicker]:
+        """Busca no armazém os tickers reservados em _em_andamento, publica e libera quem espera"""
+        historicos = {}
+        try:
+            if not buscar:
+                return historicos
+            baixados = self.armazem.obter_varios(buscar, 'max', intervalo, revalidar=revalidar)
+            faltando = [ticker for ticker, dados in baixados.items() if dados.empty]
+            reservas = {}
+            if faltando and self.reserva is not None and com_reserva:
+                reservas = self.reserva.baixar_varios(faltando, 'max', intervalo)
+                baixados.update(reservas)
+
+            historicos = {
+                ticker: HistoricoTicker(dados, sintetico=ticker in reservas)
+                for ticker, dados in baixados.items() if not dados.empty
+            }
+            versoes = self._novas_versoes(historicos, intervalo)
+            if antes_de_publicar is not None:
+                self._local.pendentes = {
+                    (ticker, intervalo): (historico, versoes.get(ticker, 0)) for ticker, historico in historicos.items()
+                }
+                self._local.buscando = {(ticker, intervalo) for ticker in buscar}
+                try:
+                    antes_de_publicar()
+                finally:
+                    self._local.pendentes = {}
+                    self._local.buscando = ()
+            self._publicar(historicos, intervalo, versoes)
+        finally:
+            with self._lock:
+                for ticker in buscar:
+                    self._em_andamento.pop((ticker, intervalo), None)
+            for ticker, futuro in buscar.items():
+                futuro.set_result(historicos.get(ticker))
+        return historicos
+
+    @staticmethod
+    def _esperar(esperando: Dict[str, Future]) -> Dict[str, HistoricoTicker]:
+        resultado = {}
+        for ticker, futuro in esperando.items():
+            historico = futuro.result()
+            if historico is not None:
+                resultado[ticker] = historico
+        return resultado
+
+    def _novas_versoes(self, historicos: Dict[str, HistoricoTicker], intervalo: str) -> Dict[str, int]:
+        """Versão de cada série após a troca: a atual se o conteúdo não mudou, senão uma nova"""
+        assinaturas = {ticker: historico.assinatura for ticker, historico in historicos.items()}
+        with self._lock:
+            versoes = {}
+            for ticker, assinatura in assinaturas.items():
+                assinatura_atual, versao = self._versoes.get((ticker, intervalo), (None, 0))
+                versoes[ticker] = versao if assinatura_atual == assinatura else None
+            if None in versoes.values():
+                self.versao += 1
+                versoes = {ticker: self.versao if versao is None else versao for ticker, versao in versoes.items()}
+            return versoes
+
+    def _publicar(self, historicos: Dict[str, HistoricoTicker], intervalo: str, versoes: Dict[str, int]):
+        if not historicos:
+            return
+        with self._lock:
+            for ticker, historico in historicos.items():
+                chave = (ticker, intervalo)
+                self._versoes[chave] = (historico.assinatura, versoes[ticker])
+                if historico.sintetico:
+                    self._sinteticos.add(chave)
+                else:
+                    self._sinteticos.discard(chave)
+                anterior = self._entradas.pop(chave, None)
+                if anterior is not None:
+                    self._bytes -= anterior.nbytes
+                self._entradas[chave] = historico
+                self._bytes += historico.nbytes
+
+            while self._bytes > self.limite_bytes and len(self._entradas) > 1:
+                _, removido = self._entradas.popitem(last=False)
+                self._bytes -= removido.nbytes
+
+
+class ArmazemDados:
+    """Histórico de cotações em disco, lido antes de consultar o provedor"""
+
+    def __init__(
+        self,
+        diretorio: Optional[str] = None,
+        provedor: Optional[ProvedorDados] = None,
+        validade: timedelta = timedelta(days=1)
+    ):
+        """
+        Args:
+            diretorio: Pasta dos arquivos (padrão: INVESTE_AI_DADOS_MERCADO ou pasta temporária)
+            provedor: Fonte de novos dados (None = somente leitura, sem rede)
+            validade: Idade máxima dos dados antes de buscar barras novas
+        """
+        self.diretorio = Path(diretorio or DIRETORIO_PADRAO)
+        self.provedor = provedor
+        self.validade = validade
+        self._lock = threading.Lock()
+
+    def obter(self, ticker: str, periodo: str = '5y', intervalo: str = '1mo') -> pd.DataFrame:
+        """
+        Histórico do ticker no período, atualizando o arquivo quando necessário
+
+        Sem arquivo (ou com cobertura menor que o período) baixa o período
+        inteiro; com arquivo vencido baixa só as barras a partir da última
+        gravada. Falhas do provedor mantêm os dados já gravados.
+
+        Returns:
+            DataFrame com COLUNAS (vazio se não houver dados)
+        """
+        return self.obter_varios([ticker], periodo, intervalo)[ticker]
+
+    def obter_varios(
+        self,
+        tickers: Iterable[str],
+        periodo: str = '5y',
+        intervalo: str = '1mo',
+        revalidar: bool = True
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Histórico de vários tickers, buscando todas as faltas em lote
+
+        Tickers sem arquivo (ou sem cobertura) vão numa única chamada
+        provedor.baixar_varios; tickers vencidos vão em outra, incremental a
+        partir da barra gravada mais antiga entre eles.
+
+        Args:
+            tickers: Códigos dos ativos
+            periodo: Período mínimo coberto
+            intervalo: Intervalo das barras
+            revalidar: False devolve arquivos vencidos como estão (ver vencidos)
+
+        Returns:
+            Dict ticker -> DataFrame com COLUNAS (vazio se não houver dados)
+        """
+        dados, faltando, vencidos = {}, [], []
+        for ticker in dict.fromkeys(tickers):
+            meta = self.metadados(ticker, intervalo)
+            dados[ticker] = self.ler(ticker, intervalo) if meta else None
+
+            if dados[ticker] is None or dados[ticker].empty or \
+                    ANOS_PERIODO.get(periodo, 5) > ANOS_PERIODO.get(meta['cobertura'], 5):
+                faltando.append(ticker)
+            elif revalidar and self._vencido(meta):
+                vencidos.append(ticker)
+
+        if self.provedor is not None:
+            try:
+                for ticker, novos in self.provedor.baixar_varios(faltando, periodo, intervalo).items():
+                    if not novos.empty:
+                        dados[ticker] = self.anexar(ticker, intervalo, novos, cobertura=periodo)
+
+                if vencidos:
+                    inicio = min(dados[ticker].index[-1] for ticker in vencidos).to_pydatetime()
+                    for ticker, novos in self.provedor.baixar_varios(vencidos, periodo, intervalo, inicio).items():
+                        # Sem barras novas (ou falha do provedor): arquivo e última atualização ficam como estão
+                        if not novos.empty:
+                            dados[ticker] = self.anexar(ticker, intervalo, novos)
+            except Exception as e:
+                print(f"Erro ao baixar {', '.join(faltando + vencidos)}: {e}")
+
+        return {
+            ticker: pd.DataFrame() if historico is None else recortar_periodo(historico, periodo)
+            for ticker, historico in dados.items()
+        }
+
+    def vencidos(self, tickers: Iterable[str], intervalo: str = '1mo') -> List[str]:
+        """Tickers gravados cuja última atualização passou da validade"""
+        vencidos = []
+        for ticker in dict.fromkeys(tickers):
+            meta = self.metadados(ticker, intervalo)
+            if meta is not None and self._vencido(meta):
+                vencidos.append(ticker)
+        return vencidos
+
+    def ler(self, ticker: str, intervalo: str) -> Optional[pd.DataFrame]:
+        """
+        Lê o arquivo do ticker (mapeado em memória) e confere com os metadados
+
+        Returns:
+            DataFrame ou None se o arquivo não existir ou estiver inconsistente
+        """
+        meta = self.metadados(ticker, intervalo)
+        if meta is None:
+            return None
+
+        try:
+            colunas = np.load(self._arquivo(ticker, intervalo), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        if colunas.shape != (len(COLUNAS) + 1, meta['num_barras']) or self._checksum(colunas) != meta['checksum']:
+            return None
+
+        # (colunas x barras) transposto é o próprio bloco do DataFrame: sem cópia
+        indice = pd.to_datetime(colunas[0].astype('int64'), unit='s')
+        return pd.DataFrame(
+            colunas[1:].T, columns=list(COLUNAS), index=pd.DatetimeIndex(indice, name='Date'), copy=False
+        )
+
+    def anexar(
+        self,
+        ticker: str,
+        intervalo: str,
+        novos: pd.DataFrame,
+        cobertura: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Junta barras novas às gravadas (as novas prevalecem nas mesmas datas) e regrava
+
+        Args:
+            ticker: Código do ativo
+            intervalo: Intervalo das barras
+            novos: Barras baixadas do provedor
+            cobertura: Período que o download cobriu (None = mantém o registrado)
+
+        Returns:
+            Histórico completo após a junção
+        """
+        with self._lock:
+            meta = self.metadados(ticker, intervalo) or {}
+            atuais = self.ler(ticker, intervalo)
+            novos = self._normalizar(novos)
+
+            if atuais is not None and novos.empty:
+                dados = atuais
+            elif atuais is not None and not atuais.empty:
+                dados = pd.concat([atuais[~atuais.index.isin(novos.index)], novos]).sort_index()
+            else:
+                dados = novos
+
+            self._gravar(ticker, intervalo, dados, {
+                'cobertura': cobertura or meta.get('cobertura', '5y'),
+                'fonte': getattr(self.provedor, 'nome', 'desconhecida'),
+            })
+            # Devolve a versão mapeada do arquivo recém-gravado (fora da memória do processo)
+            gravados = self.ler(ticker, intervalo)
+            return dados if gravados is None else gravados
+
+    def metadados(self, ticker: str, intervalo: str) -> Optional[Dict]:
+        """Metadados gravados (última atualização, fonte, barras, checksum), se houver"""
+        try:
+            with open(self._arquivo(ticker, intervalo).with_suffix('.json')) as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def limpar(self):
+        """Remove todos os arquivos do armazém"""
+        for arquivo in self.diretorio.glob('*.npy'):
+            arquivo.unlink(missing_ok=True)
+        for arquivo in self.diretorio.glob('*.json'):
+            arquivo.unlink(missing_ok=True)
+
+    def _vencido(self, meta: Dict) -> bool:
+        return datetime.now() - datetime.fromisoformat(meta['ultima_atualizacao']) > self.validade
+
+    def _arquivo(self, ticker: str, intervalo: str) -> Path:
+        nome = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in ticker)
+        return self.diretorio / f"{nome}_{intervalo}.npy"
+
+    @staticmethod
+    def _normalizar(dados: pd.DataFrame) -> pd.DataFrame:
+        """Achata colunas MultiIndex do yfinance e garante COLUNAS em float"""
+        if isinstance(dados.columns, pd.MultiIndex):
+            dados = dados.copy()
+            dados.columns = dados.columns.get_level_values(0)
+            dados = dados.loc[:, ~dados.columns.duplicated()]
+
+        indice = pd.DatetimeIndex(dados.index)
+        if indice.tz is not None:
+            indice = indice.tz_localize(None)
+
+        normalizado = pd.DataFrame(index=indice.rename('Date'))
+        for coluna in COLUNAS:
+            normalizado[coluna] = dados[coluna].to_numpy(dtype=float) if coluna in dados else np.nan
+        return normalizado[~normalizado.index.duplicated(keep='last')].sort_index()
+
+    @staticmethod
+    def _checksum(colunas: np.ndarray) -> int:
+        return zlib.crc32(np.ascontiguousarray(colunas).tobytes())
+
+    def _gravar(self, ticker: str, intervalo: str, dados: pd.DataFrame, meta: Dict):
+        arquivo = self._arquivo(ticker, intervalo)
+        segundos = dados.index.to_numpy(dtype='datetime64[s]').astype('int64').astype(float)
+        colunas = np.vstack([segundos] + [dados[coluna].to_numpy(dtype=float) for coluna in COLUNAS])
+
+        meta = {
+            **meta,
+            'ticker': ticker,
+            'intervalo': intervalo,
+            'ultima_atualizacao': datetime.now().isoformat(),
+            'primeira_data': dados.index[0].isoformat() if len(dados) else None,
+            'ultima_data': dados.index[-1].isoformat() if len(dados) else None,
+            'num_barras': len(dados),
+            'checksum': self._checksum(colunas),
+        }
+
+        # Gravação atômica: leitores nunca veem arquivo incompleto (metadados por último)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        sufixo = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        temporario = arquivo.with_suffix(sufixo)
+        with open(temporario, 'wb') as destino:
+            np.save(destino, colunas)
+        os.replace(temporario, arquivo)
+
+        temporario = arquivo.with_suffix('.json' + sufixo)
+        with open(temporario, 'w') as destino:
+            json.dump(meta, destino)
+        os.replace(temporario, arquivo.with_suffix('.json'))
+
+
+# Mercado sintético como reserva só quando pedido (execução offline e demonstrações);
+# em produção um ticker sem dados reais fica de fora em vez de virar série inventada
+RESERVA_SINTETICA = os.environ.get('INVESTE_AI_RESERVA_SINTETICA', '').lower() in ('1', 'true', 'sim')
+
+# Instâncias compartilhadas pelo processo
+armazem_dados = ArmazemDados(provedor=ProvedorYFinance())
+provedor_sintetico = ProvedorSintetico()
+cache_historicos = CacheHistoricos(armazem_dados, reserva=provedor_sintetico if RESERVA_SINTETICA else None)
@@ -0,0 +1,171 @@
+"""
+Estatísticas de Mercado - Matriz de retornos e momentos em cache
+Calcula média e covariância das classes de ativos uma vez por período
+"""
+
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from .backtesting import Backtesting, TICKERS_BRASIL
+
+
+class EstatisticasMercado:
+    """Serviço de estatísticas históricas por classe de ativo"""
+
+    def __init__(self, backtesting: Backtesting, classes: Optional[List[str]] = None):
+        self.backtesting = backtesting
+        self.classes = list(classes or TICKERS_BRASIL.keys())
+        # Séries mensais lidas (mesmo fallback de obter_matriz_retornos)
+        self.tickers = list(dict.fromkeys(TICKERS_BRASIL.get(classe, '^IRX') for classe in self.classes))
+        self._cache = {}  # periodo -> matriz de retornos e momentos
+        # Requisições (threads do servidor) e o atualizador leem e trocam entradas ao mesmo tempo
+        self._lock = threading.Lock()
+
+    def obter(self, periodo: str = '5y') -> Dict:
+        """
+        Retorna matriz alinhada de retornos mensais e seus momentos
+
+        Reconstrói a entrada sempre que alguma das séries mensais usadas
+        mudou de conteúdo desde o último cálculo; dados de outros tickers ou
+        intervalos não a invalidam.
+
+        Returns:
+            Dict com 'classes', 'datas', 'retornos' (meses x classes),
+            'media' (vetor) e 'covariancia' (matriz)
+        """
+        with self._lock:
+            entrada = self._cache.get(periodo)
+        if entrada is None or not self.atualizada(entrada['versao']):
+            entrada = self._construir(periodo)
+            with self._lock:
+                self._cache[periodo] = entrada
+        return entrada
+
+    def atualizada(self, versao: Tuple[int, ...]) -> bool:
+        """
+        Se uma entrada construída nas versões `versao` das séries ainda vale
+
+        Vale enquanto nenhuma série publicada for mais nova que a usada; uma
+        entrada mais nova que as publicadas (reconstruída pelo atualizador
+        antes de publicar as séries) também vale.
+        """
+        return all(usada >= atual for usada, atual in zip(versao, self.backtesting.versoes_dados(self.tickers)))
+
+    def reconstruir(self):
+        """
+        Recalcula todos os períodos em cache e troca o cache de uma vez
+
+        Usado após uma atualização dos dados de mercado: as requisições
+        continuam vendo as entradas antigas até a troca.
+        """
+        with self._lock:
+            periodos = list(self._cache)
+        entradas = {periodo: self._construir(periodo) for periodo in periodos}
+        with self._lock:
+            self._cache.update(entradas)
+
+    def invalidar(self, periodo: Optional[str] = None):
+        """Descarta estatísticas de um período (ou de todos)"""
+        with self._lock:
+            if periodo is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(periodo, None)
+
+    def _construir(self, periodo: str) -> Dict:
+        matriz = self.backtesting.obter_matriz_retornos(self.classes, periodo)
+        retornos = matriz.to_numpy(dtype=float)
+        num_classes = retornos.shape[1]
+
+        if len(retornos) >= 2:
+            media = retornos.mean(axis=0)
+            covariancia = np.atleast_2d(np.cov(retornos, rowvar=False))
+        else:
+            media = np.zeros(num_classes)
+            covariancia = np.zeros((num_classes, num_classes))
+
+        return {
+            'versao': self.backtesting.versoes_dados(self.tickers),
+            'classes': list(matriz.columns),
+            'datas': matriz.index,
+            'retornos': retornos,
+            'media': media,
+            'covariancia': covariancia,
+        }
+
+    def vetor_pesos(self, alocacao: Dict[str, float], periodo: str = '5y') -> np.ndarray:
+        """
+        Converte alocação em vetor de pesos alinhado às colunas da matriz
+
+        Classes sem ticker próprio usam renda fixa (mesmo fallback do
+        Backtesting). Pesos abaixo de 0.1% são ignorados e o restante é
+        renormalizado para somar 1.
+
+        Returns:
+            Array de pesos (vazio se nenhuma classe tiver dados)
+        """
+        classes = self.obter(periodo)['classes']
+        pesos = np.zeros(len(classes))
+
+        for classe, peso in alocacao.items():
+            if peso <= 0.001:
+                continue
+            destino = classe if classe in TICKERS_BRASIL else 'renda_fixa'
+            if destino in classes:
+                pesos[classes.index(destino)] += peso
+
+        total = pesos.sum()
+        return pesos / total if total > 0 else np.array([])
+
+    def matriz_pesos(
+        self,
+        alocacoes: Union[Sequence[Dict[str, float]], np.ndarray],
+        periodo: str = '5y'
+    ) -> np.ndarray:
+        """
+        Converte várias alocações em matriz de pesos (alocações x colunas da matriz)
+
+        Args:
+            alocacoes: Lista de alocações ou array (N x len(self.classes)) com
+                colunas na ordem de self.classes
+            periodo: Período da matriz de retornos
+
+        Returns:
+            Array (N x classes com dados), linhas normalizadas para somar 1
+            (linhas sem peso ficam zeradas)
+        """
+        if not isinstance(alocacoes, np.ndarray):
+            matriz = np.zeros((len(alocacoes), len(self.classes)))
+            for linha, alocacao in enumerate(alocacoes):
+                for classe, peso in alocacao.items():
+                    if peso > 0.001:
+                        destino = classe if classe in TICKERS_BRASIL else 'renda_fixa'
+                        matriz[linha, self.classes.index(destino)] += peso
+            alocacoes = matriz
+
+        classes = self.obter(periodo)['classes']
+        pesos = np.asarray(alocacoes, dtype=float)[:, [self.classes.index(classe) for classe in classes]]
+
+        total = pesos.sum(axis=1, keepdims=True)
+        return np.divide(pesos, total, out=np.zeros_like(pesos), where=total > 0)
+
+    def parametros_carteira(self, alocacao: Dict[str, float], periodo: str = '5y') -> Optional[Dict]:
+        """
+        Retorno médio e volatilidade mensais da carteira: w·μ e sqrt(wᵀΣw)
+
+        Returns:
+            Dict com 'retorno_medio_mensal' e 'volatilidade_mensal', ou None
+            se não houver dados históricos suficientes
+        """
+        estatisticas = self.obter(periodo)
+        pesos = self.vetor_pesos(alocacao, periodo)
+
+        if pesos.size == 0 or len(estatisticas['retornos']) < 2:
+            return None
+
+        variancia = pesos @ estatisticas['covariancia'] @ pesos
+
+        return {
+            'retorno_medio_mensal': float(pesos @ estatisticas['media']),
+            'volatilidade_mensal': float(np.sqrt(max(variancia, 0.0)))
+        }
@@ -0,0 +1,135 @@
+"""
+Fronteira Eficiente - Melhor risco/retorno histórico das classes de ativos
+Amostra milhares de alocações do simplex, avalia todas de uma vez sobre a
+matriz de retornos em cache e guarda a fronteira de Pareto por período
+"""
+
+import threading
+import numpy as np
+from typing import Dict, Optional
+from .estatisticas_mercado import EstatisticasMercado
+from .kernels import metricas_carteiras
+
+
+class FronteiraEficiente:
+    """Fronteira risco x retorno histórica, pré-calculada e em cache por período"""
+
+    def __init__(self, estatisticas: EstatisticasMercado, num_carteiras: int = 5000, seed: int = 42):
+        self.estatisticas = estatisticas
+        self.num_carteiras = num_carteiras
+        self.seed = seed
+        self._cache = {}  # periodo -> carteiras avaliadas e fronteira
+        self._lock = threading.Lock()  # Mesmo acesso concorrente de EstatisticasMercado
+
+    def obter(self, periodo: str = '5y') -> Dict:
+        """
+        Carteiras amostradas, suas métricas e a fronteira de Pareto do período
+
+        Recalcula apenas quando alguma série usada pela matriz de retornos
+        do período muda (mesmo critério de EstatisticasMercado.atualizada).
+
+        Returns:
+            Dict com 'classes', 'pesos' (carteiras x classes), arrays
+            (carteiras,) 'retorno_anual', 'volatilidade_anual', 'sharpe_ratio' e
+            'max_drawdown' (em %), e 'fronteira' (índices ordenados por volatilidade)
+        """
+        with self._lock:
+            entrada = self._cache.get(periodo)
+        if entrada is None or not self.estatisticas.atualizada(entrada['versao']):
+            entrada = self._construir(self.estatisticas.obter(periodo))
+            with self._lock:
+                self._cache[periodo] = entrada
+        return entrada
+
+    def avaliar(self, alocacao: Dict[str, float], periodo: str = '5y') -> Dict:
+        """
+        Posiciona uma alocação em relação à fronteira do período
+
+        Returns:
+            Dict com as métricas da carteira, o retorno máximo da fronteira
+            com volatilidade até a dela e a distância até esse retorno (p.p.)
+        """
+        fronteira = self.obter(periodo)
+        pesos = self.estatisticas.vetor_pesos(alocacao, periodo)
+        if pesos.size == 0 or len(fronteira['fronteira']) == 0:
+            return {}
+
+        metricas = self._avaliar(pesos[None, :], self.estatisticas.obter(periodo)['retornos'])
+        carteira = {chave: float(valores[0]) for chave, valores in metricas.items()}
+
+        # Melhor retorno da fronteira sem assumir mais risco que a carteira
+        indices = fronteira['fronteira']
+        volatilidades = fronteira['volatilidade_anual'][indices]
+        posicao = np.searchsorted(volatilidades, carteira['volatilidade_anual'], side='right')
+        retorno_fronteira = float(fronteira['retorno_anual'][indices[max(posicao - 1, 0)]])
+
+        carteira.update({
+            'retorno_fronteira_mesmo_risco': retorno_fronteira,
+            'distancia_fronteira': max(retorno_fronteira - carteira['retorno_anual'], 0.0),
+        })
+        return carteira
+
+    def reconstruir(self):
+        """Recalcula as fronteiras de todos os períodos em cache e troca o cache de uma vez"""
+        with self._lock:
+            periodos = list(self._cache)
+        entradas = {periodo: self._construir(self.estatisticas.obter(periodo)) for periodo in periodos}
+        with self._lock:
+            self._cache.update(entradas)
+
+    def invalidar(self, periodo: Optional[str] = None):
+        """Descarta a fronteira de um período (ou de todos)"""
+        with self._lock:
+            if periodo is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(periodo, None)
+
+    def _construir(self, estatisticas: Dict) -> Dict:
+        retornos = estatisticas['retornos']
+        num_classes = len(estatisticas['classes'])
+
+        if len(retornos) < 2 or num_classes == 0:
+            vazio = np.array([])
+            return {
+                'versao': estatisticas['versao'], 'classes': estatisticas['classes'],
+                'pesos': np.empty((0, num_classes)), 'retorno_anual': vazio, 'volatilidade_anual': vazio,
+                'sharpe_ratio': vazio, 'max_drawdown': vazio, 'fronteira': np.array([], dtype=np.int64),
+            }
+
+        # Dirichlet uniforme cobre o interior; alpha pequeno gera carteiras
+        # concentradas, e as carteiras de uma só classe fecham os vértices
+        rng = np.random.default_rng(self.seed)
+        metade = self.num_carteiras // 2
+        pesos = np.vstack([
+            np.eye(num_classes),
+            rng.dirichlet(np.ones(num_classes), metade),
+            rng.dirichlet(np.full(num_classes, 0.2), self.num_carteiras - metade),
+        ])
+
+        metricas = self._avaliar(pesos, retornos)
+
+        # Pareto (menor volatilidade, maior retorno): percorre por volatilidade
+        # crescente e mantém quem supera o melhor retorno visto até então
+        ordem = np.lexsort((-metricas['retorno_anual'], metricas['volatilidade_anual']))
+        retorno_ordenado = metricas['retorno_anual'][ordem]
+        melhor_anterior = np.concatenate([[-np.inf], np.maximum.accumulate(retorno_ordenado)[:-1]])
+
+        return {
+            'versao': estatisticas['versao'],
+            'classes': estatisticas['classes'],
+            'pesos': pesos,
+            **metricas,
+            'fronteira': ordem[retorno_ordenado > melhor_anterior],
+        }
+
+    @staticmethod
+    def _avaliar(pesos: np.ndarray, retornos: np.ndarray) -> Dict[str, np.ndarray]:
+        """Métricas históricas de várias carteiras (carteiras x classes) de uma vez"""
+        metricas = metricas_carteiras(pesos @ retornos.T, 1.0, 0.0)
+        return {
+            'retorno_anual': metricas['retorno_anualizado'],
+            'volatilidade_anual': metricas['volatilidade_anual'],
+            'sharpe_ratio': metricas['sharpe_ratio'],
+            'max_drawdown': metricas['max_drawdown'],
+        }
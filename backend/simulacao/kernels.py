@@ -0,0 +1,695 @@
+"""
+Kernels vetorizados de simulação
+Funções NumPy puras compartilhadas entre Monte Carlo e Backtesting
+"""
+
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+
+# Meses entre rebalanceamentos de calendário
+FREQUENCIAS_REBALANCEAMENTO = {'nenhum': 0, 'mensal': 1, 'trimestral': 3, 'semestral': 6, 'anual': 12}
+
+
+def evolucao_patrimonio(retornos: np.ndarray, valor_inicial, fluxos) -> np.ndarray:
+    """
+    Calcula W_t = W_{t-1} * (1 + r_t) + c_t para todos os períodos sem loop em Python
+
+    Usa a forma fechada W_t = G_t * (W_0 + soma_{s<=t} c_s / G_s), onde G_t é o
+    fator de crescimento acumulado até o período t.
+
+    Args:
+        retornos: Array (..., meses) com o retorno de cada período
+        valor_inicial: Patrimônio inicial (escalar ou array com shape (...))
+        fluxos: Aporte de cada período (escalar ou broadcastável para (..., meses))
+
+    Returns:
+        Array (..., meses) com o patrimônio ao final de cada período
+    """
+    retornos = np.asarray(retornos, dtype=float)
+    crescimento = np.cumprod(1.0 + retornos, axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fluxos_descontados = np.cumsum(np.asarray(fluxos, dtype=float) / crescimento, axis=-1)
+
+    base = np.expand_dims(np.asarray(valor_inicial, dtype=float), -1)
+    return crescimento * (base + fluxos_descontados)
+
+
+def evolucao_com_rebalanceamento(
+    retornos: np.ndarray,
+    pesos_alvo: np.ndarray,
+    valor_inicial,
+    fluxos: np.ndarray,
+    frequencia: int = 0,
+    banda: Optional[float] = None,
+    custos=0.0
+) -> Dict[str, np.ndarray]:
+    """
+    Evolução de carteiras multiativos com rebalanceamento periódico ou por bandas
+
+    Aportes entram nas proporções alvo; resgates saem na proporção das
+    posições atuais, então nenhuma posição fica negativa (um resgate maior
+    que o patrimônio zera a carteira). Sem rebalanceamento e sem resgates
+    usa a forma fechada por ativo; caso contrário, percorre os meses
+    atualizando todas as carteiras de uma vez, com o rebalanceamento
+    aplicado por máscara.
+
+    Args:
+        retornos: Array (N ou 1, meses, ativos) de retornos por ativo
+        pesos_alvo: Array (N, ativos) ou (ativos,) de pesos alvo (soma 1)
+        valor_inicial: Patrimônio inicial (escalar ou (N,))
+        fluxos: Array (meses,) com aporte/resgate ao final de cada mês
+        frequencia: Rebalancear a cada `frequencia` meses (0 = nunca)
+        banda: Rebalancear quando algum peso se afastar do alvo mais que a banda
+        custos: Custo proporcional por unidade negociada (escalar ou (ativos,))
+
+    Returns:
+        Dict com 'patrimonio' (N, meses) e, por carteira (N,), 'custos' pagos,
+        'rebalanceamentos' realizados e 'desvio_maximo' dos pesos em relação ao alvo
+    """
+    retornos = np.asarray(retornos, dtype=float)
+    pesos_alvo = np.atleast_2d(np.asarray(pesos_alvo, dtype=float))
+    fluxos = np.asarray(fluxos, dtype=float)
+    valor_inicial = np.asarray(valor_inicial, dtype=float).reshape(-1, 1)
+    num_carteiras = max(retornos.shape[0], pesos_alvo.shape[0], valor_inicial.shape[0])
+    meses = retornos.shape[1]
+
+    if frequencia == 0 and banda is None and not (fluxos < 0).any():
+        # Buy-and-hold com aportes: cada ativo evolui sozinho (ativos x meses)
+        posicoes = evolucao_patrimonio(
+            np.swapaxes(retornos, 1, 2),
+            valor_inicial * pesos_alvo,
+            fluxos * pesos_alvo[:, :, None]
+        )
+        patrimonio = posicoes.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            desvio = np.abs(posicoes / patrimonio[:, None, :] - pesos_alvo[:, :, None]).max(axis=1)
+
+        return {
+            'patrimonio': np.broadcast_to(patrimonio, (num_carteiras, meses)),
+            'custos': np.zeros(num_carteiras),
+            'rebalanceamentos': np.zeros(num_carteiras, dtype=np.int64),
+            'desvio_maximo': np.nan_to_num(desvio.max(axis=-1, initial=0.0)) * np.ones(num_carteiras),
+        }
+
+    custos = np.asarray(custos, dtype=float)
+    posicoes = np.broadcast_to(valor_inicial * pesos_alvo, (num_carteiras, pesos_alvo.shape[1])).copy()
+    patrimonio = np.empty((num_carteiras, meses))
+    custos_pagos = np.zeros(num_carteiras)
+    rebalanceamentos = np.zeros(num_carteiras, dtype=np.int64)
+    desvio_maximo = np.zeros(num_carteiras)
+
+    for mes in range(meses):
+        posicoes *= 1.0 + retornos[:, mes, :]
+        if fluxos[mes] >= 0:
+            posicoes += fluxos[mes] * pesos_alvo
+        else:
+            # Resgate proporcional às posições: vender pelo alvo criaria posições vendidas
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fator = np.nan_to_num(1.0 + fluxos[mes] / posicoes.sum(axis=1), nan=0.0)
+            posicoes *= np.maximum(fator, 0.0)[:, None]
+        total = posicoes.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            desvio = np.nan_to_num(np.abs(posicoes / total[:, None] - pesos_alvo).max(axis=1))
+        np.maximum(desvio_maximo, desvio, out=desvio_maximo)
+
+        if banda is not None:
+            rebalancear = desvio > banda
+        elif frequencia and (mes + 1) % frequencia == 0:
+            rebalancear = np.ones(num_carteiras, dtype=bool)
+        else:
+            rebalancear = None
+
+        if rebalancear is not None and rebalancear.any():
+            custo = (np.abs(total[:, None] * pesos_alvo - posicoes) * custos).sum(axis=1)
+            custo = np.where(rebalancear, custo, 0.0)
+            alvo = (total - custo)[:, None] * pesos_alvo
+            posicoes = np.where(rebalancear[:, None], alvo, posicoes)
+            custos_pagos += custo
+            rebalanceamentos += rebalancear
+            total = total - custo
+
+        patrimonio[:, mes] = total
+
+    return {
+        'patrimonio': patrimonio,
+        'custos': custos_pagos,
+        'rebalanceamentos': rebalanceamentos,
+        'desvio_maximo': desvio_maximo,
+    }
+
+
+def expandir_fluxos(
+    fluxos: Optional[Union[Sequence[float], Dict]],
+    meses: int,
+    aporte_mensal: float = 0.0
+) -> np.ndarray:
+    """
+    Converte um cronograma de fluxos em vetor mensal (positivo = aporte, negativo = resgate)
+
+    Args:
+        fluxos: None (aporte_mensal constante), vetor mensal (completado com
+            zeros ou truncado em `meses`) ou descrição compacta com as chaves
+            opcionais:
+                'aporte_mensal': aporte base (padrão: argumento aporte_mensal)
+                'reajuste_anual': reajuste do aporte a cada 12 meses (ex: 0.05)
+                'fim_aportes': último mês (1-based) com aporte
+                'inicio_resgate': primeiro mês (1-based) de resgate
+                'resgate_mensal': valor resgatado por mês a partir do início
+                'aportes_extras': {mes: valor} com aportes/resgates pontuais
+        meses: Número de meses do vetor
+        aporte_mensal: Aporte usado quando não especificado
+
+    Returns:
+        Array (meses,) com o fluxo ao final de cada mês
+    """
+    if fluxos is None:
+        return np.full(meses, float(aporte_mensal))
+
+    if not isinstance(fluxos, dict):
+        vetor = np.zeros(meses)
+        valores = np.asarray(fluxos, dtype=float)[:meses]
+        vetor[:len(valores)] = valores
+        return vetor
+
+    mes = np.arange(1, meses + 1)
+    inicio_resgate = fluxos.get('inicio_resgate')
+    fim_aportes = fluxos.get('fim_aportes', inicio_resgate - 1 if inicio_resgate else meses)
+
+    base = float(fluxos.get('aporte_mensal', aporte_mensal))
+    reajuste = float(fluxos.get('reajuste_anual', 0.0))
+    vetor = np.where(mes <= fim_aportes, base * (1 + reajuste) ** ((mes - 1) // 12), 0.0)
+
+    if inicio_resgate:
+        vetor -= np.where(mes >= inicio_resgate, float(fluxos.get('resgate_mensal', 0.0)), 0.0)
+
+    for mes_extra, valor in fluxos.get('aportes_extras', {}).items():
+        if 1 <= int(mes_extra) <= meses:
+            vetor[int(mes_extra) - 1] += float(valor)
+
+    return vetor
+
+
+def aplicar_ruina(patrimonio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Torna a ruína absorvente: após o primeiro mês com patrimônio <= 0, tudo vira zero
+
+    Args:
+        patrimonio: Array (..., meses) de trajetórias
+
+    Returns:
+        (trajetórias com ruína aplicada, mês 1-based da ruína ou 0 se não houve)
+    """
+    arruinado = patrimonio <= 0
+    houve_ruina = arruinado.any(axis=-1)
+    primeiro = np.argmax(arruinado, axis=-1)
+
+    meses = np.arange(patrimonio.shape[-1])
+    apos_ruina = houve_ruina[..., None] & (meses >= primeiro[..., None])
+
+    return np.where(apos_ruina, 0.0, patrimonio), np.where(houve_ruina, primeiro + 1, 0)
+
+
+def metricas_trajetoria(
+    patrimonio: np.ndarray,
+    retornos: np.ndarray,
+    valor_inicial,
+    total_aportado: np.ndarray,
+    janela: int = 12
+) -> Dict[str, np.ndarray]:
+    """
+    Métricas dependentes da trajetória, uma por caminho, com acumulações vetorizadas
+
+    Args:
+        patrimonio: Array (caminhos x meses) do patrimônio ao final de cada mês
+        retornos: Array (caminhos x meses) dos retornos de cada mês
+        valor_inicial: Patrimônio no mês 0
+        total_aportado: Array (meses,) com valor inicial + fluxos acumulados
+        janela: Meses da janela do pior retorno acumulado
+
+    Returns:
+        Dict de arrays (caminhos,):
+            'drawdown_maximo': maior queda desde o pico (%, negativa)
+            'tempo_submerso': % dos meses abaixo do pico anterior
+            'duracao_maxima_submerso': maior sequência de meses abaixo do pico
+            'pior_retorno_janela': pior retorno composto em `janela` meses (%)
+            'abaixo_aportado': se o patrimônio ficou abaixo do total aportado
+    """
+    meses = patrimonio.shape[-1]
+    pico = np.maximum(np.maximum.accumulate(patrimonio, axis=-1), valor_inicial)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.nan_to_num(patrimonio / pico - 1.0)
+    submerso = patrimonio < pico
+
+    # Duração: meses desde o último pico (mês 0 conta como pico)
+    t = np.arange(1, meses + 1)
+    ultimo_pico = np.maximum.accumulate(np.where(submerso, 0, t), axis=-1)
+
+    if meses >= janela:
+        log_acumulado = np.cumsum(np.log(np.maximum(1.0 + retornos, 1e-12)), axis=-1)
+        inicio = np.concatenate(
+            [np.zeros(log_acumulado.shape[:-1] + (1,)), log_acumulado[..., :-janela]], axis=-1
+        )
+        pior_janela = np.expm1((log_acumulado[..., janela - 1:] - inicio).min(axis=-1)) * 100
+    else:
+        pior_janela = np.full(patrimonio.shape[:-1], np.nan)
+
+    return {
+        'drawdown_maximo': drawdown.min(axis=-1) * 100,
+        'tempo_submerso': submerso.mean(axis=-1) * 100,
+        'duracao_maxima_submerso': (t - ultimo_pico).max(axis=-1),
+        'pior_retorno_janela': pior_janela,
+        'abaixo_aportado': (patrimonio < total_aportado).any(axis=-1),
+    }
+
+
+def metricas_carteiras(
+    retornos: np.ndarray,
+    valor_inicial,
+    fluxos,
+    taxa_livre_risco: float = 0.11,
+    periodos_ano: int = 12
+) -> Dict[str, np.ndarray]:
+    """
+    Patrimônio e métricas de backtest de várias carteiras (carteiras x meses) de uma vez
+
+    A trajetória usa a forma fechada de evolucao_patrimonio com ruína
+    absorvente, o drawdown vem de np.maximum.accumulate e média e variância
+    saem de uma única passada (somas de r e r², deslocadas pelo primeiro
+    retorno para não perder precisão).
+
+    Args:
+        retornos: Array (carteiras x meses) de retornos de cada período
+        valor_inicial: Patrimônio inicial (escalar ou (carteiras,))
+        fluxos: Aporte/resgate de cada período (escalar ou broadcastável para (carteiras, meses))
+        taxa_livre_risco: Taxa anual usada no Sharpe (ex: 0.11 = 11%)
+        periodos_ano: Períodos por ano (12 para dados mensais)
+
+    Returns:
+        Dict com 'patrimonio' (carteiras x meses + 1, começando no valor
+        inicial) e arrays (carteiras,): 'patrimonio_final', 'total_aportado',
+        'rentabilidade_total', 'retorno_anualizado', 'volatilidade_anual',
+        'sharpe_ratio', 'max_drawdown', 'melhor_mes', 'pior_mes' (em %) e
+        'mes_ruina' (0 = sem ruína)
+    """
+    retornos = np.atleast_2d(np.asarray(retornos, dtype=float))
+    num_carteiras, meses = retornos.shape
+    valor_inicial = np.broadcast_to(np.asarray(valor_inicial, dtype=float), (num_carteiras,))
+    fluxos = np.broadcast_to(np.asarray(fluxos, dtype=float), (num_carteiras, meses))
+
+    trajetoria, mes_ruina = aplicar_ruina(evolucao_patrimonio(retornos, valor_inicial, fluxos))
+    patrimonio = np.concatenate([valor_inicial[:, None], trajetoria], axis=1)
+    final = patrimonio[:, -1]
+    total_aportado = valor_inicial + fluxos.sum(axis=1)
+
+    pico = np.maximum.accumulate(patrimonio, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = (patrimonio / pico - 1.0).min(axis=1) * 100
+
+        # Momentos em uma passada: soma e soma dos quadrados dos desvios ao primeiro retorno
+        deslocados = retornos - retornos[:, :1]
+        soma = deslocados.sum(axis=1)
+        soma_quadrados = np.einsum('ij,ij->i', deslocados, deslocados)
+        variancia = (soma_quadrados - soma ** 2 / meses) / (meses - 1)
+        volatilidade = np.sqrt(np.maximum(variancia, 0.0) * periodos_ano) * 100
+
+        anos = np.float64(meses / periodos_ano)
+        retorno_anual = ((final / valor_inicial) ** (1 / anos) - 1) * 100
+        sharpe = np.where(volatilidade > 0, (retorno_anual - taxa_livre_risco * 100) / volatilidade, 0.0)
+
+        return {
+            'patrimonio': patrimonio,
+            'patrimonio_final': final,
+            'total_aportado': total_aportado,
+            'rentabilidade_total': (final - total_aportado) / total_aportado * 100,
+            'retorno_anualizado': retorno_anual,
+            'volatilidade_anual': volatilidade,
+            'sharpe_ratio': sharpe,
+            'max_drawdown': drawdown,
+            'melhor_mes': retornos.max(axis=1, initial=-np.inf) * 100,
+            'pior_mes': retornos.min(axis=1, initial=np.inf) * 100,
+            'mes_ruina': mes_ruina,
+        }
+
+
+def metricas_janelas(
+    retornos: np.ndarray,
+    janela: int,
+    taxa_livre_risco: float = 0.11,
+    periodos_ano: int = 12
+) -> Dict[str, np.ndarray]:
+    """
+    Métricas de todas as janelas móveis de `janela` períodos de várias carteiras
+
+    Retorno e volatilidade de cada janela saem de diferenças de somas
+    acumuladas (log-retornos, r e r² deslocados pela média), então todas as
+    janelas custam O(T). O drawdown também é O(T) (ver _quedas_janelas):
+    cada janela é um sufixo de um bloco do log-patrimônio mais um prefixo
+    do bloco seguinte, com agregados de prefixo e sufixo pré-calculados.
+
+    Args:
+        retornos: Array (carteiras x meses) de retornos de cada período
+        janela: Número de períodos de cada janela (2 <= janela <= meses)
+        taxa_livre_risco: Taxa anual usada no Sharpe (ex: 0.11 = 11%)
+        periodos_ano: Períodos por ano (12 para dados mensais)
+
+    Returns:
+        Dict de arrays (carteiras x janelas), a janela j cobrindo os períodos
+        j .. j + janela - 1: 'retorno_anualizado', 'volatilidade_anual',
+        'sharpe_ratio' e 'max_drawdown' (em %)
+    """
+    retornos = np.atleast_2d(np.asarray(retornos, dtype=float))
+    num_carteiras, meses = retornos.shape
+    if not 2 <= janela <= meses:
+        raise ValueError(f"Janela deve ter entre 2 e {meses} períodos")
+
+    def somas_janela(valores):
+        acumulado = np.zeros((num_carteiras, meses + 1))
+        np.cumsum(valores, axis=1, out=acumulado[:, 1:])
+        return acumulado[:, janela:] - acumulado[:, :-janela], acumulado
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Log-retornos: o crescimento da janela é exp(soma); ruína (r <= -100%) vira -inf
+        log_retornos = np.log1p(np.maximum(retornos, -1.0))
+        soma_log, log_patrimonio = somas_janela(log_retornos)
+        retorno_anual = np.expm1(soma_log * (periodos_ano / janela)) * 100
+
+        deslocados = retornos - retornos.mean(axis=1, keepdims=True)
+        soma, _ = somas_janela(deslocados)
+        soma_quadrados, _ = somas_janela(deslocados * deslocados)
+        variancia = (soma_quadrados - soma ** 2 / janela) / (janela - 1)
+        volatilidade = np.sqrt(np.maximum(variancia, 0.0) * periodos_ano) * 100
+        sharpe = np.where(volatilidade > 0, (retorno_anual - taxa_livre_risco * 100) / volatilidade, 0.0)
+
+        drawdown = np.nan_to_num(np.expm1(-_quedas_janelas(log_patrimonio, janela + 1)), nan=-1.0) * 100
+
+    return {
+        'retorno_anualizado': retorno_anual,
+        'volatilidade_anual': volatilidade,
+        'sharpe_ratio': sharpe,
+        'max_drawdown': drawdown,
+    }
+
+
+def _quedas_janelas(valores: np.ndarray, tamanho: int) -> np.ndarray:
+    """
+    Maior queda (pico anterior menos vale posterior) em cada janela deslizante, em O(T)
+
+    Esquema em blocos de `tamanho` pontos (van Herk/Gil-Werman): a janela
+    que começa em a é o sufixo de seu bloco mais o prefixo do seguinte. Por
+    bloco guardam-se máximo, mínimo e maior queda de cada prefixo e sufixo
+    (acumulações vetorizadas), e a queda da janela é a maior entre a do
+    sufixo, a do prefixo e o máximo do sufixo menos o mínimo do prefixo.
+
+    Args:
+        valores: Array (séries x pontos)
+        tamanho: Pontos por janela
+
+    Returns:
+        Array (séries x janelas) com a maior queda (>= 0) de cada janela
+    """
+    num_series, pontos = valores.shape
+    num_janelas = pontos - tamanho + 1
+    num_blocos = -(-pontos // tamanho)
+    blocos = np.pad(valores, ((0, 0), (0, num_blocos * tamanho - pontos)), mode='edge')
+    blocos = blocos.reshape(num_series, num_blocos, tamanho)
+
+    maximo_prefixo = np.maximum.accumulate(blocos, axis=-1)
+    minimo_prefixo = np.minimum.accumulate(blocos, axis=-1)
+    queda_prefixo = np.maximum.accumulate(maximo_prefixo - blocos, axis=-1)
+
+    invertidos = blocos[..., ::-1]
+    minimo_sufixo = np.minimum.accumulate(invertidos, axis=-1)
+    maximo_sufixo = np.maximum.accumulate(invertidos, axis=-1)[..., ::-1]
+    queda_sufixo = np.maximum.accumulate(invertidos - minimo_sufixo, axis=-1)[..., ::-1]
+
+    def planos(agregado):
+        return agregado.reshape(num_series, -1)
+
+    inicio = np.arange(num_janelas)
+    fim = inicio + tamanho - 1
+    queda = np.maximum(
+        np.maximum(planos(queda_sufixo)[:, inicio], planos(queda_prefixo)[:, fim]),
+        planos(maximo_sufixo)[:, inicio] - planos(minimo_prefixo)[:, fim]
+    )
+    # Janela alinhada a um bloco: é o próprio bloco (sufixo inteiro)
+    alinhadas = inicio % tamanho == 0
+    queda[:, alinhadas] = planos(queda_sufixo)[:, inicio[alinhadas]]
+    return queda
+
+
+def indices_bootstrap_blocos(
+    rng: np.random.Generator,
+    num_observacoes: int,
+    num_caminhos: int,
+    meses: int,
+    tamanho_bloco: int
+) -> np.ndarray:
+    """
+    Gera índices de um bootstrap circular por blocos contíguos
+
+    Returns:
+        Array (num_caminhos, meses) de índices em [0, num_observacoes)
+    """
+    bloco = max(1, min(tamanho_bloco, num_observacoes))
+    num_blocos = -(-meses // bloco)
+
+    inicios = rng.integers(0, num_observacoes, size=(num_caminhos, num_blocos))
+    indices = (inicios[:, :, None] + np.arange(bloco)) % num_observacoes
+
+    return indices.reshape(num_caminhos, -1)[:, :meses]
+
+
+def projecao_deterministica(taxas, valor_inicial, aporte, meses: int) -> np.ndarray:
+    """
+    Trajetória com taxa e aporte constantes em forma fechada (série geométrica)
+
+    W_t = W_0 * (1 + r)^t + a * ((1 + r)^t - 1) / r, com W_t = W_0 + a * t quando r = 0
+
+    Args:
+        taxas: Taxas mensais (escalar ou array com shape (...))
+        valor_inicial: Patrimônio inicial (broadcastável para (...))
+        aporte: Aporte mensal (broadcastável para (...))
+        meses: Número de meses projetados
+
+    Returns:
+        Array (..., meses + 1) com o patrimônio do mês 0 ao mês final
+    """
+    taxas = np.expand_dims(np.asarray(taxas, dtype=float), -1)
+    t = np.arange(meses + 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crescimento = np.power(1.0 + taxas, t)
+        # expm1/log1p mantém precisão para taxas próximas de zero
+        anuidade = np.where(taxas > -1, np.expm1(t * np.log1p(taxas)), crescimento - 1.0) / taxas
+        anuidade = np.where(taxas == 0, t, anuidade)
+
+    base = np.expand_dims(np.asarray(valor_inicial, dtype=float), -1)
+    fluxo = np.expand_dims(np.asarray(aporte, dtype=float), -1)
+    return base * crescimento + fluxo * anuidade
+
+
+class AcumuladorQuantis:
+    """
+    Quantis por coluna acumulados em streaming (blocos de linhas)
+
+    Cada coluna mantém um histograma de grade fixa na escala asinh(x / escala),
+    que é quase logarítmica para patrimônios assimétricos e aceita valores
+    negativos. A grade é definida pelo primeiro bloco com folga de 50% para
+    cada lado; valores fora dela caem nas caixas das pontas, cujos limites
+    usam o mínimo/máximo exatos observados. Quantis são preservados por
+    transformações monótonas, então a conversão de volta é exata. A memória
+    é O(colunas x caixas), independente do número de linhas.
+    """
+
+    def __init__(self, num_colunas: int, num_caixas: int = 2048):
+        self.num_colunas = num_colunas
+        self.num_caixas = num_caixas
+        self.contagens = np.zeros((num_colunas, num_caixas), dtype=np.int64)
+        self._minimo = np.full(num_colunas, np.inf)
+        self._maximo = np.full(num_colunas, -np.inf)
+        self._escala = None
+        self._inicio = None
+        self._largura = None
+
+    def adicionar(self, valores: np.ndarray):
+        """Acumula um bloco (linhas x colunas)"""
+        valores = np.asarray(valores, dtype=float)
+        if valores.size == 0:
+            return
+
+        if self._escala is None:
+            escala = np.median(np.abs(valores), axis=0)
+            self._escala = np.where(escala > 0, escala, 1.0)
+        valores = np.arcsinh(valores / self._escala)
+
+        self._minimo = np.minimum(self._minimo, valores.min(axis=0))
+        self._maximo = np.maximum(self._maximo, valores.max(axis=0))
+
+        if self._inicio is None:
+            amplitude = self._maximo - self._minimo
+            amplitude = np.where(amplitude > 0, amplitude, np.maximum(np.abs(self._maximo), 1.0))
+            self._inicio = self._minimo - 0.5 * amplitude
+            self._largura = 2.0 * amplitude / self.num_caixas
+
+        caixas = ((valores - self._inicio) / self._largura).astype(np.int64)
+        np.clip(caixas, 0, self.num_caixas - 1, out=caixas)
+
+        indices = caixas + np.arange(self.num_colunas) * self.num_caixas
+        self.contagens += np.bincount(
+            indices.ravel(), minlength=self.num_colunas * self.num_caixas
+        ).reshape(self.num_colunas, self.num_caixas)
+
+    def quantis(self, probabilidades) -> np.ndarray:
+        """
+        Quantis interpolados linearmente dentro da caixa
+
+        Returns:
+            Array (len(probabilidades) x colunas)
+        """
+        probabilidades = np.asarray(probabilidades, dtype=float)
+        acumulado = np.cumsum(self.contagens, axis=1)
+        total = acumulado[:, -1]
+
+        alvo = probabilidades[:, None] * total  # (probs x colunas)
+        caixa = np.minimum((acumulado[None, :, :] < alvo[:, :, None]).sum(axis=2), self.num_caixas - 1)
+
+        colunas = np.arange(self.num_colunas)
+        antes = np.where(caixa > 0, acumulado[colunas, caixa - 1], 0)
+        dentro = self.contagens[colunas, caixa]
+
+        # Caixas das pontas também recebem valores fora da grade
+        inicio_caixa = self._inicio + caixa * self._largura
+        inicio = np.where(caixa == 0, self._minimo, np.maximum(inicio_caixa, self._minimo))
+        fim = np.where(
+            caixa == self.num_caixas - 1, self._maximo,
+            np.minimum(inicio_caixa + self._largura, self._maximo)
+        )
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fracao = np.where(dentro > 0, (alvo - antes) / dentro, 0.0)
+
+        return np.sinh(inicio + np.clip(fracao, 0.0, 1.0) * (fim - inicio)) * self._escala
+
+
+class EstadoBacktest:
+    """
+    Estado resumível do backtest de uma carteira
+
+    Guarda só o necessário para continuar as métricas de metricas_carteiras
+    quando chegam barras novas: último patrimônio, pico corrente, pior
+    drawdown, momentos dos retornos (Welford, combinados por bloco),
+    extremos e ruína. Atualizar com k barras custa O(k) e o resultado é o
+    mesmo de recalcular tudo sobre a série completa.
+    """
+
+    CAMPOS = (
+        'valor_inicial', 'patrimonio', 'pico', 'queda_maxima', 'total_aportado',
+        'meses', 'media', 'm2', 'melhor', 'pior', 'mes_ruina'
+    )
+
+    def __init__(self, valor_inicial: float):
+        self.valor_inicial = float(valor_inicial)
+        self.patrimonio = float(valor_inicial)
+        self.pico = float(valor_inicial)
+        self.queda_maxima = 0.0
+        self.total_aportado = float(valor_inicial)
+        self.meses = 0
+        self.media = 0.0
+        self.m2 = 0.0  # Soma dos quadrados dos desvios à média
+        self.melhor = -np.inf
+        self.pior = np.inf
+        self.mes_ruina = 0
+
+    def atualizar(self, retornos: np.ndarray, fluxos=0.0) -> np.ndarray:
+        """
+        Incorpora k barras novas
+
+        Args:
+            retornos: Array (k,) de retornos das barras novas
+            fluxos: Aporte/resgate de cada barra (escalar ou (k,))
+
+        Returns:
+            Array (k,) com o patrimônio ao final de cada barra nova
+        """
+        retornos = np.asarray(retornos, dtype=float)
+        fluxos = np.broadcast_to(np.asarray(fluxos, dtype=float), retornos.shape)
+        num_barras = len(retornos)
+        if num_barras == 0:
+            return np.empty(0)
+
+        if self.mes_ruina:
+            trajetoria = np.zeros(num_barras)
+        else:
+            trajetoria, mes_ruina = aplicar_ruina(evolucao_patrimonio(retornos, self.patrimonio, fluxos))
+            if mes_ruina:
+                self.mes_ruina = self.meses + int(mes_ruina)
+
+        picos = np.maximum.accumulate(np.concatenate([[self.pico], trajetoria]))[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.queda_maxima = float(np.minimum(self.queda_maxima, (trajetoria / picos - 1.0).min()))
+
+        # Welford por bloco: combina (n, média, M2) acumulados com os do bloco novo
+        media_bloco = retornos.mean()
+        m2_bloco = float(((retornos - media_bloco) ** 2).sum())
+        total = self.meses + num_barras
+        delta = media_bloco - self.media
+        self.m2 += m2_bloco + delta ** 2 * self.meses * num_barras / total
+        self.media += delta * num_barras / total
+
+        self.melhor = max(self.melhor, float(retornos.max()))
+        self.pior = min(self.pior, float(retornos.min()))
+        self.total_aportado += float(fluxos.sum())
+        self.meses = total
+        self.patrimonio = float(trajetoria[-1])
+        self.pico = float(picos[-1])
+        return trajetoria
+
+    def metricas(self, taxa_livre_risco: float = 0.11, periodos_ano: int = 12) -> Dict[str, float]:
+        """Mesmas métricas (e unidades) de metricas_carteiras, sem a trajetória"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variancia = self.m2 / (self.meses - 1) if self.meses > 1 else np.nan
+            volatilidade = float(np.sqrt(max(variancia, 0.0) * periodos_ano) * 100)
+            anos = np.float64(self.meses / periodos_ano)
+            final, total_aportado = np.float64(self.patrimonio), np.float64(self.total_aportado)
+            retorno_anual = float(((final / np.float64(self.valor_inicial)) ** (1 / anos) - 1) * 100)
+            sharpe = (retorno_anual - taxa_livre_risco * 100) / volatilidade if volatilidade > 0 else 0.0
+
+            return {
+                'patrimonio_final': self.patrimonio,
+                'total_aportado': self.total_aportado,
+                'rentabilidade_total': float((final - total_aportado) / total_aportado * 100),
+                'retorno_anualizado': retorno_anual,
+                'volatilidade_anual': volatilidade,
+                'sharpe_ratio': sharpe,
+                'max_drawdown': self.queda_maxima * 100,
+                'melhor_mes': self.melhor * 100,
+                'pior_mes': self.pior * 100,
+                'mes_ruina': self.mes_ruina,
+            }
+
+    def para_dict(self) -> Dict:
+        """
+        Estado serializável (JSON) para persistir entre execuções
+
+        Extremos ainda vazios (±inf, sem nenhuma barra) viram None, já que
+        JSON não representa infinito.
+        """
+        dados = {campo: getattr(self, campo) for campo in self.CAMPOS}
+        for campo in ('melhor', 'pior'):
+            if not np.isfinite(dados[campo]):
+                dados[campo] = None
+        return dados
+
+    @classmethod
+    def de_dict(cls, dados: Dict) -> 'EstadoBacktest':
+        """Reconstrói o estado salvo por para_dict (None mantém o valor inicial do campo)"""
+        estado = cls(dados['valor_inicial'])
+        for campo in cls.CAMPOS:
+            if dados[campo] is not None:
+                setattr(estado, campo, dados[campo])
+        return estado
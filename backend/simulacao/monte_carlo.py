@@ -5,8 +5,37 @@ Gera múltiplos cenários possíveis baseados em dados históricos
 
 import numpy as np
 import pandas as pd
-from typing import Dict, List
-from .backtesting import Backtesting, TICKERS_BRASIL
+from statistics import NormalDist
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+from .backtesting import Backtesting
+from .cache_normais import cache_normais
+from .estatisticas_mercado import EstatisticasMercado
+from .kernels import (
+    FREQUENCIAS_REBALANCEAMENTO, AcumuladorQuantis, aplicar_ruina, evolucao_com_rebalanceamento,
+    evolucao_patrimonio, expandir_fluxos, indices_bootstrap_blocos, metricas_trajetoria,
+    projecao_deterministica
+)
+from .tributacao import patrimonio_liquido
+
+# Semente padrão: alocações diferentes são comparadas sobre os mesmos choques
+SEED_PADRAO = 42
+
+# Percentis das bandas do gráfico em leque
+PERCENTIS_BANDAS = (5, 10, 25, 50, 75, 90, 95)
+
+# Passo (em meses) de cada opção de bandas e modos de simular_cenarios
+PASSOS_BANDAS = {'mensal': 1, 'anual': 12}
+MODOS_SIMULACAO = ('simulacao', 'analitico')
+
+# Grade usada na calibração do modo analítico: horizontes oferecidos na
+# interface e volatilidades mensais de carteiras conservadoras a cripto
+GRADE_CALIBRACAO_ANOS = (5, 10, 15, 20, 30)
+GRADE_CALIBRACAO_VOLATILIDADES = (0.01, 0.03, 0.05, 0.08, 0.12)
+
+# Variância acumulada dos retornos no horizonte (σ² x meses) até a qual o modo
+# analítico fica dentro de 5% da simulação na grade de calibração; acima
+# dela a lognormal subestima a cauda inferior e simular_cenarios simula
+LIMITE_VARIANCIA_ANALITICA = 0.4
 
 
 class MonteCarloSimulation:
@@ -14,6 +43,7 @@ class MonteCarloSimulation:
 
     def __init__(self):
         self.backtesting = Backtesting()
+        self.estatisticas = EstatisticasMercado(self.backtesting)
 
     @staticmethod
     def _safe_float(value, default=0.0):
@@ -33,36 +63,19 @@ class MonteCarloSimulation:
         Returns:
             Dict com 'retorno_medio_mensal' e 'volatilidade_mensal'
         """
-        # Baixar dados históricos de cada ativo
-        retornos_ativos = []
-        pesos = []
-
-        for classe, peso in alocacao.items():
-            if peso > 0.001:
-                ticker = TICKERS_BRASIL.get(classe, '^IRX')
-                dados = self.backtesting.obter_dados_historicos(ticker, periodo_historico)
+        # Momentos por classe ficam em cache; a carteira é só w·μ e sqrt(wᵀΣw)
+        params = self.estatisticas.parametros_carteira(alocacao, periodo_historico)
 
-                if not dados.empty:
-                    retorno = dados['Close'].pct_change().dropna()
-                    retornos_ativos.append(retorno)
-                    pesos.append(peso)
-
-        if not retornos_ativos:
+        if params is None:
             # Valores padrão se não conseguir dados
             return {
                 'retorno_medio_mensal': 0.01,  # 1% ao mês
                 'volatilidade_mensal': 0.03     # 3% de desvio padrão
             }
 
-        # Combinar retornos
-        df_retornos = pd.concat(retornos_ativos, axis=1)
-
-        # Calcular retorno ponderado da carteira
-        retorno_carteira = (df_retornos * pesos).sum(axis=1) / sum(pesos)
-
         return {
-            'retorno_medio_mensal': self._safe_float(retorno_carteira.mean(), 0.01),
-            'volatilidade_mensal': self._safe_float(retorno_carteira.std(), 0.03)
+            'retorno_medio_mensal': self._safe_float(params['retorno_medio_mensal'], 0.01),
+            'volatilidade_mensal': self._safe_float(params['volatilidade_mensal'], 0.03)
         }
 
     def simular_cenarios(
@@ -71,48 +84,822 @@ class MonteCarloSimulation:
         valor_inicial: float = 10000,
         aporte_mensal: float = 0,
         anos: int = 10,
-        num_simulacoes: int = 1000
+        num_simulacoes: int = 1000,
+        bandas: Optional[str] = None,
+        caminhos_por_bloco: int = 2000,
+        modo: str = 'simulacao',
+        seed: Optional[int] = SEED_PADRAO,
+        fluxos: Optional[Union[Sequence[float], Dict]] = None,
+        incluir_metricas_trajetoria: bool = False,
+        liquido: bool = False,
+        regras_tributacao: Optional[Dict[str, Dict]] = None,
+        periodo_historico: str = '5y'
     ) -> Dict:
         """
         Executa simulação de Monte Carlo
 
+        Os caminhos são gerados em blocos, então a memória fica limitada a
+        (caminhos_por_bloco x meses) mesmo com muitas simulações. No modo
+        'analitico' não há amostragem: as mesmas chaves vêm de uma lognormal
+        com os dois primeiros momentos exatos do patrimônio (ver
+        relatorio_calibracao_analitica para o erro contra a simulação). Fora
+        da região calibrada (σ² x meses > LIMITE_VARIANCIA_ANALITICA) o modo
+        analítico recorre à simulação.
+
+        Com seed definida, os retornos são μ + σ·Z sobre a matriz Z compartilhada
+        de cache_normais, então duas alocações diferem só pela carteira e não
+        pelo ruído de amostragem. Com seed=None, sorteia novos retornos.
+
+        Com fluxos, cada mês recebe seu próprio aporte (positivo) ou resgate
+        (negativo); a ruína é absorvente e o resultado inclui a probabilidade
+        de ruína e os percentis do mês em que ela ocorre.
+
+        Com incluir_metricas_trajetoria, cada bloco de caminhos também produz
+        drawdown máximo, tempo submerso, pior retorno em 12 meses e se o
+        patrimônio ficou abaixo do total aportado, resumidos em
+        'metricas_trajetoria'.
+
+        Com liquido, a projeção é após IR e taxas de plataforma: como as regras
+        dependem da classe de ativo, a simulação é delegada a
+        simular_multiativos (sem rebalanceamento), que simula cada classe.
+        É outro modelo (classes com deriva de pesos, não a carteira como ativo
+        único rebalanceado), então a comparação bruto x líquido deve usar
+        resultado['bruto'], calculado sobre os mesmos sorteios e com as mesmas
+        premissas, e não uma chamada com liquido=False. Custa cerca de 9x o
+        modo bruto (0,19 s contra 0,02 s para 5000 caminhos em 20 anos), ainda
+        menos que simular_multiativos bruto, que atualiza as posições mês a mês.
+
         Args:
             alocacao: Alocação da carteira
             valor_inicial: Valor inicial
             aporte_mensal: Aporte mensal
             anos: Horizonte em anos
             num_simulacoes: Número de cenários a simular
+            bandas: 'mensal' ou 'anual' para incluir percentis ao longo do tempo
+            caminhos_por_bloco: Caminhos gerados por bloco
+            modo: 'simulacao' ou 'analitico'
+            seed: Semente da matriz de normais compartilhada (None = aleatória)
+            fluxos: Vetor mensal de fluxos ou cronograma (ver kernels.expandir_fluxos);
+                substitui aporte_mensal
+            incluir_metricas_trajetoria: Incluir métricas de risco dependentes da trajetória
+            liquido: Projetar o patrimônio líquido de impostos e taxas
+            regras_tributacao: Sobrescritas de tributacao.REGRAS_TRIBUTACAO por classe
+            periodo_historico: Período usado para retorno médio e volatilidade
 
         Returns:
             Dict com resultados das simulações
         """
+        if bandas is not None and bandas not in PASSOS_BANDAS:
+            raise ValueError(f"Bandas inválidas: {bandas!r} (opções: None, {', '.join(map(repr, PASSOS_BANDAS))})")
+        if modo not in MODOS_SIMULACAO:
+            raise ValueError(f"Modo inválido: {modo!r} (opções: {', '.join(map(repr, MODOS_SIMULACAO))})")
+
+        if liquido:
+            if modo == 'analitico' or bandas or incluir_metricas_trajetoria:
+                raise ValueError("Modo líquido calcula apenas o patrimônio final simulado")
+            return self.simular_multiativos(
+                alocacao, valor_inicial, aporte_mensal, anos, num_simulacoes,
+                periodo_historico=periodo_historico, caminhos_por_bloco=caminhos_por_bloco, seed=seed,
+                fluxos=fluxos, liquido=True, regras_tributacao=regras_tributacao
+            )
+
         # Obter parâmetros históricos
-        params = self.calcular_parametros_historicos(alocacao)
+        params = self.calcular_parametros_historicos(alocacao, periodo_historico)
         retorno_medio = params['retorno_medio_mensal']
         volatilidade = params['volatilidade_mensal']
 
+        if modo == 'analitico':
+            if fluxos is not None or incluir_metricas_trajetoria:
+                raise ValueError("Modo analítico não suporta cronograma de fluxos nem métricas de trajetória")
+            if volatilidade ** 2 * anos * 12 <= LIMITE_VARIANCIA_ANALITICA:
+                return self._estimar_analitico(
+                    retorno_medio, volatilidade, valor_inicial, aporte_mensal, anos, num_simulacoes, bandas
+                )
+
+        return self._simular_normal(
+            retorno_medio, volatilidade, valor_inicial, aporte_mensal, anos,
+            num_simulacoes, bandas, caminhos_por_bloco, seed, fluxos, incluir_metricas_trajetoria
+        )
+
+    def _simular_normal(
+        self,
+        retorno_medio: float,
+        volatilidade: float,
+        valor_inicial: float,
+        aporte_mensal: float,
+        anos: int,
+        num_simulacoes: int,
+        bandas: Optional[str] = None,
+        caminhos_por_bloco: int = 2000,
+        seed: Optional[int] = None,
+        fluxos: Optional[Union[Sequence[float], Dict]] = None,
+        incluir_metricas_trajetoria: bool = False
+    ) -> Dict:
+        """Simulação com retornos i.i.d. normais, gerada em blocos de caminhos"""
+        meses = anos * 12
+        normais = self._blocos_normais(num_simulacoes, meses, seed, caminhos_por_bloco)
+        fluxos_mensais = expandir_fluxos(fluxos, meses, aporte_mensal)
+        aportado_acumulado = valor_inicial + np.cumsum(fluxos_mensais)
+        com_ruina = fluxos is not None and meses > 0
+        com_metricas = incluir_metricas_trajetoria and meses > 0
+
+        # Meses (1-based) em que as bandas são registradas
+        if bandas is not None and meses > 0:
+            passo = PASSOS_BANDAS[bandas]
+            meses_bandas = np.arange(passo, meses + 1, passo)
+            acumulador = AcumuladorQuantis(len(meses_bandas))
+        else:
+            acumulador = None
+
+        # Pré-alocado: guardar views da última coluna manteria cada bloco inteiro vivo
+        finais = np.empty(num_simulacoes)
+        meses_ruina = []
+        metricas = []
+        for inicio in range(0, num_simulacoes, caminhos_por_bloco):
+            tamanho = min(caminhos_por_bloco, num_simulacoes - inicio)
+
+            # Gerar retornos do bloco de uma vez (distribuição normal)
+            retornos = retorno_medio + volatilidade * next(normais)
+
+            if acumulador is None and not com_ruina and not com_metricas:
+                finais[inicio:inicio + tamanho] = self._patrimonio_final(retornos, valor_inicial, fluxos_mensais)
+                continue
+
+            patrimonio = evolucao_patrimonio(retornos, valor_inicial, fluxos_mensais)
+            if com_ruina:
+                patrimonio, mes_ruina = aplicar_ruina(patrimonio)
+                meses_ruina.append(mes_ruina)
+
+            finais[inicio:inicio + tamanho] = patrimonio[:, -1]
+            if acumulador is not None:
+                acumulador.adicionar(patrimonio[:, meses_bandas - 1])
+            if com_metricas:
+                metricas.append(metricas_trajetoria(patrimonio, retornos, valor_inicial, aportado_acumulado))
+
+        resultado = self._estatisticas_resultados(
+            finais, valor_inicial, aporte_mensal, anos,
+            total_aportado=aportado_acumulado[-1] if meses else valor_inicial
+        )
+
+        if com_metricas:
+            resultado['metricas_trajetoria'] = self._resumir_metricas_trajetoria(metricas)
+
+        if com_ruina:
+            resultado.update(self._estatisticas_ruina(np.concatenate(meses_ruina)))
+
+        if acumulador is not None:
+            quantis = acumulador.quantis(np.array(PERCENTIS_BANDAS) / 100)
+            resultado['bandas'] = self._formatar_bandas(meses_bandas, quantis, valor_inicial)
+
+        return resultado
+
+    def _estimar_analitico(
+        self,
+        retorno_medio: float,
+        volatilidade: float,
+        valor_inicial: float,
+        aporte_mensal: float,
+        anos: int,
+        num_simulacoes: int = 1000,
+        bandas: Optional[str] = None
+    ) -> Dict:
+        """
+        Estatísticas do patrimônio por aproximação lognormal, sem amostragem
+
+        Com retornos i.i.d. de média m e variância v, os momentos do patrimônio
+        seguem E_t = (1 + m) E_{t-1} + a e
+        E[W_t²] = ((1 + m)² + v) E[W_{t-1}²] + 2 a (1 + m) E_{t-1} + a².
+        A lognormal com esses dois momentos fornece percentis e probabilidades.
+        Mínimo e máximo são os quantis esperados dos extremos de
+        num_simulacoes amostras.
+        """
+        meses = anos * 12
+        media, variancia = self._momentos_patrimonio(retorno_medio, volatilidade, valor_inicial, aporte_mensal, meses)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sigma = np.sqrt(np.log1p(variancia / media ** 2))
+            mu = np.log(media) - sigma ** 2 / 2
+
+        normal = NormalDist()
+
+        def quantil(p, indice=-1):
+            return float(np.exp(mu[indice] + sigma[indice] * normal.inv_cdf(p)))
+
+        def probabilidade_abaixo(valor):
+            if valor <= 0:
+                return 0.0
+            if sigma[-1] == 0:
+                return 100.0 if media[-1] < valor else 0.0
+            return normal.cdf((np.log(valor) - mu[-1]) / sigma[-1]) * 100
+
+        resultado = {
+            'num_simulacoes': num_simulacoes,
+            'anos': anos,
+            'valor_inicial': valor_inicial,
+            'aporte_mensal': aporte_mensal,
+            'patrimonio_medio': self._safe_float(media[-1]),
+            'patrimonio_mediano': self._safe_float(np.exp(mu[-1])),
+            'patrimonio_minimo': self._safe_float(quantil(1 / (num_simulacoes + 1))),
+            'patrimonio_maximo': self._safe_float(quantil(num_simulacoes / (num_simulacoes + 1))),
+            'percentil_10': self._safe_float(quantil(0.10)),
+            'percentil_25': self._safe_float(quantil(0.25)),
+            'percentil_75': self._safe_float(quantil(0.75)),
+            'percentil_90': self._safe_float(quantil(0.90)),
+            'desvio_padrao': self._safe_float(np.sqrt(variancia[-1])),
+            'probabilidade_dobrar': self._safe_float(100 - probabilidade_abaixo(valor_inicial * 2)),
+            'probabilidade_perda': self._safe_float(probabilidade_abaixo(valor_inicial + aporte_mensal * meses)),
+        }
+
+        if bandas is not None and meses > 0:
+            passo = PASSOS_BANDAS[bandas]
+            meses_bandas = np.arange(passo, meses + 1, passo)
+            z = np.array([normal.inv_cdf(p / 100) for p in PERCENTIS_BANDAS])
+            quantis = np.exp(mu[meses_bandas] + sigma[meses_bandas] * z[:, None])
+            resultado['bandas'] = self._formatar_bandas(meses_bandas, quantis, valor_inicial)
+
+        return resultado
+
+    @staticmethod
+    def _momentos_patrimonio(
+        retorno_medio: float,
+        volatilidade: float,
+        valor_inicial: float,
+        aporte_mensal: float,
+        meses: int
+    ):
+        """Média e variância exatas do patrimônio em cada mês (0..meses)"""
+        media = projecao_deterministica(retorno_medio, valor_inicial, aporte_mensal, meses)
+        fator_1 = 1 + retorno_medio
+        fator_2 = fator_1 ** 2 + volatilidade ** 2
+
+        segundo_momento = [float(valor_inicial) ** 2]
+        for mes in range(meses):
+            segundo_momento.append(
+                fator_2 * segundo_momento[-1] + 2 * aporte_mensal * fator_1 * media[mes] + aporte_mensal ** 2
+            )
+
+        variancia = np.maximum(np.array(segundo_momento) - media ** 2, 0.0)
+        return media, variancia
+
+    @staticmethod
+    def _formatar_bandas(meses_bandas: np.ndarray, quantis: np.ndarray, valor_inicial: float) -> Dict:
+        """Bandas do gráfico em leque, começando no mês 0 com o valor inicial"""
+        bandas = {'meses': [0] + meses_bandas.tolist()}
+        for percentil, valores in zip(PERCENTIS_BANDAS, quantis):
+            valores = np.nan_to_num(valores, nan=0.0, posinf=0.0, neginf=0.0)
+            bandas[f'percentil_{percentil}'] = [float(valor_inicial)] + valores.tolist()
+        return bandas
+
+    def relatorio_calibracao_analitica(
+        self,
+        retorno_medio: float = 0.008,
+        valor_inicial: float = 10000,
+        aporte_mensal: float = 500,
+        anos_grade: Sequence[int] = GRADE_CALIBRACAO_ANOS,
+        volatilidades_grade: Sequence[float] = GRADE_CALIBRACAO_VOLATILIDADES,
+        num_simulacoes: int = 20000,
+        tolerancia: float = 5.0
+    ) -> List[Dict]:
+        """
+        Erro do modo analítico contra a simulação completa na grade horizonte x volatilidade
+
+        O erro cresce com a variância acumulada σ² x meses: a lognormal
+        subestima a cauda inferior em horizontes longos com volatilidade
+        alta, e esses pontos aparecem com 'dentro_tolerancia' falso. Com a
+        tolerância padrão, todos os pontos com σ² x meses até
+        LIMITE_VARIANCIA_ANALITICA ficam dentro ('calibrado' verdadeiro), e
+        simular_cenarios só usa o modo analítico nesses pontos.
+
+        Returns:
+            Lista com um item por ponto da grade: erro relativo (%) de média,
+            mediana e percentis, e erro absoluto (pontos percentuais) das
+            probabilidades de dobrar e de perda
+        """
+        chaves_valor = ['patrimonio_medio', 'patrimonio_mediano', 'percentil_10',
+                        'percentil_25', 'percentil_75', 'percentil_90', 'desvio_padrao']
+        chaves_probabilidade = ['probabilidade_dobrar', 'probabilidade_perda']
+
+        relatorio = []
+        for anos in anos_grade:
+            for volatilidade in volatilidades_grade:
+                simulado = self._simular_normal(retorno_medio, volatilidade, valor_inicial, aporte_mensal, anos, num_simulacoes)
+                analitico = self._estimar_analitico(retorno_medio, volatilidade, valor_inicial, aporte_mensal, anos, num_simulacoes)
+
+                erros = {
+                    chave: self._safe_float(abs(analitico[chave] / simulado[chave] - 1) * 100)
+                    for chave in chaves_valor
+                }
+                erros.update({
+                    chave: self._safe_float(abs(analitico[chave] - simulado[chave]))
+                    for chave in chaves_probabilidade
+                })
+
+                relatorio.append({
+                    'anos': anos,
+                    'volatilidade_mensal': volatilidade,
+                    'erros': erros,
+                    'erro_maximo_percentis': max(erros[chave] for chave in chaves_valor),
+                    'dentro_tolerancia': max(erros.values()) <= tolerancia,
+                    'calibrado': volatilidade ** 2 * anos * 12 <= LIMITE_VARIANCIA_ANALITICA,
+                })
+
+        return relatorio
+
+    def resolver_meta(
+        self,
+        alocacao: Dict[str, float],
+        valor_alvo: float,
+        variavel: str = 'aporte_mensal',
+        confianca: float = 0.8,
+        valor_inicial: float = 10000,
+        aporte_mensal: float = 0,
+        anos: int = 10,
+        num_simulacoes: int = 2000,
+        anos_maximo: int = 50,
+        seed: Optional[int] = SEED_PADRAO
+    ) -> Dict:
+        """
+        Resolve o valor necessário para atingir uma meta com dada probabilidade
+
+        Usa um único conjunto de retornos simulados (números aleatórios comuns).
+        Em cada caminho o patrimônio final é W = valor_inicial * G + aporte * S,
+        com G o crescimento acumulado e S o valor acumulado de aportes unitários.
+        Isso torna o percentil monótono na variável, que é então resolvida por
+        bisseção sobre os caminhos já calculados, ao custo de uma simulação.
+
+        Args:
+            alocacao: Alocação da carteira
+            valor_alvo: Patrimônio desejado ao final do horizonte
+            variavel: 'aporte_mensal', 'valor_inicial' ou 'anos'
+            confianca: Probabilidade mínima de atingir a meta (0-1)
+            valor_inicial: Valor inicial (ignorado se for a variável resolvida)
+            aporte_mensal: Aporte mensal (ignorado se for a variável resolvida)
+            anos: Horizonte em anos (ignorado se for a variável resolvida)
+            num_simulacoes: Número de cenários a simular
+            anos_maximo: Maior horizonte considerado ao resolver 'anos'
+            seed: Semente da matriz de normais compartilhada (None = aleatória)
+
+        Returns:
+            Dict com o valor resolvido e a probabilidade obtida
+        """
+        if variavel not in ('aporte_mensal', 'valor_inicial', 'anos'):
+            raise ValueError(f"Variável inválida: {variavel}")
+
+        params = self.calcular_parametros_historicos(alocacao)
+        meses = (anos_maximo if variavel == 'anos' else anos) * 12
+
+        normais = self._normais(num_simulacoes, meses, seed)
+        retornos = params['retorno_medio_mensal'] + params['volatilidade_mensal'] * normais
+
+        quantil = 1 - confianca
+        resultado = {
+            'variavel': variavel,
+            'valor_alvo': valor_alvo,
+            'confianca': confianca,
+            'valor_inicial': valor_inicial,
+            'aporte_mensal': aporte_mensal,
+            'anos': anos,
+            'num_simulacoes': num_simulacoes,
+        }
+
+        if variavel == 'anos':
+            patrimonio = evolucao_patrimonio(retornos, valor_inicial, aporte_mensal)
+            atingidos = np.flatnonzero(np.quantile(patrimonio, quantil, axis=0) >= valor_alvo)
+
+            if atingidos.size == 0:
+                resultado.update({'atingivel': False, 'valor': None, 'probabilidade_atingida': None})
+                return resultado
+
+            mes = int(atingidos[0]) + 1
+            finais = patrimonio[:, mes - 1]
+            resultado.update({
+                'atingivel': True,
+                'valor': mes / 12,
+                'meses': mes,
+                'anos': int(np.ceil(mes / 12)),
+                'probabilidade_atingida': self._safe_float(np.mean(finais >= valor_alvo) * 100),
+            })
+            return resultado
+
+        crescimento = np.cumprod(1 + retornos, axis=1)[:, -1] if meses else np.ones(num_simulacoes)
+        aportes_unitarios = self._patrimonio_final(retornos, 0.0, 1.0)
+
+        # Patrimônio final é afim na variável resolvida: W = base + x * coeficiente
+        if variavel == 'aporte_mensal':
+            base, coeficiente = valor_inicial * crescimento, aportes_unitarios
+        else:
+            base, coeficiente = aporte_mensal * aportes_unitarios, crescimento
+
+        def percentil(x):
+            return np.quantile(base + x * coeficiente, quantil)
+
+        inferior, superior = 0.0, max(valor_alvo / max(np.median(coeficiente), 1e-9), 1.0)
+        if percentil(inferior) >= valor_alvo:
+            superior = inferior
+        else:
+            # Expandir o intervalo até conter a solução
+            for _ in range(60):
+                if percentil(superior) >= valor_alvo:
+                    break
+                inferior, superior = superior, superior * 2
+            else:
+                resultado.update({'atingivel': False, 'valor': None, 'probabilidade_atingida': None})
+                return resultado
+
+            # Bisseção até precisão de centavos
+            while superior - inferior > 0.01:
+                meio = (inferior + superior) / 2
+                if percentil(meio) >= valor_alvo:
+                    superior = meio
+                else:
+                    inferior = meio
+
+        finais = base + superior * coeficiente
+        resultado.update({
+            'atingivel': True,
+            'valor': self._safe_float(superior),
+            variavel: self._safe_float(superior),
+            'probabilidade_atingida': self._safe_float(np.mean(finais >= valor_alvo) * 100),
+        })
+        return resultado
+
+    def simular_multiativos(
+        self,
+        alocacao: Dict[str, float],
+        valor_inicial: float = 10000,
+        aporte_mensal: float = 0,
+        anos: int = 10,
+        num_simulacoes: int = 1000,
+        rebalanceamento: str = 'nenhum',
+        banda: float = 0.05,
+        custo_transacao: Union[float, Dict[str, float]] = 0.0,
+        periodo_historico: str = '5y',
+        caminhos_por_bloco: int = 2000,
+        seed: Optional[int] = SEED_PADRAO,
+        fluxos: Optional[Union[Sequence[float], Dict]] = None,
+        liquido: bool = False,
+        regras_tributacao: Optional[Dict[str, Dict]] = None
+    ) -> Dict:
+        """
+        Monte Carlo com cada classe de ativo simulada individualmente
+
+        Os retornos mensais por classe são normais multivariados com a média e
+        a covariância históricas (EstatisticasMercado). Sem rebalanceamento os
+        pesos derivam com o mercado; com rebalanceamento de calendário ou por
+        bandas, todas as trajetórias são atualizadas juntas por máscara.
+
+        Com liquido, as estatísticas são do patrimônio após IR e taxas de
+        plataforma por classe (ver tributacao.patrimonio_liquido). Só vale
+        para carteiras sem rebalanceamento e sem resgates, já que cada venda
+        seria um evento tributável.
+
+        Args:
+            alocacao: Alocação alvo da carteira
+            valor_inicial: Valor inicial
+            aporte_mensal: Aporte mensal (investido nos pesos alvo)
+            anos: Horizonte em anos
+            num_simulacoes: Número de cenários a simular
+            rebalanceamento: 'nenhum', 'mensal', 'trimestral', 'semestral', 'anual' ou 'bandas'
+            banda: Desvio máximo de peso tolerado no modo 'bandas' (ex: 0.05 = 5 p.p.)
+            custo_transacao: Custo proporcional por valor negociado (único ou por classe)
+            periodo_historico: Período usado para média e covariância
+            caminhos_por_bloco: Caminhos gerados por bloco
+            seed: Semente da matriz de normais compartilhada (None = aleatória)
+            fluxos: Vetor mensal de fluxos ou cronograma; substitui aporte_mensal
+            liquido: Calcular o patrimônio líquido de impostos e taxas
+            regras_tributacao: Sobrescritas de tributacao.REGRAS_TRIBUTACAO por classe
+
+        Returns:
+            Dict com as estatísticas de simular_cenarios mais custos e número
+            médio de rebalanceamentos; no modo líquido, também as estatísticas
+            do patrimônio bruto dos mesmos caminhos ('bruto') e os impostos e
+            taxas médios
+        """
+        if rebalanceamento != 'bandas' and rebalanceamento not in FREQUENCIAS_REBALANCEAMENTO:
+            raise ValueError(f"Rebalanceamento inválido: {rebalanceamento}")
+        if liquido and rebalanceamento != 'nenhum':
+            raise ValueError("Modo líquido não suporta rebalanceamento")
+
+        estatisticas = self.estatisticas.obter(periodo_historico)
+        pesos = self.estatisticas.vetor_pesos(alocacao, periodo_historico)
+
+        if pesos.size == 0 or len(estatisticas['retornos']) < 2:
+            if liquido:
+                raise ValueError("Modo líquido requer histórico por classe de ativo")
+            # Sem histórico por classe: carteira como ativo único
+            return self.simular_cenarios(
+                alocacao, valor_inicial, aporte_mensal, anos, num_simulacoes, seed=seed, fluxos=fluxos,
+                periodo_historico=periodo_historico
+            )
+
+        classes = estatisticas['classes']
+        if isinstance(custo_transacao, dict):
+            custos = np.array([custo_transacao.get(classe, 0.0) for classe in classes])
+        else:
+            custos = float(custo_transacao)
+
+        meses = anos * 12
+        fluxos_mensais = expandir_fluxos(fluxos, meses, aporte_mensal)
+        frequencia = FREQUENCIAS_REBALANCEAMENTO.get(rebalanceamento, 0)
+        banda_ativa = banda if rebalanceamento == 'bandas' else None
+        normais = self._blocos_normais(num_simulacoes, meses * len(classes), seed, caminhos_por_bloco)
+
+        if liquido:
+            return self._simular_liquido(
+                normais, estatisticas, pesos, valor_inicial, aporte_mensal, anos,
+                fluxos_mensais, regras_tributacao
+            )
+
+        finais = np.full(num_simulacoes, float(valor_inicial))
+        meses_ruina, custos_pagos, rebalanceamentos = [], [], []
+        for inicio, bloco in zip(range(0, num_simulacoes, caminhos_por_bloco), normais):
+            retornos = self._retornos_multiativos(bloco, estatisticas, meses)
+
+            evolucao = evolucao_com_rebalanceamento(
+                retornos, pesos, valor_inicial, fluxos_mensais, frequencia, banda_ativa, custos
+            )
+
+            patrimonio = evolucao['patrimonio']
+            if fluxos is not None and meses > 0:
+                patrimonio, mes_ruina = aplicar_ruina(patrimonio)
+                meses_ruina.append(mes_ruina)
+
+            if meses:
+                finais[inicio:inicio + len(retornos)] = patrimonio[:, -1]
+            custos_pagos.append(evolucao['custos'])
+            rebalanceamentos.append(evolucao['rebalanceamentos'])
+
+        resultado = self._estatisticas_resultados(
+            finais, valor_inicial, aporte_mensal, anos,
+            total_aportado=valor_inicial + fluxos_mensais.sum()
+        )
+        resultado.update({
+            'rebalanceamento': rebalanceamento,
+            'custos_transacao_medio': self._safe_float(np.mean(np.concatenate(custos_pagos))),
+            'rebalanceamentos_medio': self._safe_float(np.mean(np.concatenate(rebalanceamentos))),
+        })
+
+        if meses_ruina:
+            resultado.update(self._estatisticas_ruina(np.concatenate(meses_ruina)))
+
+        return resultado
+
+    def _simular_liquido(
+        self,
+        normais: Iterable[np.ndarray],
+        estatisticas: Dict,
+        pesos: np.ndarray,
+        valor_inicial: float,
+        aporte_mensal: float,
+        anos: int,
+        fluxos_mensais: np.ndarray,
+        regras_tributacao: Optional[Dict[str, Dict]]
+    ) -> Dict:
+        """
+        Estatísticas do patrimônio líquido de impostos e taxas (buy-and-hold)
+
+        O patrimônio bruto sai dos mesmos retornos que o líquido; suas
+        estatísticas completas ficam em 'bruto'.
+        """
         meses = anos * 12
-        resultados = []
+        blocos = []
+        for bloco in normais:
+            retornos = self._retornos_multiativos(bloco, estatisticas, meses)
+            blocos.append(patrimonio_liquido(
+                retornos, pesos, estatisticas['classes'], valor_inicial, fluxos_mensais, regras_tributacao
+            ))
+
+        def juntar(chave):
+            return np.concatenate([bloco[chave] for bloco in blocos])
+
+        bruto = juntar('bruto')
+        total_aportado = valor_inicial + fluxos_mensais.sum()
+        resultado = self._estatisticas_resultados(
+            juntar('liquido'), valor_inicial, aporte_mensal, anos, total_aportado=total_aportado
+        )
+        resultado.update({
+            'liquido': True,
+            'rebalanceamento': 'nenhum',
+            'bruto': self._estatisticas_resultados(
+                bruto, valor_inicial, aporte_mensal, anos, total_aportado=total_aportado
+            ),
+            'patrimonio_bruto_medio': self._safe_float(np.mean(bruto)),
+            'patrimonio_bruto_mediano': self._safe_float(np.median(bruto)),
+            'impostos_medio': self._safe_float(np.mean(juntar('impostos'))),
+            'taxas_medio': self._safe_float(np.mean(juntar('taxas'))),
+        })
+        return resultado
+
+    def simular_coorte(
+        self,
+        alocacoes: Union[Sequence[Dict[str, float]], np.ndarray],
+        valores_iniciais,
+        aportes_mensais,
+        anos,
+        num_simulacoes: int = 1000,
+        periodo_historico: str = '5y',
+        seed: Optional[int] = SEED_PADRAO,
+        memoria_maxima_bytes: int = 256 * 1024 ** 2,
+        caminhos_por_bloco: int = 2000
+    ) -> Dict:
+        """
+        Projeta uma carteira de clientes inteira contra os mesmos cenários de mercado
+
+        Os retornos multivariados (caminhos x meses x classes) do maior
+        horizonte são gerados em blocos de caminhos, como em
+        simular_multiativos; cada investidor é uma combinação linear deles
+        (carteira com pesos constantes, como em simular_cenarios). Dentro de
+        cada bloco os investidores são processados em lotes para que
+        (lote x caminhos do bloco x meses) caiba em memoria_maxima_bytes, então
+        só a matriz (investidores x caminhos) de patrimônios finais cresce com
+        num_simulacoes.
+
+        Args:
+            alocacoes: Lista de alocações ou array (N x classes) na ordem de
+                EstatisticasMercado.classes
+            valores_iniciais: Valor inicial por investidor (escalar ou (N,))
+            aportes_mensais: Aporte mensal por investidor (escalar ou (N,))
+            anos: Horizonte em anos por investidor (escalar ou (N,))
+            num_simulacoes: Número de cenários compartilhados
+            periodo_historico: Período usado para média e covariância
+            seed: Semente da matriz de normais compartilhada (None = aleatória)
+            memoria_maxima_bytes: Limite aproximado do lote intermediário
+            caminhos_por_bloco: Caminhos gerados por bloco
+
+        Returns:
+            Dict de arrays (N,) com as estatísticas de simular_cenarios por investidor
+        """
+        estatisticas = self.estatisticas.obter(periodo_historico)
+        pesos = self.estatisticas.matriz_pesos(alocacoes, periodo_historico)
+        num_investidores = len(pesos)
+
+        valores_iniciais = np.broadcast_to(np.asarray(valores_iniciais, dtype=float), (num_investidores,))
+        aportes_mensais = np.broadcast_to(np.asarray(aportes_mensais, dtype=float), (num_investidores,))
+        meses = np.broadcast_to(np.asarray(anos, dtype=int) * 12, (num_investidores,))
+        meses_maximo = int(meses.max(initial=0))
+
+        if len(estatisticas['retornos']) < 2 or meses_maximo == 0:
+            finais = np.repeat(valores_iniciais[:, None], num_simulacoes, axis=1)
+        else:
+            normais = self._blocos_normais(
+                num_simulacoes, meses_maximo * len(estatisticas['classes']), seed, caminhos_por_bloco
+            )
+            finais = np.empty((num_investidores, num_simulacoes))
+            # Ordenar por horizonte: cada lote só acumula até o maior horizonte dele
+            ordem = np.argsort(meses, kind='stable')
+
+            for caminho, bloco in zip(range(0, num_simulacoes, caminhos_por_bloco), normais):
+                retornos = self._retornos_multiativos(bloco, estatisticas, meses_maximo)
+                # Meses na última dimensão (contígua) para as acumulações
+                retornos = np.ascontiguousarray(np.swapaxes(retornos, 1, 2))  # (caminhos x classes x meses)
+                caminhos = slice(caminho, caminho + len(retornos))
+                lote = max(1, memoria_maxima_bytes // (len(retornos) * meses_maximo * 8 * 3))
+
+                for inicio in range(0, num_investidores, lote):
+                    selecao = ordem[inicio:inicio + lote]
+                    horizonte = meses[selecao]
+                    meses_lote = int(horizonte.max())
+                    if meses_lote == 0:
+                        finais[selecao, caminhos] = valores_iniciais[selecao, None]
+                        continue
+
+                    # (lote x classes) · (caminhos x classes x meses) -> (lote x caminhos x meses)
+                    retornos_carteiras = np.einsum(
+                        'lk,pkm->lpm', pesos[selecao], retornos[:, :, :meses_lote], optimize=True
+                    )
+                    patrimonio = evolucao_patrimonio(
+                        retornos_carteiras,
+                        valores_iniciais[selecao, None],
+                        aportes_mensais[selecao, None, None]
+                    )
+
+                    finais[selecao, caminhos] = np.where(
+                        horizonte[:, None] > 0,
+                        patrimonio[np.arange(len(selecao)), :, np.maximum(horizonte - 1, 0)],
+                        valores_iniciais[selecao, None]
+                    )
+
+        finais = np.nan_to_num(finais, nan=0.0, posinf=0.0, neginf=0.0)
+        total_aportado = valores_iniciais + aportes_mensais * meses
+        percentis = np.percentile(finais, [10, 25, 50, 75, 90], axis=1)
+
+        return {
+            'num_investidores': num_investidores,
+            'num_simulacoes': num_simulacoes,
+            'patrimonio_medio': finais.mean(axis=1),
+            'patrimonio_mediano': percentis[2],
+            'patrimonio_minimo': finais.min(axis=1),
+            'patrimonio_maximo': finais.max(axis=1),
+            'percentil_10': percentis[0],
+            'percentil_25': percentis[1],
+            'percentil_75': percentis[3],
+            'percentil_90': percentis[4],
+            'desvio_padrao': finais.std(axis=1),
+            'probabilidade_dobrar': (finais >= 2 * valores_iniciais[:, None]).mean(axis=1) * 100,
+            'probabilidade_perda': (finais < total_aportado[:, None]).mean(axis=1) * 100,
+        }
+
+    @staticmethod
+    def _normais(num_caminhos: int, colunas: int, seed: Optional[int]) -> np.ndarray:
+        """Normais padrão do cache compartilhado (seed) ou sorteadas na hora (None)"""
+        if seed is not None:
+            return cache_normais.obter(num_caminhos, colunas, seed)
+        return np.random.standard_normal((num_caminhos, colunas))
+
+    @staticmethod
+    def _blocos_normais(
+        num_caminhos: int, colunas: int, seed: Optional[int], caminhos_por_bloco: int
+    ) -> Iterator[np.ndarray]:
+        """Normais padrão em blocos de caminhos, sem materializar a matriz inteira"""
+        if seed is not None:
+            yield from cache_normais.blocos(num_caminhos, colunas, seed, caminhos_por_bloco)
+            return
+        for inicio in range(0, num_caminhos, caminhos_por_bloco):
+            yield np.random.standard_normal((min(caminhos_por_bloco, num_caminhos - inicio), colunas))
+
+    @staticmethod
+    def _retornos_multiativos(normais: np.ndarray, estatisticas: Dict, meses: int) -> np.ndarray:
+        """Retornos normais multivariados (caminhos x meses x classes) a partir de normais padrão"""
+        num_ativos = len(estatisticas['classes'])
+        # Pequeno termo diagonal garante a decomposição com classes colineares
+        fator = np.linalg.cholesky(estatisticas['covariancia'] + 1e-12 * np.eye(num_ativos))
+
+        bloco = normais.reshape(len(normais), meses, num_ativos)
+        return estatisticas['media'] + (bloco.reshape(-1, num_ativos) @ fator.T).reshape(bloco.shape)
+
+    def simular_bootstrap(
+        self,
+        alocacao: Dict[str, float],
+        valor_inicial: float = 10000,
+        aporte_mensal: float = 0,
+        anos: int = 10,
+        num_simulacoes: int = 1000,
+        tamanho_bloco: int = 12,
+        periodo_historico: str = '5y',
+        seed: Optional[int] = None
+    ) -> Dict:
+        """
+        Executa simulação de Monte Carlo por bootstrap de blocos históricos
 
-        # Executar simulações
-        for _ in range(num_simulacoes):
-            patrimonio = valor_inicial
+        Reamostra blocos contíguos de meses da matriz alinhada de retornos
+        históricos. Todas as classes usam os mesmos índices, preservando
+        correlação entre ativos, caudas e autocorrelação dentro do bloco.
 
-            # Simular mês a mês
-            for mes in range(meses):
-                # Gerar retorno aleatório (distribuição normal)
-                retorno = np.random.normal(retorno_medio, volatilidade)
+        Args:
+            alocacao: Alocação da carteira
+            valor_inicial: Valor inicial
+            aporte_mensal: Aporte mensal
+            anos: Horizonte em anos
+            num_simulacoes: Número de cenários a simular
+            tamanho_bloco: Tamanho dos blocos reamostrados (meses)
+            periodo_historico: Período dos dados históricos reamostrados
+            seed: Semente do gerador aleatório
+
+        Returns:
+            Dict com as mesmas estatísticas de simular_cenarios
+        """
+        estatisticas = self.estatisticas.obter(periodo_historico)
+        pesos = self.estatisticas.vetor_pesos(alocacao, periodo_historico)
 
-                # Aplicar retorno
-                patrimonio = patrimonio * (1 + retorno)
+        if pesos.size == 0 or len(estatisticas['retornos']) < 2:
+            # Sem histórico suficiente: usar o modelo normal
+            return self.simular_cenarios(
+                alocacao, valor_inicial, aporte_mensal, anos, num_simulacoes, periodo_historico=periodo_historico
+            )
+
+        # Mesmos índices para todas as classes: a carteira ponderada é reamostrada
+        # de uma vez, equivalente a reamostrar (caminhos x meses x ativos) e ponderar
+        retornos_carteira = estatisticas['retornos'] @ pesos
+
+        meses = anos * 12
+        rng = np.random.default_rng(seed)
+        indices = indices_bootstrap_blocos(rng, len(retornos_carteira), num_simulacoes, meses, tamanho_bloco)
 
-                # Adicionar aporte
-                patrimonio += aporte_mensal
+        return self._estatisticas_resultados(
+            self._patrimonio_final(retornos_carteira[indices], valor_inicial, aporte_mensal),
+            valor_inicial, aporte_mensal, anos
+        )
 
-            resultados.append(patrimonio)
+    @staticmethod
+    def _patrimonio_final(retornos: np.ndarray, valor_inicial: float, aporte_mensal: float) -> np.ndarray:
+        """Patrimônio final de cada caminho (caminhos x meses de retornos)"""
+        if retornos.shape[-1] == 0:
+            return np.full(retornos.shape[0], float(valor_inicial))
+        # Cópia: a view da última coluna manteria a matriz de patrimônio inteira viva
+        return evolucao_patrimonio(retornos, valor_inicial, aporte_mensal)[:, -1].copy()
 
-        # Calcular estatísticas
-        resultados = np.array(resultados)
+    def _estatisticas_resultados(
+        self,
+        resultados: np.ndarray,
+        valor_inicial: float,
+        aporte_mensal: float,
+        anos: int,
+        total_aportado: Optional[float] = None
+    ) -> Dict:
+        """Estatísticas do patrimônio final das simulações"""
+        num_simulacoes = len(resultados)
+        if total_aportado is None:
+            total_aportado = valor_inicial + aporte_mensal * anos * 12
 
         return {
             'num_simulacoes': num_simulacoes,
@@ -129,7 +916,88 @@ class MonteCarloSimulation:
             'percentil_90': self._safe_float(np.percentile(resultados, 90)),
             'desvio_padrao': self._safe_float(np.std(resultados)),
             'probabilidade_dobrar': self._safe_float(np.sum(resultados >= valor_inicial * 2) / num_simulacoes * 100),
-            'probabilidade_perda': self._safe_float(np.sum(resultados < valor_inicial + (aporte_mensal * meses)) / num_simulacoes * 100),
+            'probabilidade_perda': self._safe_float(np.sum(resultados < total_aportado) / num_simulacoes * 100),
+        }
+
+    def _resumir_metricas_trajetoria(self, blocos: List[Dict[str, np.ndarray]]) -> Dict:
+        """Distribuição das métricas por caminho acumuladas em blocos"""
+        def distribuicao(valores):
+            valores = valores[np.isfinite(valores)]
+            if valores.size == 0:
+                return {}
+            resumo = {f'percentil_{p}': self._safe_float(np.percentile(valores, p)) for p in (10, 25, 50, 75, 90)}
+            resumo['media'] = self._safe_float(np.mean(valores))
+            return resumo
+
+        def juntar(chave):
+            return np.concatenate([bloco[chave] for bloco in blocos])
+
+        return {
+            'drawdown_maximo': distribuicao(juntar('drawdown_maximo')),
+            'tempo_submerso': distribuicao(juntar('tempo_submerso')),
+            'duracao_maxima_submerso': distribuicao(juntar('duracao_maxima_submerso').astype(float)),
+            'pior_retorno_12m': distribuicao(juntar('pior_retorno_janela')),
+            'probabilidade_abaixo_aportado': self._safe_float(np.mean(juntar('abaixo_aportado')) * 100),
+        }
+
+    def _estatisticas_ruina(self, meses_ruina: np.ndarray) -> Dict:
+        """Probabilidade de ruína e percentis do mês de ruína (0 = sem ruína)"""
+        arruinados = meses_ruina[meses_ruina > 0]
+        percentis = {}
+        if arruinados.size:
+            percentis = {
+                f'percentil_{p}': self._safe_float(np.percentile(arruinados, p))
+                for p in (10, 25, 50, 75, 90)
+            }
+
+        return {
+            'probabilidade_ruina': self._safe_float(arruinados.size / len(meses_ruina) * 100),
+            'mes_ruina': percentis,
+        }
+
+    def projetar_cenarios(
+        self,
+        alocacoes: List[Dict[str, float]],
+        valor_inicial=10000,
+        aporte_mensal=0,
+        anos: int = 10,
+        desvios: Sequence[float] = (1.0, 0.0, -1.0)
+    ) -> Dict:
+        """
+        Projeta cenários determinísticos para várias alocações de uma vez
+
+        Cada cenário usa a taxa mensal constante retorno_medio + desvio * volatilidade
+        e a trajetória é calculada em forma fechada, sem loop mês a mês.
+
+        Args:
+            alocacoes: Lista de alocações
+            valor_inicial: Valor inicial (escalar ou um por alocação)
+            aporte_mensal: Aporte mensal (escalar ou um por alocação)
+            anos: Horizonte em anos
+            desvios: Desvios padrão de cada cenário em relação à média
+
+        Returns:
+            Dict com 'meses' (meses + 1), 'taxas' (alocações x cenários) e
+            'patrimonio' (alocações x cenários x meses + 1) como arrays NumPy
+        """
+        params = [self.calcular_parametros_historicos(alocacao) for alocacao in alocacoes]
+        medias = np.array([p['retorno_medio_mensal'] for p in params])
+        volatilidades = np.array([p['volatilidade_mensal'] for p in params])
+
+        taxas = medias[:, None] + volatilidades[:, None] * np.asarray(desvios, dtype=float)
+        meses = anos * 12
+
+        patrimonio = projecao_deterministica(
+            taxas,
+            np.asarray(valor_inicial, dtype=float)[..., None],
+            np.asarray(aporte_mensal, dtype=float)[..., None],
+            meses
+        )
+
+        return {
+            'meses': np.arange(meses + 1),
+            'taxas': taxas,
+            'patrimonio': np.nan_to_num(patrimonio, nan=0.0, posinf=0.0, neginf=0.0)
         }
 
     def gerar_cenarios_detalhados(
@@ -145,53 +1013,15 @@ class MonteCarloSimulation:
         Returns:
             Dict com evolução mensal de cada cenário
         """
-        params = self.calcular_parametros_historicos(alocacao)
-        retorno_medio = params['retorno_medio_mensal']
-        volatilidade = params['volatilidade_mensal']
+        # Otimista: +1 desvio padrão, Realista: média, Pessimista: -1 desvio padrão
+        nomes = ['otimista', 'realista', 'pessimista']
+        projecao = self.projetar_cenarios([alocacao], valor_inicial, aporte_mensal, anos, (1.0, 0.0, -1.0))
 
-        meses = anos * 12
-
-        # Definir parâmetros dos cenários
-        cenarios = {
-            'otimista': {
-                'retorno': retorno_medio + volatilidade,  # +1 desvio padrão
-                'patrimonio': [valor_inicial]
-            },
-            'realista': {
-                'retorno': retorno_medio,
-                'patrimonio': [valor_inicial]
-            },
-            'pessimista': {
-                'retorno': retorno_medio - volatilidade,  # -1 desvio padrão
-                'patrimonio': [valor_inicial]
+        resultado = {'meses': projecao['meses'].tolist()}
+        for nome, patrimonio in zip(nomes, projecao['patrimonio'][0]):
+            resultado[nome] = {
+                'patrimonio': patrimonio.tolist(),
+                'final': float(patrimonio[-1])
             }
-        }
 
-        # Simular cada cenário
-        for cenario, config in cenarios.items():
-            patrimonio_atual = valor_inicial
-
-            for mes in range(meses):
-                # Aplicar retorno do cenário
-                patrimonio_atual = patrimonio_atual * (1 + config['retorno'])
-
-                # Adicionar aporte
-                patrimonio_atual += aporte_mensal
-
-                config['patrimonio'].append(patrimonio_atual)
-
-        return {
-            'meses': list(range(meses + 1)),
-            'otimista': {
-                'patrimonio': [self._safe_float(p) for p in cenarios['otimista']['patrimonio']],
-                'final': self._safe_float(cenarios['otimista']['patrimonio'][-1])
-            },
-            'realista': {
-                'patrimonio': [self._safe_float(p) for p in cenarios['realista']['patrimonio']],
-                'final': self._safe_float(cenarios['realista']['patrimonio'][-1])
-            },
-            'pessimista': {
-                'patrimonio': [self._safe_float(p) for p in cenarios['pessimista']['patrimonio']],
-                'final': self._safe_float(cenarios['pessimista']['patrimonio'][-1])
-            }
-        }
+        return resultado
@@ -0,0 +1,201 @@
+"""
+Tributação e Taxas - Patrimônio líquido das projeções
+Aplica IR (tabela regressiva, come-cotas, isenção de rendimentos de FII)
+e taxas de plataforma por classe de ativo, sobre todos os caminhos de uma vez
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+
+# Tabela regressiva de IR da renda fixa: (idade máxima do lote em meses, alíquota)
+# Equivale aos limites de 180, 360 e 720 dias
+TABELA_REGRESSIVA = ((6, 0.225), (12, 0.20), (24, 0.175), (None, 0.15))
+
+# Come-cotas no último dia útil de maio e novembro (meses 1-based a partir de janeiro)
+MESES_COME_COTAS = (5, 11)
+
+# Regras por classe de ativo
+#   regime: 'regressiva' (lotes pela idade), 'ganho_capital' (alíquota única
+#       sobre o ganho total) ou 'fii' (rendimentos isentos, ganho de capital tributado)
+#   come_cotas: alíquota semestral antecipada (None = não se aplica)
+#   taxa_plataforma_anual: custódia/administração cobrada sobre o saldo
+# A renda fixa segue um fundo de longo prazo (come-cotas de 15%); para títulos
+# na carteira própria (CDB, Tesouro), sobrescrever com come_cotas=None
+REGRAS_TRIBUTACAO = {
+    'renda_fixa': {'regime': 'regressiva', 'come_cotas': 0.15, 'taxa_plataforma_anual': 0.002},
+    'acoes_brasil': {'regime': 'ganho_capital', 'aliquota': 0.15, 'taxa_plataforma_anual': 0.0},
+    'acoes_internacional': {'regime': 'ganho_capital', 'aliquota': 0.15, 'taxa_plataforma_anual': 0.0},
+    'fundos_imobiliarios': {
+        'regime': 'fii', 'aliquota': 0.20, 'rendimento_mensal': 0.0065,
+        'rendimentos_isentos': True, 'taxa_plataforma_anual': 0.0
+    },
+    'commodities': {'regime': 'ganho_capital', 'aliquota': 0.15, 'taxa_plataforma_anual': 0.0},
+    'criptomoedas': {'regime': 'ganho_capital', 'aliquota': 0.15, 'taxa_plataforma_anual': 0.0},
+}
+
+
+def mesclar_regras(classes: Sequence[str], regras: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """
+    Regras completas por classe: padrão de REGRAS_TRIBUTACAO sobrescrito por `regras`
+
+    Classes sem regra própria seguem a renda fixa (mesmo fallback do Backtesting).
+    """
+    regras = regras or {}
+    return [
+        {**REGRAS_TRIBUTACAO.get(classe, REGRAS_TRIBUTACAO['renda_fixa']), **regras.get(classe, {})}
+        for classe in classes
+    ]
+
+
+def aliquotas_regressivas(idades: np.ndarray) -> np.ndarray:
+    """Alíquota da tabela regressiva para cada idade de lote (em meses)"""
+    idades = np.asarray(idades)
+    limites = [limite for limite, _ in TABELA_REGRESSIVA[:-1]]
+    aliquotas = np.array([aliquota for _, aliquota in TABELA_REGRESSIVA])
+    return aliquotas[np.searchsorted(limites, idades, side='left')]
+
+
+def meses_come_cotas(meses: int) -> np.ndarray:
+    """Meses (1-based) da simulação com come-cotas, supondo início em janeiro"""
+    calendario = np.arange(1, meses + 1)
+    return calendario[np.isin((calendario - 1) % 12 + 1, MESES_COME_COTAS)]
+
+
+def patrimonio_liquido(
+    retornos: np.ndarray,
+    pesos: np.ndarray,
+    classes: Sequence[str],
+    valor_inicial: float,
+    fluxos: np.ndarray,
+    regras: Optional[Dict[str, Dict]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Patrimônio final bruto e líquido de impostos e taxas de carteiras sem rebalanceamento
+
+    Cada aporte é um lote com data de compra própria. O valor de um lote no
+    fim do horizonte é aporte * Q_T / Q_s, onde Q é a cota acumulada da
+    classe (líquida da taxa de plataforma), então lotes, idades e alíquotas
+    formam matrizes (caminhos x lotes) e o imposto sai de produtos matriciais.
+    O come-cotas percorre apenas as datas de cobrança, atualizando a fração de
+    cotas e a base de cada lote de todos os caminhos de uma vez. O resgate
+    final desconta o come-cotas já recolhido; imposto pago a mais não é devolvido.
+
+    Args:
+        retornos: Array (caminhos, meses, classes) de retornos mensais por classe
+        pesos: Array (classes,) de pesos da carteira (soma 1)
+        classes: Nome de cada classe (colunas de retornos)
+        valor_inicial: Patrimônio inicial
+        fluxos: Array (meses,) de aportes ao final de cada mês (sem resgates)
+        regras: Sobrescritas de REGRAS_TRIBUTACAO por classe
+
+    Returns:
+        Dict de arrays (caminhos,): 'bruto' (sem taxas nem impostos),
+        'antes_impostos' (após taxas), 'liquido', 'impostos' e 'taxas'
+    """
+    retornos = np.asarray(retornos, dtype=float)
+    fluxos = np.asarray(fluxos, dtype=float)
+    if (fluxos < 0).any():
+        raise ValueError("Patrimônio líquido não suporta resgates antes do fim do horizonte")
+
+    num_caminhos, meses, _ = retornos.shape
+    lotes = np.concatenate([[float(valor_inicial)], fluxos])  # lote s comprado no fim do mês s
+    idades = meses - np.arange(meses + 1)
+    datas_come_cotas = meses_come_cotas(meses)
+
+    bruto = np.zeros(num_caminhos)
+    antes_impostos = np.zeros(num_caminhos)
+    liquido = np.zeros(num_caminhos)
+
+    for indice, regra in enumerate(mesclar_regras(classes, regras)):
+        peso = pesos[indice]
+        if peso <= 0:
+            continue
+
+        aportes = peso * lotes
+        fator_taxa = (1.0 - regra.get('taxa_plataforma_anual', 0.0)) ** (1 / 12)
+        retorno_classe = retornos[:, :, indice]
+
+        if regra['regime'] == 'fii':
+            # Rendimentos distribuídos e reinvestidos; se não isentos, retidos na fonte
+            aliquota_rendimentos = 0.0 if regra.get('rendimentos_isentos', True) else regra['aliquota']
+            retorno_liquido = retorno_classe - aliquota_rendimentos * regra['rendimento_mensal']
+        else:
+            retorno_liquido = retorno_classe
+
+        # Cotas acumuladas (caminhos x meses + 1), Q_0 = 1, líquidas da taxa de plataforma
+        cota = np.ones((num_caminhos, meses + 1))
+        np.cumprod((1.0 + retorno_classe) * fator_taxa, axis=1, out=cota[:, 1:])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            razao = cota[:, -1:] / cota  # Q_T / Q_s de cada lote
+
+        # A taxa de plataforma é determinística: sem ela cada lote rende fator_taxa^-idade a mais
+        bruto += razao @ (aportes * fator_taxa ** -idades.astype(float))
+        valor = razao @ aportes
+        antes_impostos += valor
+
+        if regra['regime'] == 'regressiva':
+            aliquotas = aliquotas_regressivas(idades)
+            come_cotas = regra.get('come_cotas')
+
+            if come_cotas and datas_come_cotas.size:
+                fracao, base = _aplicar_come_cotas(cota, datas_come_cotas, come_cotas)
+                imposto_cota = np.maximum(
+                    aliquotas * (cota[:, -1:] - cota) - come_cotas * (base - cota), 0.0
+                )
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    liquido += np.nan_to_num(fracao * (cota[:, -1:] - imposto_cota) / cota) @ aportes
+            else:
+                liquido += valor - np.maximum(razao - 1.0, 0.0) @ (aliquotas * aportes)
+
+        elif regra['regime'] == 'fii':
+            cota_liquida = np.ones((num_caminhos, meses + 1))
+            np.cumprod((1.0 + retorno_liquido) * fator_taxa, axis=1, out=cota_liquida[:, 1:])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Saldo no início de cada mês: V_t = Q_t * soma_{s<=t} aporte_s / Q_s
+                saldos = cota_liquida[:, :-1] * np.cumsum(aportes[:-1] / cota_liquida[:, :-1], axis=1)
+                valor_fii = (cota_liquida[:, -1:] / cota_liquida) @ aportes
+
+            reinvestido = (1 - aliquota_rendimentos) * regra['rendimento_mensal'] * saldos.sum(axis=1)
+            ganho = valor_fii - aportes.sum() - reinvestido
+            liquido += valor_fii - regra['aliquota'] * np.maximum(ganho, 0.0)
+
+        else:
+            ganho = valor - aportes.sum()
+            liquido += valor - regra.get('aliquota', 0.0) * np.maximum(ganho, 0.0)
+
+    return {
+        'bruto': bruto,
+        'antes_impostos': antes_impostos,
+        'liquido': liquido,
+        'impostos': antes_impostos - liquido,
+        'taxas': bruto - antes_impostos,
+    }
+
+
+def _aplicar_come_cotas(cota: np.ndarray, datas: np.ndarray, aliquota: float):
+    """
+    Fração de cotas restante e base de cálculo de cada lote após o come-cotas
+
+    Em cada data, os lotes já comprados perdem aliquota * ganho desde a última
+    base (em cotas) e a base passa a ser o maior valor de cota já tributado.
+
+    Returns:
+        Tupla (fracao, base), ambos (caminhos x lotes)
+    """
+    # Lotes na primeira dimensão: os lotes já comprados são um bloco contíguo
+    cota = np.ascontiguousarray(cota.T)
+    fracao = np.ones_like(cota)
+    base = cota.copy()
+
+    for mes in datas:
+        # Lotes comprados até o fim do mês anterior (o aporte do mês entra após a cobrança)
+        cota_data = cota[mes]
+        perda = cota_data - base[:mes]
+        np.maximum(perda, 0.0, out=perda)
+        perda *= aliquota / cota_data
+        np.subtract(1.0, perda, out=perda)
+        fracao[:mes] *= perda
+        np.maximum(base[:mes], cota_data, out=base[:mes])
+
+    return fracao.T, base.T
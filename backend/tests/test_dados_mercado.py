@@ -0,0 +1,520 @@
+"""
+Testes do armazenamento local de dados de mercado
+Usam provedores locais, sem acesso à rede
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from simulacao.atualizador import AtualizadorDados
+from simulacao.backtesting import Backtesting, TICKERS_BRASIL
+from simulacao.dados_mercado import (
+    ArmazemDados, CacheHistoricos, HistoricoTicker, ProvedorDados, ProvedorHTTP, ProvedorLocal, ProvedorSintetico
+)
+from simulacao.estatisticas_mercado import EstatisticasMercado
+from simulacao.kernels import EstadoBacktest
+
+
+def _historico(meses=120, fim='2024-12-01', semente=0):
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range(end=fim, periods=meses, freq='MS')
+    return pd.DataFrame({'Close': 100 * np.cumprod(1 + rng.normal(0.008, 0.04, meses))}, index=datas)
+
+
+def _historico_diario(anos=30, fim='2024-12-31', semente=0, todos_os_dias=False):
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range(end=fim, periods=anos * 365, freq='D') if todos_os_dias else \
+        pd.bdate_range(end=fim, periods=anos * 252)
+    return pd.DataFrame({'Close': 100 * np.cumprod(1 + rng.normal(0.0004, 0.012, len(datas)))}, index=datas)
+
+
+class ProvedorContador(ProvedorLocal):
+    """Provedor local que registra as chamadas recebidas"""
+
+    def __init__(self, dados, atraso=0.0):
+        super().__init__(dados)
+        self.chamadas = []
+        self.atraso = atraso
+
+    def baixar(self, ticker, periodo, intervalo, inicio=None):
+        self.chamadas.append((ticker, periodo, inicio))
+        time.sleep(self.atraso)
+        return super().baixar(ticker, periodo, intervalo, inicio)
+
+
+@pytest.fixture
+def servidor_cotacoes():
+    """Servidor HTTP local que responde CSV com atraso fixo por requisição"""
+    fixtures = {ticker: _historico(semente=indice) for indice, ticker in enumerate(sorted(set(TICKERS_BRASIL.values())))}
+    requisicoes = []
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            ticker = unquote(url.path.lstrip('/'))
+            requisicoes.append((ticker, parse_qs(url.query)))
+            time.sleep(0.2)
+
+            if ticker not in fixtures:
+                self.send_error(404)
+                return
+            corpo = fixtures[ticker].to_csv(index_label='Date').encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}", requisicoes
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_armazem_grava_e_le_sem_rede(tmp_path):
+    historico = _historico()
+    provedor = ProvedorContador({'BOVA11.SA': historico})
+    armazem = ArmazemDados(str(tmp_path), provedor)
+
+    dados = armazem.obter('BOVA11.SA', '5y')
+    assert dados.index[0] == pd.Timestamp('2019-12-01') and dados.index[-1] == historico.index[-1]
+    np.testing.assert_allclose(dados['Close'], historico['Close'].iloc[-61:])
+
+    meta = armazem.metadados('BOVA11.SA', '1mo')
+    assert meta['fonte'] == 'local' and meta['num_barras'] == 61 and meta['cobertura'] == '5y'
+
+    # Outro processo, sem provedor: lê o arquivo mapeado em memória
+    offline = ArmazemDados(str(tmp_path)).obter('BOVA11.SA', '2y')
+    assert len(offline) == 25 and not offline['Close'].to_numpy().flags.writeable
+    assert len(provedor.chamadas) == 1
+
+    # Período maior que a cobertura gravada: baixa de novo
+    assert len(armazem.obter('BOVA11.SA', '10y')) == 120
+    assert provedor.chamadas[-1][1] == '10y'
+
+    # Provedores precisam implementar baixar
+    with pytest.raises(TypeError):
+        ProvedorDados()
+
+
+def test_armazem_anexa_barras_novas_e_descarta_arquivo_corrompido(tmp_path):
+    completo = _historico(70)
+    provedor = ProvedorContador({'^IRX': completo.iloc[:60]})
+    armazem = ArmazemDados(str(tmp_path), provedor, validade=timedelta(0))
+    armazem.obter('^IRX', '5y')
+
+    provedor.dados['^IRX'] = completo
+    dados = armazem.obter('^IRX', '5y')
+    assert provedor.chamadas[-1][2] == completo.index[59]
+    assert dados.index[-1] == completo.index[-1]
+    assert armazem.metadados('^IRX', '1mo')['num_barras'] == 70
+
+    # Revalidação sem barras novas: arquivo e última atualização intactos
+    meta = armazem.metadados('^IRX', '1mo')
+    arquivo = armazem._arquivo('^IRX', '1mo')
+    modificado = arquivo.stat().st_mtime_ns
+    provedor.dados['^IRX'] = completo.iloc[:0]
+    assert len(armazem.obter('^IRX', '5y')) == 61
+    assert armazem.metadados('^IRX', '1mo') == meta and arquivo.stat().st_mtime_ns == modificado
+
+    colunas = np.load(arquivo)
+    colunas[4, 0] += 1
+    np.save(arquivo, colunas)
+    assert armazem.ler('^IRX', '1mo') is None
+
+
+def test_backtesting_usa_armazem(tmp_path):
+    fixtures = {ticker: _historico(semente=indice) for indice, ticker in enumerate(set(TICKERS_BRASIL.values()))}
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), ProvedorLocal(fixtures)))
+
+    resultado = backtesting.simular_carteira({'renda_fixa': 0.6, 'acoes_brasil': 0.4}, 10000, periodo='5y')
+    assert len(resultado['patrimonio_historico']) == 61
+
+    # Nova instância reaproveita os arquivos sem consultar o provedor
+    assert not Backtesting(ArmazemDados(str(tmp_path))).obter_dados_historicos('BOVA11.SA').empty
+
+
+def test_periodos_sao_recortes_de_um_historico(tmp_path):
+    fixtures = {ticker: _historico(semente=indice) for indice, ticker in enumerate(set(TICKERS_BRASIL.values()))}
+    provedor = ProvedorContador(fixtures)
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), provedor))
+    classes = ['renda_fixa', 'acoes_brasil', 'criptomoedas']
+
+    backtesting.obter_matriz_retornos(classes, '5y')
+    chamadas, versao = len(provedor.chamadas), backtesting.versao_dados
+    assert {periodo for _, periodo, _ in provedor.chamadas} == {'max'}
+
+    for periodo, barras in (('1y', 13), ('2y', 25), ('10y', 120), ('max', 120)):
+        dados = backtesting.obter_dados_historicos('BOVA11.SA', periodo)
+        completo = backtesting.cache.obter('BOVA11.SA')
+        assert len(dados) == barras and np.shares_memory(dados['Close'].to_numpy(), completo.fechamento)
+
+        matriz = backtesting.obter_matriz_retornos(classes, periodo)
+        fechamentos = backtesting.obter_fechamentos([TICKERS_BRASIL[classe] for classe in classes], periodo)
+        esperado = fechamentos.pct_change().dropna()
+        np.testing.assert_allclose(matriz.to_numpy(), esperado.to_numpy())
+        assert np.shares_memory(completo.retornos_periodo(periodo).to_numpy(), completo.retornos)
+
+    # Lacunas ficam fora do índice de crescimento: retorno sobre a barra válida anterior
+    com_lacunas = fixtures['BOVA11.SA'].copy()
+    com_lacunas.iloc[[0, 40, 41, 90], 0] = np.nan
+    historico = HistoricoTicker(com_lacunas)
+    esperado = com_lacunas['Close'].dropna().pct_change().dropna()
+    for periodo in ('2y', '5y', 'max'):
+        recorte = esperado[esperado.index > historico.recortar(periodo)['Close'].first_valid_index()]
+        retornos = historico.retornos_periodo(periodo)
+        assert retornos.index.tolist() == recorte.index.tolist()
+        np.testing.assert_allclose(retornos.to_numpy(), recorte.to_numpy())
+
+    # Trocar de período não consulta o armazém nem invalida dependentes
+    assert len(provedor.chamadas) == chamadas and backtesting.versao_dados == versao
+
+
+def test_versoes_por_serie_so_invalidam_quem_leu_a_serie(tmp_path):
+    fixtures = {ticker: _historico(semente=indice) for indice, ticker in enumerate(['^IRX', 'BOVA11.SA', 'GOLD11.SA'])}
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), ProvedorLocal(fixtures)))
+    estatisticas = EstatisticasMercado(backtesting, ['renda_fixa', 'acoes_brasil'])
+    antigas = estatisticas.obter('5y')
+
+    # Outro intervalo, série sem dados e nova busca após remoção do LRU: mesmas versões
+    backtesting.obter_historicos(['BOVA11.SA'], '1d')
+    backtesting.obter_historicos(['BTC-USD'])
+    backtesting.cache.limite_bytes = 1
+    backtesting.obter_historicos(['GOLD11.SA'])
+    assert backtesting.cache.obter('^IRX') is not None and backtesting.cache.obter('BOVA11.SA') is not None
+    assert estatisticas.obter('5y') is antigas
+
+    # Conteúdo novo numa série lida: nova versão só dela
+    versoes = backtesting.versoes_dados(['^IRX', 'BOVA11.SA'])
+    revisado = fixtures['^IRX'].copy()
+    revisado.iloc[-1, 0] *= 1.01
+    backtesting.cache.substituir({'^IRX': HistoricoTicker(revisado)})
+    novas = backtesting.versoes_dados(['^IRX', 'BOVA11.SA'])
+    assert novas[0] != versoes[0] and novas[1] == versoes[1]
+    assert estatisticas.obter('5y') is not antigas
+
+
+def test_cache_compartilhado_deduplica_e_limita_memoria(tmp_path):
+    fixtures = {ticker: _historico(semente=indice) for indice, ticker in enumerate(sorted(set(TICKERS_BRASIL.values())))}
+    provedor = ProvedorContador(fixtures, atraso=0.1)
+    cache = CacheHistoricos(ArmazemDados(str(tmp_path), provedor))
+
+    # Requisições simultâneas do mesmo ticker: uma única busca
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(cache.obter('BOVA11.SA'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(provedor.chamadas) == 1 and all(resultado is resultados[0] for resultado in resultados)
+
+    # Só fechamentos e datas em arrays compactos
+    historico = resultados[0]
+    assert historico.fechamento.dtype == np.float64 and historico.datas.dtype == np.int64
+    assert historico.nbytes == cache.nbytes <= 4 * 8 * 120
+
+    # Limite em bytes: as entradas menos usadas saem primeiro
+    consultas = []
+    obter_varios = cache.armazem.obter_varios
+    cache.armazem.obter_varios = lambda tickers, *args, **kwargs: \
+        consultas.extend(tickers) or obter_varios(tickers, *args, **kwargs)
+
+    cache.limite_bytes = 3 * historico.nbytes
+    cache.obter_varios(['^IRX', 'IVVB11.SA'])
+    cache.obter('BOVA11.SA')
+    cache.obter('GOLD11.SA')
+    assert cache.nbytes <= cache.limite_bytes
+    cache.obter_varios(['BOVA11.SA', 'GOLD11.SA', 'IVVB11.SA'])
+    assert consultas == ['^IRX', 'IVVB11.SA', 'GOLD11.SA']
+    cache.obter('^IRX')
+    assert consultas[-1] == '^IRX'
+
+
+def test_atualizador_serve_dados_antigos_ate_trocar(tmp_path):
+    tickers = ['^IRX', 'BOVA11.SA']
+    completos = {ticker: _historico(61, fim='2025-01-01', semente=indice) for indice, ticker in enumerate(tickers)}
+    provedor = ProvedorContador({ticker: dados.iloc[:60] for ticker, dados in completos.items()})
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), provedor, validade=timedelta(0)))
+    estatisticas = EstatisticasMercado(backtesting, ['renda_fixa', 'acoes_brasil'])
+    antigas = estatisticas.obter('5y')
+
+    provedor.dados, provedor.atraso = completos, 0.3
+    atualizador = AtualizadorDados(backtesting.cache, [estatisticas], tickers=tickers)
+
+    async def cenario():
+        atualizador.iniciar()
+        await asyncio.sleep(0.05)
+
+        # Durante a atualização: resposta imediata com os dados anteriores
+        inicio = time.perf_counter()
+        assert estatisticas.obter('5y') is antigas
+        assert time.perf_counter() - inicio < 0.1
+
+        while atualizador.ultima_atualizacao is None:
+            await asyncio.sleep(0.02)
+        await atualizador.parar()
+
+    asyncio.run(cenario())
+
+    # Depois: derivados já reconstruídos para a nova versão, sem recalcular na requisição
+    novas = estatisticas.obter('5y')
+    assert novas is estatisticas._cache['5y'] and novas is not antigas
+    assert novas['versao'] == backtesting.versoes_dados(tickers) and novas['datas'][-1] == pd.Timestamp('2025-01-01')
+    assert atualizador.ultima_atualizacao['atualizados'] == 2
+
+
+def test_atualizador_so_recarrega_series_vencidas(tmp_path):
+    tickers = ['^IRX', 'BOVA11.SA']
+    provedor = ProvedorContador({ticker: _historico(semente=indice) for indice, ticker in enumerate(tickers)})
+    armazem = ArmazemDados(str(tmp_path), provedor)
+    armazem.obter_varios(tickers, 'max')
+    chamadas = len(provedor.chamadas)
+
+    # Armazém em dia: a primeira passagem do laço (ex: ao reiniciar) não baixa nem reconstrói nada
+    atualizador = AtualizadorDados(Backtesting(armazem).cache, tickers=[*tickers, 'GOLD11.SA'])
+    atualizador.cache.obter_varios(tickers)
+    assert atualizador.atualizar_vencidos()['atualizados'] == 0
+    assert [ticker for ticker, _, _ in provedor.chamadas[chamadas:]] == ['GOLD11.SA']
+
+    provedor.dados['GOLD11.SA'] = _historico(semente=2)
+    assert atualizador.atualizar_vencidos()['atualizados'] == 1
+    chamadas = len(provedor.chamadas)
+    assert atualizador.atualizar_vencidos() is None and len(provedor.chamadas) == chamadas
+
+    armazem.validade = timedelta(0)
+    assert atualizador.atualizar_vencidos()['atualizados'] == 3
+
+
+def test_recarga_sem_dados_nao_trava_caches_derivados(tmp_path):
+    # Offline: a recarga não traz dados e a reconstrução dos derivados relê as mesmas séries
+    armazem = ArmazemDados(str(tmp_path), ProvedorContador({}))
+    backtesting = Backtesting(armazem)
+    estatisticas = EstatisticasMercado(backtesting, ['renda_fixa', 'acoes_brasil'])
+    atualizador = AtualizadorDados(backtesting.cache, [estatisticas], tickers=['^IRX', 'BOVA11.SA'])
+    estatisticas.obter('5y')
+
+    thread = threading.Thread(target=atualizador.atualizar, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert atualizador.ultima_atualizacao['atualizados'] == 0
+
+
+def test_vencidos_servidos_do_disco_e_revalidados_em_segundo_plano(tmp_path):
+    tickers = ['^IRX', 'BOVA11.SA']
+    completos = {ticker: _historico(61, fim='2025-01-01', semente=indice) for indice, ticker in enumerate(tickers)}
+    provedor = ProvedorContador({ticker: dados.iloc[:60] for ticker, dados in completos.items()})
+    armazem = ArmazemDados(str(tmp_path), provedor, validade=timedelta(0))
+    armazem.obter_varios(tickers, 'max')
+    provedor.dados, provedor.atraso = completos, 0.2
+    chamadas = len(provedor.chamadas)
+
+    backtesting = Backtesting(armazem)
+    estatisticas = EstatisticasMercado(backtesting, ['renda_fixa', 'acoes_brasil'])
+    atualizador = AtualizadorDados(backtesting.cache, [estatisticas], tickers=tickers)
+    construcoes = []
+    construir = estatisticas._construir
+    estatisticas._construir = lambda periodo: construcoes.append(periodo) or construir(periodo)
+
+    async def cenario():
+        atualizador.registrar()
+
+        # Aquecimento: arquivos vencidos vêm do disco, sem esperar a rede
+        inicio = time.perf_counter()
+        await asyncio.to_thread(atualizador.aquecer)
+        assert time.perf_counter() - inicio < 0.2
+        antigas = estatisticas.obter('5y')
+        assert antigas['datas'][-1] == pd.Timestamp('2024-12-01')
+
+        # Revalidação agendada: as requisições seguem servidas sem recalcular
+        while not atualizador._revalidacoes:
+            await asyncio.sleep(0.01)
+        while atualizador._revalidacoes:
+            assert estatisticas.obter('5y') in (antigas, estatisticas._cache['5y'])
+            await asyncio.sleep(0.01)
+        await atualizador.parar()
+
+    asyncio.run(cenario())
+
+    # Derivados trocados antes da publicação: uma construção no aquecimento e uma na revalidação
+    assert estatisticas.obter('5y')['datas'][-1] == pd.Timestamp('2025-01-01')
+    assert construcoes == ['5y', '5y'] and len(provedor.chamadas) == chamadas + len(tickers)
+    assert backtesting.cache.agendar_recarga is None
+
+
+def test_recarga_passa_pelas_buscas_em_andamento(tmp_path):
+    provedor = ProvedorContador({'BOVA11.SA': _historico()}, atraso=0.2)
+    cache = CacheHistoricos(ArmazemDados(str(tmp_path), provedor))
+
+    recarga = threading.Thread(target=cache.recarregar, args=(['BOVA11.SA'],))
+    recarga.start()
+    time.sleep(0.05)
+    # A falta espera a recarga em andamento em vez de baixar de novo
+    historico = cache.obter('BOVA11.SA')
+    recarga.join()
+    assert historico is cache.obter('BOVA11.SA') and len(provedor.chamadas) == 1
+
+
+def test_backtest_diario_alinhado_por_dias(tmp_path):
+    fixtures = {
+        ticker: _historico_diario(semente=indice, todos_os_dias=ticker == 'BTC-USD')
+        for indice, ticker in enumerate(sorted(set(TICKERS_BRASIL.values())))
+    }
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), ProvedorLocal(fixtures)))
+    alocacoes = [{classe: 1 / 6 for classe in TICKERS_BRASIL}, {'acoes_brasil': 0.7, 'criptomoedas': 0.3}]
+    backtesting.simular_carteiras_diarias(alocacoes)
+
+    inicio = time.perf_counter()
+    diario = backtesting.simular_carteiras_diarias(alocacoes, 10000, 500)
+    assert time.perf_counter() - inicio < 0.5
+
+    # Mesmo resultado do caminho com DataFrames: interseção das datas e retornos de fechamento a fechamento
+    tickers = [TICKERS_BRASIL['acoes_brasil'], TICKERS_BRASIL['criptomoedas']]
+    precos = pd.concat({ticker: fixtures[ticker]['Close'] for ticker in tickers}, axis=1, sort=True).dropna()
+    retornos = precos.pct_change().dropna() @ np.array([0.7, 0.3])
+    patrimonio = 10000.0
+    for data, retorno in retornos.items():
+        patrimonio = patrimonio * (1 + retorno) + (500 if data.month != (data - pd.offsets.BDay()).month else 0)
+
+    assert diario[1]['num_dias'] == len(retornos) and diario[1]['datas'][-1] == precos.index[-1]
+    assert diario[1]['patrimonio_final'] == pytest.approx(patrimonio)
+    assert diario[1]['total_aportado'] == 10000 + 500 * (precos.index.to_period('M').nunique() - 1)
+
+    # Barras diárias revelam quedas que o fechamento mensal esconde
+    riqueza = np.asarray(diario[1]['patrimonio_historico'])
+    datas = pd.DatetimeIndex(diario[1]['datas'])
+    mensal = pd.Series(riqueza, index=datas).groupby(datas.to_period('M')).last().to_numpy()
+    assert diario[1]['max_drawdown'] <= (mensal / np.maximum.accumulate(mensal) - 1).min() * 100 + 1e-9
+
+
+def test_provedor_sintetico_semeado_e_correlacionado(tmp_path):
+    provedor = ProvedorSintetico(seed=7, fim='2024-12-31')
+
+    inicio = time.perf_counter()
+    diarios = provedor.baixar_varios(['BOVA11.SA', '^BVSP', 'BRL=X', 'BTC-USD'], 'max', '1d')
+    assert time.perf_counter() - inicio < 1.0
+
+    # Mesma semente, mesmos dados; histórico passado não muda quando o fim avança
+    anterior = ProvedorSintetico(seed=7, fim='2010-06-30').baixar('BTC-USD', 'max', '1d')
+    np.testing.assert_array_equal(anterior['Close'], diarios['BTC-USD']['Close'].loc[:'2010-06-30'])
+    assert not np.allclose(ProvedorSintetico(seed=8, fim='2024-12-31').baixar('^BVSP', '5y', '1d')['Close'],
+                           provedor.baixar('^BVSP', '5y', '1d')['Close'])
+
+    # Ações só em dias úteis, cripto todos os dias
+    assert diarios['BOVA11.SA'].index.dayofweek.max() == 4 and diarios['BTC-USD'].index.dayofweek.max() == 6
+
+    retornos = pd.concat({ticker: np.log(dados['Close']).diff() for ticker, dados in diarios.items()}, axis=1, sort=True).dropna()
+    correlacao = retornos.corr()
+    assert correlacao.loc['BOVA11.SA', '^BVSP'] > 0.9 and correlacao.loc['BOVA11.SA', 'BRL=X'] < -0.2
+    assert retornos['BOVA11.SA'].std() * np.sqrt(252) == pytest.approx(0.25, rel=0.1)
+    assert retornos['BTC-USD'].kurt() > 5 > retornos['BOVA11.SA'].kurt()
+
+    mensal = provedor.baixar('IFIX.SA', '5y', '1mo')
+    assert len(mensal) == 61 and mensal.index.is_month_start.all()
+
+
+def test_backtesting_usa_mercado_sintetico_sem_dados(tmp_path):
+    # Sem reserva configurada, ticker sem dados fica de fora e o resultado se declara sintético
+    sem_reserva = Backtesting(ArmazemDados(str(tmp_path / 'sem_reserva'), ProvedorLocal({})))
+    assert sem_reserva.obter_dados_historicos('BOVA11.SA', '5y').empty
+    mock = sem_reserva.simular_carteira({'acoes_brasil': 1.0}, 10000, periodo='5y')
+    assert mock['dados_sinteticos'] and mock['series_sinteticas'] == []
+
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), ProvedorLocal({})), reserva=ProvedorSintetico())
+
+    dados = backtesting.obter_dados_historicos('BOVA11.SA', '5y')
+    assert len(dados) == 61 and backtesting.obter_dados_historicos('BOVA11.SA', '2y').index[-1] == dados.index[-1]
+    assert backtesting.cache.obter('BOVA11.SA') is backtesting.cache.obter('BOVA11.SA')
+    assert backtesting.series_sinteticas(['BOVA11.SA', '^IRX']) == ['BOVA11.SA']
+
+    # Sem carteira válida: simulação mock, também semeada
+    for simular in (backtesting.simular_carteiras, backtesting.simular_carteiras_diarias):
+        primeira, segunda = simular([{}], 10000), simular([{}], 10000)
+        assert primeira[0]['patrimonio_historico'] == segunda[0]['patrimonio_historico']
+
+    # O mock diário mantém a resolução e as chaves diárias
+    diario = backtesting.simular_carteiras_diarias([{}], 10000, 500, periodo='1y')[0]
+    assert diario['num_dias'] == 252 and len(diario['patrimonio_historico']) == 253
+    assert 'melhor_dia' in diario and 'melhor_mes' not in diario and diario['dados_sinteticos']
+    assert diario['aportes_total'] in (12 * 500, 13 * 500)  # um aporte por virada de mês
+
+    # Determinístico entre instâncias
+    outro = Backtesting(ArmazemDados(str(tmp_path / 'outro'), ProvedorLocal({})), reserva=ProvedorSintetico())
+    resultado = backtesting.simular_carteira({'renda_fixa': 0.5, 'criptomoedas': 0.5}, 10000, periodo='5y')
+    assert resultado == outro.simular_carteira({'renda_fixa': 0.5, 'criptomoedas': 0.5}, 10000, periodo='5y')
+    assert resultado['dados_sinteticos'] and resultado['series_sinteticas'] == ['^IRX', 'BTC-USD']
+
+
+def test_atualizacao_incremental_igual_recalculo(tmp_path):
+    alocacao = {'renda_fixa': 0.5, 'acoes_brasil': 0.3, 'criptomoedas': 0.2}
+    tickers = [TICKERS_BRASIL[classe] for classe in alocacao]
+    completos = {ticker: _historico(semente=indice) for indice, ticker in enumerate(tickers)}
+    provedor = ProvedorLocal({ticker: dados.iloc[:110] for ticker, dados in completos.items()})
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), provedor, validade=timedelta(0)))
+
+    anterior = backtesting.simular_carteira(alocacao, 10000, 300, periodo='max', retornar_estado=True)
+    assert 'estado' not in backtesting.simular_carteira(alocacao, 10000, 300, periodo='max')
+    estado = json.loads(json.dumps(anterior['estado']))  # persistido pelo cliente
+
+    # Chegam 10 barras novas e a última barra antiga (mês em aberto) é revisada
+    for indice, dados in enumerate(completos.values()):
+        dados.iloc[109, 0] *= 1.05 + 0.01 * indice
+    provedor.dados = completos
+    backtesting.cache.recarregar(tickers)
+    atualizado = backtesting.atualizar_carteira(alocacao, estado, 300)
+    completo = backtesting.simular_carteira(alocacao, 10000, 300, periodo='max', retornar_estado=True)
+
+    assert len(atualizado['patrimonio_novo']) == 11 and atualizado['datas_novas'] == completo['datas'][-11:]
+    np.testing.assert_allclose(atualizado['patrimonio_novo'], completo['patrimonio_historico'][-11:])
+    for chave in ('patrimonio_final', 'total_aportado', 'rentabilidade_total', 'retorno_anualizado',
+                  'volatilidade_anual', 'sharpe_ratio', 'max_drawdown', 'melhor_mes', 'pior_mes'):
+        assert atualizado[chave] == pytest.approx(completo[chave], rel=1e-9), chave
+    assert atualizado['estado']['ultima_data'] == completo['estado']['ultima_data']
+
+    # Sem barras novas: só a última barra é reavaliada e nada muda
+    repetido = backtesting.atualizar_carteira(alocacao, atualizado['estado'], 300)
+    assert repetido['patrimonio_novo'] == atualizado['patrimonio_novo'][-1:]
+    assert repetido['patrimonio_final'] == pytest.approx(atualizado['patrimonio_final'], rel=1e-12)
+
+    # Estado sem barras: extremos vazios viram None e o JSON é estrito
+    vazio = json.loads(json.dumps(EstadoBacktest(10000).para_dict(), allow_nan=False))
+    assert vazio['melhor'] is None and vazio['pior'] is None
+    assert EstadoBacktest.de_dict(vazio).pior == np.inf
+
+
+def test_busca_em_lote_concorrente(tmp_path, servidor_cotacoes):
+    url, requisicoes = servidor_cotacoes
+    backtesting = Backtesting(ArmazemDados(str(tmp_path), ProvedorHTTP(url)))
+    tickers = sorted(set(TICKERS_BRASIL.values())) + ['INEXISTENTE']
+
+    inicio = time.perf_counter()
+    fechamentos = backtesting.obter_fechamentos(tickers, '5y')
+    assert time.perf_counter() - inicio < 0.2 * len(tickers) / 2
+
+    # Sem provedor de reserva, o ticker inexistente fica de fora em vez de virar série sintética
+    assert list(fechamentos.columns) == tickers[:-1]
+    assert len(fechamentos.dropna()) == 61
+    assert len(requisicoes) == len(tickers)
+    assert backtesting.series_sinteticas(tickers) == []
+
+    # Tudo em cache: comparar com benchmarks não faz novas requisições
+    backtesting.comparar_com_benchmarks({'renda_fixa': 0.5, 'criptomoedas': 0.5}, 10000, periodo='5y')
+    assert len(requisicoes) == len(tickers)
@@ -0,0 +1,503 @@
+"""
+Testes dos módulos de simulação (Monte Carlo e Backtesting)
+Usam dados históricos sintéticos e determinísticos, sem acesso à rede
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from simulacao import backtesting
+from simulacao import monte_carlo as modulo_monte_carlo
+from simulacao.backtesting import TICKERS_BRASIL
+from simulacao.cache_normais import CacheNormais
+from simulacao.dados_mercado import ArmazemDados, CacheHistoricos, ProvedorLocal
+from simulacao.fronteira import FronteiraEficiente
+from simulacao.kernels import (
+    evolucao_com_rebalanceamento, evolucao_patrimonio, expandir_fluxos,
+    metricas_carteiras, metricas_janelas, metricas_trajetoria, projecao_deterministica
+)
+from simulacao.monte_carlo import MonteCarloSimulation
+from simulacao.tributacao import patrimonio_liquido
+
+
+ALOCACAO = {'renda_fixa': 0.5, 'acoes_brasil': 0.3, 'criptomoedas': 0.2}
+
+
+def _dados_sinteticos(ticker, periodo='5y', intervalo='1mo'):
+    """Preços mensais determinísticos por ticker"""
+    rng = np.random.default_rng(sorted(set(TICKERS_BRASIL.values())).index(ticker))
+    datas = pd.date_range(end='2024-12-01', periods=60, freq='MS')
+    retornos = rng.normal(0.008, 0.04, len(datas))
+    return pd.DataFrame({'Close': 100 * np.cumprod(1 + retornos)}, index=datas)
+
+
+@pytest.fixture
+def monte_carlo(monkeypatch, tmp_path):
+    fixtures = {ticker: _dados_sinteticos(ticker) for ticker in set(TICKERS_BRASIL.values())}
+    monkeypatch.setattr(backtesting, 'cache_historicos', CacheHistoricos(ArmazemDados(str(tmp_path), ProvedorLocal(fixtures))))
+    # Normais semeadas em pasta própria do teste, não no diretório temporário global
+    monkeypatch.setattr(modulo_monte_carlo, 'cache_normais', CacheNormais(str(tmp_path / 'normais')))
+    return MonteCarloSimulation()
+
+
+def test_evolucao_patrimonio_igual_ao_loop():
+    rng = np.random.default_rng(0)
+    retornos = rng.normal(0.01, 0.05, (4, 36))
+
+    esperado = np.empty_like(retornos)
+    for caminho in range(retornos.shape[0]):
+        patrimonio = 1000.0
+        for mes in range(retornos.shape[1]):
+            patrimonio = patrimonio * (1 + retornos[caminho, mes]) + 100
+            esperado[caminho, mes] = patrimonio
+
+    np.testing.assert_allclose(evolucao_patrimonio(retornos, 1000.0, 100.0), esperado)
+
+
+def test_bootstrap_retorna_mesmas_chaves(monte_carlo):
+    normal = monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=5, num_simulacoes=200)
+    bootstrap = monte_carlo.simular_bootstrap(ALOCACAO, 10000, 500, anos=5, num_simulacoes=200, seed=1)
+
+    assert bootstrap.keys() == normal.keys()
+    assert bootstrap['patrimonio_minimo'] <= bootstrap['patrimonio_mediano'] <= bootstrap['patrimonio_maximo']
+    assert bootstrap == monte_carlo.simular_bootstrap(ALOCACAO, 10000, 500, anos=5, num_simulacoes=200, seed=1)
+
+
+def test_bootstrap_sem_historico_usa_o_periodo_pedido(monte_carlo, monkeypatch):
+    periodos = []
+    original = monte_carlo.calcular_parametros_historicos
+    monkeypatch.setattr(
+        monte_carlo, 'calcular_parametros_historicos',
+        lambda alocacao, periodo='5y': periodos.append(periodo) or original(alocacao, periodo)
+    )
+
+    # Um mês de histórico não basta para reamostrar: cai no modelo normal do mesmo período
+    assert len(monte_carlo.estatisticas.obter('1mo')['retornos']) < 2
+    monte_carlo.simular_bootstrap(ALOCACAO, 10000, 500, anos=5, num_simulacoes=100, periodo_historico='1mo')
+    assert periodos == ['1mo']
+
+
+def test_parametros_da_covariancia_igual_serie_ponderada(monte_carlo):
+    params = monte_carlo.calcular_parametros_historicos(ALOCACAO)
+
+    matriz = monte_carlo.backtesting.obter_matriz_retornos(list(ALOCACAO))
+    serie = matriz @ pd.Series(ALOCACAO)
+
+    assert params['retorno_medio_mensal'] == pytest.approx(serie.mean())
+    assert params['volatilidade_mensal'] == pytest.approx(serie.std())
+
+
+def test_estatisticas_invalidadas_quando_dados_mudam(monte_carlo):
+    primeira = monte_carlo.estatisticas.obter('5y')
+    assert monte_carlo.estatisticas.obter('5y') is primeira
+
+    monte_carlo.backtesting.limpar_cache()
+    assert monte_carlo.estatisticas.obter('5y') is not primeira
+
+
+def test_projecao_deterministica_forma_fechada():
+    taxas = np.array([[0.02, 0.0, -0.015]])
+    projecao = projecao_deterministica(taxas, 1000.0, 100.0, 24)
+
+    for indice, taxa in enumerate(taxas[0]):
+        patrimonio = [1000.0]
+        for _ in range(24):
+            patrimonio.append(patrimonio[-1] * (1 + taxa) + 100)
+        np.testing.assert_allclose(projecao[0, indice], patrimonio)
+
+
+def test_bandas_anuais_proximas_dos_percentis_exatos(monte_carlo):
+    resultado = monte_carlo.simular_cenarios(
+        ALOCACAO, 10000, 500, anos=5, num_simulacoes=6000, bandas='anual', caminhos_por_bloco=1000, seed=3
+    )
+
+    bandas = resultado['bandas']
+    assert bandas['meses'] == [0, 12, 24, 36, 48, 60]
+    assert bandas['percentil_50'][0] == 10000
+    assert bandas['percentil_10'][-1] == pytest.approx(resultado['percentil_10'], rel=0.01)
+    assert bandas['percentil_90'][-1] == pytest.approx(resultado['percentil_90'], rel=0.01)
+    assert all(np.diff([bandas[f'percentil_{p}'][3] for p in (5, 10, 25, 50, 75, 90, 95)]) >= 0)
+
+
+def test_memoria_limitada_ao_bloco(monte_carlo):
+    import tracemalloc
+
+    num_simulacoes, anos, bloco = 20000, 30, 1000
+    tracemalloc.start()
+    try:
+        monte_carlo.simular_cenarios(
+            ALOCACAO, 10000, 500, anos=anos, num_simulacoes=num_simulacoes,
+            bandas='anual', caminhos_por_bloco=bloco, seed=None
+        )
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Matriz completa: 20000 x 360 x 8 bytes = 57.6 MB; um bloco: 2.9 MB
+    assert pico < num_simulacoes * anos * 12 * 8 / 2
+
+
+@pytest.mark.parametrize('variavel', ['aporte_mensal', 'valor_inicial', 'anos'])
+def test_resolver_meta_atinge_confianca(monte_carlo, variavel):
+    resultado = monte_carlo.resolver_meta(
+        ALOCACAO, 300000, variavel, confianca=0.8, valor_inicial=10000, aporte_mensal=500, anos=10
+    )
+
+    assert resultado['atingivel']
+    assert resultado['probabilidade_atingida'] >= 80.0
+    assert resultado['probabilidade_atingida'] < 81.0
+
+
+def test_modo_analitico_proximo_da_simulacao(monte_carlo):
+    relatorio = monte_carlo.relatorio_calibracao_analitica(
+        anos_grade=(10,), volatilidades_grade=(0.03,), num_simulacoes=20000
+    )
+    assert relatorio[0]['dentro_tolerancia']
+
+    analitico = monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=5, modo='analitico', bandas='anual')
+    assert analitico.keys() == monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=5, bandas='anual').keys()
+    assert analitico['bandas']['percentil_50'][-1] == pytest.approx(analitico['patrimonio_mediano'])
+
+
+def test_opcoes_invalidas_de_simular_cenarios(monte_carlo):
+    with pytest.raises(ValueError, match="'mensal', 'anual'"):
+        monte_carlo.simular_cenarios(ALOCACAO, bandas='semanal')
+    with pytest.raises(ValueError, match="'simulacao', 'analitico'"):
+        monte_carlo.simular_cenarios(ALOCACAO, modo='analitica')
+
+
+def test_modo_analitico_fora_da_calibracao_simula(monte_carlo, monkeypatch):
+    relatorio = monte_carlo.relatorio_calibracao_analitica(
+        anos_grade=(5, 10), volatilidades_grade=(0.05, 0.12), num_simulacoes=5000
+    )
+    assert all(ponto['dentro_tolerancia'] for ponto in relatorio if ponto['calibrado'])
+    assert not any(ponto['calibrado'] for ponto in relatorio if not ponto['dentro_tolerancia'])
+
+    monkeypatch.setattr(
+        monte_carlo, 'calcular_parametros_historicos',
+        lambda alocacao, periodo='5y': {'retorno_medio_mensal': 0.008, 'volatilidade_mensal': 0.12}
+    )
+    analitico = monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=10, modo='analitico', bandas='anual')
+    assert analitico == monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=10, bandas='anual')
+
+
+def test_cache_normais_compartilha_e_limita_tamanho(tmp_path):
+    cache = CacheNormais(str(tmp_path), limite_bytes=int(2.5 * 100 * 12 * 8))
+
+    bloco = cache.obter(100, 12, seed=7)
+    assert not bloco.flags.writeable
+    np.testing.assert_array_equal(CacheNormais(str(tmp_path)).obter(100, 12, seed=7), bloco)
+
+    cache.obter(100, 12, seed=8)
+    cache.obter(100, 12, seed=9)
+    assert len(list(tmp_path.glob('normais_*.npy'))) == 2
+    assert (100, 12, 7) not in cache._blocos
+
+
+def test_cache_normais_gera_em_lotes_e_nao_cacheia_matrizes_grandes(tmp_path, monkeypatch):
+    from simulacao import cache_normais as modulo
+
+    monkeypatch.setattr(modulo, 'BYTES_POR_LOTE', 7 * 12 * 8)
+    esperado = np.random.default_rng(7).standard_normal((100, 12))
+
+    cache = CacheNormais(str(tmp_path), limite_arquivo=50 * 12 * 8)
+    np.testing.assert_array_equal(CacheNormais(str(tmp_path)).obter(100, 12, seed=7), esperado)
+    assert not cache.cacheavel(100, 12)
+
+    # Acima do limite: gerada em fluxo, sem arquivo novo, com os mesmos valores
+    np.testing.assert_array_equal(np.vstack(list(cache.blocos(100, 12, 7, 30))), esperado)
+    np.testing.assert_array_equal(np.vstack(list(cache.blocos(100, 12, 8, 30))), cache.obter(100, 12, seed=8))
+    assert [arquivo.name for arquivo in tmp_path.glob('normais_*.npy')] == ['normais_100_12_7.npy']
+
+
+def test_expandir_fluxos_cronograma():
+    fluxos = expandir_fluxos(
+        {'aporte_mensal': 100, 'reajuste_anual': 0.1, 'inicio_resgate': 25,
+         'resgate_mensal': 50, 'aportes_extras': {'3': 1000}},
+        30
+    )
+
+    assert fluxos[0] == 100 and fluxos[12] == pytest.approx(110)
+    assert fluxos[2] == 1100
+    assert fluxos[23] == pytest.approx(110) and fluxos[24] == -50
+
+
+def test_resgates_geram_ruina(monte_carlo):
+    fluxos = {'aporte_mensal': 0, 'inicio_resgate': 1, 'resgate_mensal': 400}
+    resultado = monte_carlo.simular_cenarios(ALOCACAO, 10000, anos=5, num_simulacoes=500, fluxos=fluxos)
+
+    assert resultado['probabilidade_ruina'] > 50
+    assert 20 < resultado['mes_ruina']['percentil_50'] <= 60
+    assert resultado['patrimonio_minimo'] == 0
+
+    carteira = monte_carlo.backtesting.simular_carteira(ALOCACAO, 10000, periodo='5y', fluxos=fluxos)
+    assert carteira['patrimonio_final'] == 0
+    assert carteira['patrimonio_historico'][carteira['mes_ruina']] == 0
+    assert carteira['patrimonio_historico'][carteira['mes_ruina'] - 1] > 0
+
+
+def test_metricas_trajetoria_igual_ao_loop():
+    rng = np.random.default_rng(5)
+    retornos = rng.normal(0.005, 0.06, (3, 30))
+    patrimonio = evolucao_patrimonio(retornos, 1000.0, 50.0)
+    aportado = 1000.0 + 50.0 * np.arange(1, 31)
+
+    metricas = metricas_trajetoria(patrimonio, retornos, 1000.0, aportado)
+
+    for caminho in range(3):
+        serie = np.concatenate([[1000.0], patrimonio[caminho]])
+        pico = np.maximum.accumulate(serie)
+        assert metricas['drawdown_maximo'][caminho] == pytest.approx(((serie / pico - 1).min()) * 100)
+
+        janelas = [np.prod(1 + retornos[caminho, i:i + 12]) - 1 for i in range(30 - 11)]
+        assert metricas['pior_retorno_janela'][caminho] == pytest.approx(min(janelas) * 100)
+        assert metricas['abaixo_aportado'][caminho] == any(patrimonio[caminho] < aportado)
+
+
+def test_simular_cenarios_com_metricas_trajetoria(monte_carlo):
+    resultado = monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=5, incluir_metricas_trajetoria=True)
+    metricas = resultado['metricas_trajetoria']
+
+    assert metricas['drawdown_maximo']['percentil_10'] <= metricas['drawdown_maximo']['percentil_90'] <= 0
+    assert 0 <= metricas['probabilidade_abaixo_aportado'] <= 100
+
+
+def test_rebalanceamento_mensal_sem_custo_igual_carteira_ponderada():
+    rng = np.random.default_rng(2)
+    retornos = rng.normal(0.01, 0.05, (4, 24, 3))
+    pesos = np.array([0.5, 0.3, 0.2])
+
+    mensal = evolucao_com_rebalanceamento(retornos, pesos, 1000.0, np.full(24, 100.0), frequencia=1)
+    np.testing.assert_allclose(mensal['patrimonio'], evolucao_patrimonio(retornos @ pesos, 1000.0, 100.0))
+
+    comprar_manter = evolucao_com_rebalanceamento(retornos, pesos, 1000.0, np.full(24, 100.0))
+    bandas = evolucao_com_rebalanceamento(retornos, pesos, 1000.0, np.full(24, 100.0), banda=1.0)
+    np.testing.assert_allclose(comprar_manter['patrimonio'], bandas['patrimonio'])
+
+    com_custo = evolucao_com_rebalanceamento(retornos, pesos, 1000.0, np.full(24, 100.0), frequencia=3, custos=0.01)
+    assert (com_custo['custos'] > 0).all()
+    assert (com_custo['rebalanceamentos'] == 8).all()
+
+
+def test_resgates_sem_rebalanceamento_saem_das_posicoes_atuais():
+    rng = np.random.default_rng(5)
+    retornos = rng.normal(0.01, 0.08, (3, 36, 2))
+    retornos[:, 0, 1] = -0.8  # Um ativo despenca: resgatar pelo alvo o deixaria vendido
+    fluxos = expandir_fluxos({'aporte_mensal': 50, 'inicio_resgate': 7, 'resgate_mensal': 120}, 36)
+
+    resultado = evolucao_com_rebalanceamento(retornos, np.array([0.5, 0.5]), 1000.0, fluxos)
+
+    posicoes, esperado = np.full((3, 2), 500.0), []
+    for mes in range(36):
+        posicoes = posicoes * (1 + retornos[:, mes])
+        if fluxos[mes] >= 0:
+            posicoes = posicoes + fluxos[mes] * 0.5
+        else:
+            with np.errstate(divide='ignore'):
+                posicoes = posicoes * np.maximum(1 + fluxos[mes] / posicoes.sum(axis=1), 0.0)[:, None]
+        assert (posicoes >= 0).all()
+        esperado.append(posicoes.sum(axis=1))
+
+    np.testing.assert_allclose(resultado['patrimonio'], np.array(esperado).T)
+    assert (resultado['rebalanceamentos'] == 0).all()
+
+
+def test_simular_multiativos(monte_carlo):
+    resultado = monte_carlo.simular_multiativos(
+        ALOCACAO, 10000, 500, anos=5, num_simulacoes=500, rebalanceamento='trimestral', custo_transacao=0.001
+    )
+
+    assert resultado['rebalanceamentos_medio'] == 20
+    assert resultado['custos_transacao_medio'] > 0
+    assert resultado['patrimonio_minimo'] <= resultado['patrimonio_mediano'] <= resultado['patrimonio_maximo']
+
+
+def test_coorte_em_lotes_igual_simulacao_individual(monte_carlo):
+    alocacoes = [ALOCACAO, {'renda_fixa': 1.0}, {'acoes_brasil': 0.5, 'criptomoedas': 0.5}]
+    argumentos = (alocacoes, [10000, 5000, 0], [500, 0, 1000], [5, 10, 3])
+
+    em_lotes = monte_carlo.simular_coorte(
+        *argumentos, num_simulacoes=300, memoria_maxima_bytes=1, caminhos_por_bloco=70
+    )
+    inteira = monte_carlo.simular_coorte(*argumentos, num_simulacoes=300)
+    for chave in ('percentil_10', 'patrimonio_minimo', 'patrimonio_maximo'):
+        np.testing.assert_allclose(em_lotes[chave], inteira[chave])
+    assert np.all(inteira['patrimonio_minimo'] <= inteira['patrimonio_mediano'])
+    assert np.all(inteira['patrimonio_mediano'] <= inteira['patrimonio_maximo'])
+
+    # Mesmo bloco de normais (maior horizonte) que a simulação multiativos com rebalanceamento mensal
+    individual = monte_carlo.simular_multiativos(
+        {'renda_fixa': 1.0}, 5000, 0, anos=10, num_simulacoes=300, rebalanceamento='mensal'
+    )
+    assert inteira['patrimonio_mediano'][1] == pytest.approx(individual['patrimonio_mediano'])
+
+
+def test_tabela_regressiva_e_come_cotas():
+    retornos = np.full((1, 6, 1), 0.01)
+    sem_taxa = {'renda_fixa': {'taxa_plataforma_anual': 0.0, 'come_cotas': None}}
+    cota_5, cota_6 = 1.01 ** 5, 1.01 ** 6
+
+    direto = patrimonio_liquido(retornos, np.array([1.0]), ['renda_fixa'], 1000.0, np.zeros(6), sem_taxa)
+    assert direto['liquido'][0] == pytest.approx(1000 + 0.775 * 1000 * (cota_6 - 1))
+
+    # Come-cotas de 15% no mês 5; no resgate completa os 22,5% do lote
+    fundo = {'renda_fixa': {'taxa_plataforma_anual': 0.0, 'come_cotas': 0.15}}
+    com_come_cotas = patrimonio_liquido(retornos, np.array([1.0]), ['renda_fixa'], 1000.0, np.zeros(6), fundo)
+    fracao = 1 - 0.15 * (cota_5 - 1) / cota_5
+    esperado = 1000 * fracao * (cota_6 - (0.225 * (cota_6 - 1) - 0.15 * (cota_5 - 1)))
+    assert com_come_cotas['liquido'][0] == pytest.approx(esperado)
+
+    # Por padrão a renda fixa é um fundo de longo prazo, com come-cotas
+    longo = np.full((1, 36, 1), 0.01)
+    padrao = patrimonio_liquido(longo, np.array([1.0]), ['renda_fixa'], 1000.0, np.zeros(36))
+    titulo = patrimonio_liquido(longo, np.array([1.0]), ['renda_fixa'], 1000.0, np.zeros(36), {'renda_fixa': {'come_cotas': None}})
+    assert padrao['antes_impostos'][0] == pytest.approx(titulo['antes_impostos'][0])
+    assert padrao['liquido'][0] < titulo['liquido'][0]
+
+
+def test_simulacao_liquida(monte_carlo):
+    bruta = monte_carlo.simular_multiativos(ALOCACAO, 10000, 500, anos=5, num_simulacoes=500)
+    liquida = monte_carlo.simular_cenarios(ALOCACAO, 10000, 500, anos=5, num_simulacoes=500, liquido=True)
+
+    assert liquida['patrimonio_bruto_mediano'] == pytest.approx(bruta['patrimonio_mediano'])
+    # Bruto e líquido dos mesmos sorteios, com as mesmas premissas
+    assert liquida['bruto'].keys() == bruta.keys() - {'rebalanceamento', 'custos_transacao_medio', 'rebalanceamentos_medio'}
+    for chave in ('patrimonio_medio', 'percentil_10', 'percentil_90', 'probabilidade_perda'):
+        assert liquida['bruto'][chave] == pytest.approx(bruta[chave])
+    assert liquida['patrimonio_mediano'] < bruta['patrimonio_mediano']
+    assert liquida['impostos_medio'] > 0 and liquida['taxas_medio'] > 0
+
+    with pytest.raises(ValueError):
+        monte_carlo.simular_multiativos(ALOCACAO, liquido=True, rebalanceamento='anual')
+
+
+def test_metricas_carteiras_igual_pandas():
+    rng = np.random.default_rng(4)
+    retornos = rng.normal(0.009, 0.045, (3, 48))
+    metricas = metricas_carteiras(retornos, 10000.0, 200.0)
+
+    for carteira in range(3):
+        patrimonio = pd.Series(metricas['patrimonio'][carteira])
+        assert patrimonio.iloc[-1] == pytest.approx(evolucao_patrimonio(retornos[carteira], 10000.0, 200.0)[-1])
+
+        drawdown = ((patrimonio - patrimonio.expanding().max()) / patrimonio.expanding().max()).min() * 100
+        assert metricas['max_drawdown'][carteira] == pytest.approx(drawdown)
+
+        volatilidade = pd.Series(retornos[carteira]).std() * np.sqrt(12) * 100
+        assert metricas['volatilidade_anual'][carteira] == pytest.approx(volatilidade)
+        assert metricas['pior_mes'][carteira] == pytest.approx(retornos[carteira].min() * 100)
+
+
+def test_carteiras_em_matriz_igual_individuais(monte_carlo):
+    backtesting = monte_carlo.backtesting
+    alocacoes = [ALOCACAO, {'renda_fixa': 1.0}, {'acoes_internacional': 0.7, 'commodities': 0.3}]
+
+    em_matriz = backtesting.simular_carteiras(alocacoes, 10000, 300, periodo='5y')
+    for alocacao, resultado in zip(alocacoes, em_matriz):
+        individual = backtesting.simular_carteira(alocacao, 10000, 300, periodo='5y')
+        assert resultado['patrimonio_final'] == pytest.approx(individual['patrimonio_final'])
+        assert resultado['max_drawdown'] == pytest.approx(individual['max_drawdown'])
+
+    comparacao = backtesting.comparar_com_benchmarks(ALOCACAO, 10000, 300, periodo='5y')
+    assert comparacao['carteira_ia']['patrimonio_final'] == pytest.approx(em_matriz[0]['patrimonio_final'])
+    assert comparacao['benchmarks']['CDI']['sharpe_ratio'] == pytest.approx(em_matriz[1]['sharpe_ratio'])
+
+
+def test_historico_curto_nao_encurta_benchmarks(tmp_path):
+    fixtures = {ticker: _dados_sinteticos(ticker) for ticker in set(TICKERS_BRASIL.values())}
+    fixtures['BTC-USD'] = fixtures['BTC-USD'].iloc[-24:]
+    simulador = backtesting.Backtesting(ArmazemDados(str(tmp_path), ProvedorLocal(fixtures)))
+
+    comparacao = simulador.comparar_com_benchmarks(ALOCACAO, 10000, 300, periodo='5y')
+    assert len(comparacao['carteira_ia']['datas']) == 24
+    for nome, classe in (('CDI', 'renda_fixa'), ('IBOVESPA', 'acoes_brasil'), ('S&P500', 'acoes_internacional')):
+        benchmark = comparacao['benchmarks'][nome]
+        individual = simulador.simular_carteira({classe: 1.0}, 10000, 300, periodo='5y')
+        assert len(benchmark['datas']) == 60
+        assert benchmark['patrimonio_final'] == pytest.approx(individual['patrimonio_final'])
+
+
+def test_estrategias_de_rebalanceamento_no_backtest(monte_carlo):
+    backtesting = monte_carlo.backtesting
+    alocacoes = [ALOCACAO, {'acoes_brasil': 0.5, 'criptomoedas': 0.5}]
+
+    mensal = backtesting.simular_carteiras(alocacoes, 10000, 300, periodo='5y')
+    # Banda zero rebalanceia todo mês pelo kernel de estados: mesmo resultado do produto matricial
+    banda_zero = backtesting.simular_carteiras(alocacoes, 10000, 300, periodo='5y', rebalanceamento='bandas', banda=0.0)
+    for rapido, kernel in zip(mensal, banda_zero):
+        assert kernel['patrimonio_final'] == pytest.approx(rapido['patrimonio_final'])
+        assert kernel['max_drawdown'] == pytest.approx(rapido['max_drawdown'])
+
+    parado = backtesting.simular_carteiras(alocacoes, 10000, 300, periodo='5y', rebalanceamento='nenhum')
+    assert all(r['num_rebalanceamentos'] == 0 and r['custos_transacao'] == 0 for r in parado)
+    assert parado[1]['desvio_maximo_pesos'] > mensal[1]['desvio_maximo_pesos']
+
+    custos = {'acoes_brasil': 0.001, 'criptomoedas': 0.01}
+    anual = backtesting.simular_carteiras(alocacoes, 10000, 300, periodo='5y', rebalanceamento='anual')
+    com_custo = backtesting.simular_carteiras(
+        alocacoes, 10000, 300, periodo='5y', rebalanceamento='anual', custo_transacao=custos
+    )
+    meses = len(com_custo[1]['patrimonio_historico']) - 1
+    assert com_custo[1]['num_rebalanceamentos'] == meses // 12 and com_custo[1]['custos_transacao'] > 0
+    assert com_custo[1]['patrimonio_final'] == pytest.approx(
+        anual[1]['patrimonio_final'] - com_custo[1]['custos_transacao'], rel=0.05
+    )
+    assert com_custo[1]['patrimonio_final'] < anual[1]['patrimonio_final']
+
+    with pytest.raises(ValueError):
+        backtesting.simular_carteira(ALOCACAO, 10000, periodo='5y', rebalanceamento='diario')
+
+
+def test_janelas_moveis_igual_backtests_individuais(monte_carlo):
+    rng = np.random.default_rng(3)
+    retornos = rng.normal(0.01, 0.05, (3, 80))
+
+    janelas = metricas_janelas(retornos, 24)
+    assert janelas['retorno_anualizado'].shape == (3, 57)
+    for inicio in (0, 20, 56):
+        individual = metricas_carteiras(retornos[:, inicio:inicio + 24], 1.0, 0.0)
+        for chave in janelas:
+            np.testing.assert_allclose(janelas[chave][:, inicio], individual[chave], atol=1e-9)
+
+    # Drawdown em blocos: todas as janelas, alinhadas ou não aos blocos
+    for janela in (2, 13, 24, 80):
+        quedas = metricas_janelas(retornos, janela)['max_drawdown']
+        for inicio in range(80 - janela + 1):
+            individual = metricas_carteiras(retornos[:, inicio:inicio + janela], 1.0, 0.0)['max_drawdown']
+            np.testing.assert_allclose(quedas[:, inicio], individual, atol=1e-9)
+
+    resultado = monte_carlo.backtesting.janelas_moveis(ALOCACAO, meses_janela=36)
+    assert resultado['num_janelas'] == len(resultado['retornos_janelas']) == 60 - 36
+    distribuicao = resultado['retorno_anualizado']
+    assert distribuicao['minimo'] <= distribuicao['p25'] <= distribuicao['mediana'] <= distribuicao['p75'] <= distribuicao['maximo']
+    assert resultado['pior_janela']['retorno_anualizado'] == pytest.approx(distribuicao['minimo'])
+
+    with pytest.raises(ValueError):
+        monte_carlo.backtesting.janelas_moveis(ALOCACAO, meses_janela=120)
+
+
+def test_fronteira_eficiente_domina_amostras(monte_carlo):
+    fronteira_eficiente = FronteiraEficiente(monte_carlo.estatisticas, num_carteiras=2000)
+    fronteira = fronteira_eficiente.obter('5y')
+    assert fronteira_eficiente.obter('5y') is fronteira
+
+    indices = fronteira['fronteira']
+    assert np.all(np.diff(fronteira['volatilidade_anual'][indices]) >= 0)
+    assert np.all(np.diff(fronteira['retorno_anual'][indices]) > 0)
+
+    # Nenhuma carteira amostrada supera a fronteira com o mesmo risco
+    posicao = np.searchsorted(fronteira['volatilidade_anual'][indices], fronteira['volatilidade_anual'], side='right')
+    assert np.all(fronteira['retorno_anual'][indices][posicao - 1] >= fronteira['retorno_anual'] - 1e-9)
+
+    carteira = fronteira_eficiente.avaliar(ALOCACAO, '5y')
+    assert carteira['distancia_fronteira'] >= 0
+
+    monte_carlo.backtesting.limpar_cache()
+    assert fronteira_eficiente.obter('5y') is not fronteira